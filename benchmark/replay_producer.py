@@ -0,0 +1,175 @@
+"""
+replay_producer.py
+Drive sdv_stream at a fixed rate from recorded or pre-generated rows.
+
+    # capture what the SDV simulator produces
+    python benchmark/replay_producer.py record rows.jsonl --count 50000
+    # replay it (cycling through the file) at 10k msg/s for 2 minutes
+    python benchmark/replay_producer.py replay rows.jsonl --rate 10000 --duration 120
+
+Input is JSONL (one record per line) or parquet with the SDV columns;
+``--synthetic N`` generates N random rows instead of reading a file.
+Values are written in KAFKA_VALUE_FORMAT, the same switch the consumer reads.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from confluent_kafka import Consumer, Producer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "consumer"))
+import decoding  # noqa: E402  (shared wire format)
+
+KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "localhost:9092")
+KAFKA_TOPIC             = os.getenv("KAFKA_TOPIC", "sdv_stream")
+
+
+def load_records(path: str, limit: int = None) -> list:
+    if path.endswith(".parquet"):
+        import pandas as pd
+        columns = decoding.FEATURE_COLUMNS + [decoding.TARGET_COLUMN]
+        records = pd.read_parquet(path, columns=columns).to_dict("records")
+    else:
+        with open(path) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    return records[:limit] if limit else records
+
+
+def synthetic_records(n: int, seed: int = 0) -> list:
+    """Random rows in the ranges of chembl_ml_dataset, for runs without a recording."""
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "mw_freebase": float(mw),
+            "alogp": float(alogp),
+            "hba": int(hba),
+            "hbd": int(hbd),
+            "standard_value": float(value),
+        }
+        for mw, alogp, hba, hbd, value in zip(
+            rng.uniform(150, 900, n), rng.normal(3, 1.5, n), rng.integers(0, 15, n),
+            rng.integers(0, 8, n), 10 ** rng.uniform(0, 5, n),
+        )
+    ]
+
+
+def make_producer() -> Producer:
+    return Producer({
+        "bootstrap.servers": KAFKA_BOOTSTRAP_SERVERS,
+        "linger.ms": 20,
+        "batch.num.messages": 10000,
+        "compression.type": "lz4",
+        "queue.buffering.max.messages": 500000,
+    })
+
+
+def replay(values: list, rate: float, duration: float, topic: str = KAFKA_TOPIC,
+           producer: Producer = None) -> int:
+    """
+    Publish *values* round-robin at *rate* msg/s for *duration* seconds
+    (token bucket with one second of burst); returns the number delivered.
+    """
+    producer = producer or make_producer()
+    delivered = {"ok": 0, "failed": 0}
+
+    def on_delivery(err, msg):
+        delivered["failed" if err is not None else "ok"] += 1
+
+    start = last = last_report = time.monotonic()
+    tokens, sent, sent_at_report = 0.0, 0, 0
+    while last - start < duration:
+        now = time.monotonic()
+        tokens = min(rate, tokens + (now - last) * rate)
+        last = now
+        due = int(tokens)
+        if due == 0:
+            producer.poll(min(0.05, 1.0 / rate))
+            continue
+        for _ in range(due):
+            value = values[sent % len(values)]
+            while True:
+                try:
+                    producer.produce(topic, value, on_delivery=on_delivery)
+                    break
+                except BufferError:
+                    producer.poll(0.1)
+            sent += 1
+        tokens -= due
+        producer.poll(0)
+        if now - last_report >= 5:
+            print(f"[REPLAY] {(sent - sent_at_report) / (now - last_report):.0f} msg/s, sent {sent}")
+            last_report, sent_at_report = now, sent
+
+    producer.flush(30)
+    elapsed = time.monotonic() - start
+    print(f"[REPLAY] sent {sent} in {elapsed:.1f}s ({sent / elapsed:.0f} msg/s), "
+          f"delivered {delivered['ok']}, failed {delivered['failed']}")
+    return delivered["ok"]
+
+
+def record(path: str, count: int, topic: str = KAFKA_TOPIC, timeout: float = 60):
+    """Append *count* decoded values of *topic* to *path* as JSONL."""
+    consumer = Consumer({
+        "bootstrap.servers": KAFKA_BOOTSTRAP_SERVERS,
+        "group.id": f"benchmark-recorder-{os.getpid()}",
+        "auto.offset.reset": "earliest",
+        "enable.auto.commit": False,
+    })
+    consumer.subscribe([topic])
+    written, idle_since = 0, time.monotonic()
+    try:
+        with open(path, "a") as f:
+            while written < count and time.monotonic() - idle_since < timeout:
+                for msg in consumer.consume(num_messages=min(1000, count - written), timeout=1.0):
+                    if msg.error():
+                        continue
+                    try:
+                        f.write(json.dumps(decoding.decode_value(msg.value())) + "\n")
+                    except Exception:
+                        continue  # not a record, nothing to replay
+                    written += 1
+                    idle_since = time.monotonic()
+    finally:
+        consumer.close()
+    print(f"[RECORD] wrote {written} records to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record or replay the sdv_stream topic")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="save messages of the topic as JSONL")
+    rec.add_argument("path")
+    rec.add_argument("--count", type=int, default=10000)
+    rec.add_argument("--topic", default=KAFKA_TOPIC)
+
+    rep = sub.add_parser("replay", help="publish a recording at a fixed rate")
+    rep.add_argument("path", nargs="?", help="JSONL or parquet file")
+    rep.add_argument("--synthetic", type=int, default=0, help="generate this many random rows instead")
+    rep.add_argument("--limit", type=int, default=None, help="only use the first N rows of the file")
+    rep.add_argument("--rate", type=float, default=1000, help="messages per second")
+    rep.add_argument("--duration", type=float, default=60, help="seconds")
+    rep.add_argument("--topic", default=KAFKA_TOPIC)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.path, args.count, args.topic)
+        return
+
+    if args.path:
+        records = load_records(args.path, args.limit)
+    elif args.synthetic:
+        records = synthetic_records(args.synthetic)
+    else:
+        parser.error("replay needs a file or --synthetic N")
+    values = [decoding.encode_value(r) for r in records]
+    print(f"[REPLAY] {len(values)} distinct values ➜ {args.topic} at {args.rate:.0f} msg/s")
+    replay(values, args.rate, args.duration, args.topic)
+
+
+if __name__ == "__main__":
+    main()
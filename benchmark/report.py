@@ -0,0 +1,153 @@
+"""
+report.py
+Throughput/latency report from the prediction consumer's /metrics endpoint.
+
+The endpoint is scraped at the start and end of a measurement window (and
+every few seconds in between for lag); counters and histograms are
+differenced over the window, so a long-running consumer can be measured
+without restarting it.
+
+    python benchmark/report.py --metrics-url http://localhost:8001/metrics --duration 60
+"""
+
+import argparse
+import json
+import time
+from collections import defaultdict
+
+import requests
+from prometheus_client.parser import text_string_to_metric_families
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def scrape(url: str) -> dict:
+    """Every sample on *url* as ``{(name, frozenset(labels)): value}``."""
+    response = requests.get(url, timeout=5)
+    response.raise_for_status()
+    samples = {}
+    for family in text_string_to_metric_families(response.text):
+        for sample in family.samples:
+            samples[(sample.name, frozenset(sample.labels.items()))] = sample.value
+    return samples
+
+
+def delta(before: dict, after: dict, name: str, **labels) -> float:
+    """Increase of the counter *name* (summed over series matching *labels*)."""
+    total = 0.0
+    for (sample_name, sample_labels), value in after.items():
+        if sample_name == name and set(labels.items()) <= sample_labels:
+            total += value - before.get((sample_name, sample_labels), 0.0)
+    return total
+
+
+def histogram_quantiles(before: dict, after: dict, name: str, quantiles=QUANTILES, **labels) -> dict:
+    """
+    Quantiles of the observations made between two scrapes, interpolated
+    linearly inside a bucket like PromQL's ``histogram_quantile``.
+    """
+    buckets = defaultdict(float)
+    for (sample_name, sample_labels), value in after.items():
+        if sample_name != f"{name}_bucket" or not set(labels.items()) <= sample_labels:
+            continue
+        le = float(dict(sample_labels)["le"])
+        buckets[le] += value - before.get((sample_name, sample_labels), 0.0)
+
+    bounds = sorted(buckets)
+    total = buckets[bounds[-1]] if bounds else 0
+    result = {}
+    for q in quantiles:
+        if total <= 0:
+            result[q] = None
+            continue
+        rank = q * total
+        lower, below = 0.0, 0.0
+        for bound in bounds:
+            count = buckets[bound]
+            if count >= rank:
+                if bound == float("inf"):
+                    result[q] = lower  # beyond the last finite bucket
+                else:
+                    result[q] = lower + (bound - lower) * (rank - below) / max(count - below, 1e-12)
+                break
+            lower, below = bound, count
+    return result
+
+
+def label_values(samples: dict, name: str, label: str) -> list:
+    return sorted({dict(labels)[label] for (n, labels) in samples if n == name and label in dict(labels)})
+
+
+def measure(url: str, duration: float, interval: float = 2.0) -> dict:
+    """Scrape *url* over *duration* seconds and build the report."""
+    before = after = scrape(url)
+    start = time.monotonic()
+    max_lag = 0.0
+    while time.monotonic() - start < duration:
+        time.sleep(min(interval, max(0.0, duration - (time.monotonic() - start))))
+        after = scrape(url)
+        lag = sum(v for (n, _), v in after.items() if n == "kafka_consumer_lag")
+        max_lag = max(max_lag, lag)
+    elapsed = time.monotonic() - start
+    return build_report(before, after, elapsed, max_lag)
+
+
+def build_report(before: dict, after: dict, elapsed: float, max_lag: float = None) -> dict:
+    messages = delta(before, after, "consumer_messages_total")
+    final_lag = sum(v for (n, _), v in after.items() if n == "kafka_consumer_lag")
+    report = {
+        "window_seconds": round(elapsed, 1),
+        "messages": int(messages),
+        "messages_per_second": round(messages / elapsed, 1) if elapsed else None,
+        "end_to_end_seconds": histogram_quantiles(before, after, "consumer_end_to_end_seconds"),
+        "consumer_lag": {"final": final_lag, "max": max(final_lag, max_lag or 0)},
+        "decode_errors": delta(before, after, "consumer_errors_total", stage="decode"),
+        "models": {},
+    }
+    for server in label_values(after, "model_requests_total", "model_server"):
+        report["models"][server] = {
+            "requests": {
+                status: delta(before, after, "model_requests_total", model_server=server, status=status)
+                for status in ("ok", "error", "timeout")
+            },
+            "latency_seconds": histogram_quantiles(
+                before, after, "model_request_latency_seconds", model_server=server,
+            ),
+        }
+    return report
+
+
+def _ms(value):
+    return "-" if value is None else f"{value * 1000:.1f}"
+
+
+def print_report(report: dict):
+    e2e = report["end_to_end_seconds"]
+    print(f"\n─── Benchmark report ({report['window_seconds']}s window) ───")
+    print(f"messages           {report['messages']}  ({report['messages_per_second']} msg/s)")
+    print(f"end-to-end ms      p50 {_ms(e2e[0.5])}  p95 {_ms(e2e[0.95])}  p99 {_ms(e2e[0.99])}")
+    print(f"consumer lag       final {report['consumer_lag']['final']:.0f}  max {report['consumer_lag']['max']:.0f}")
+    print(f"decode errors      {report['decode_errors']:.0f}")
+    for server, stats in report["models"].items():
+        latency = stats["latency_seconds"]
+        requests_ = stats["requests"]
+        print(f"{server:<22} p50 {_ms(latency[0.5])}  p95 {_ms(latency[0.95])}  p99 {_ms(latency[0.99])} ms  "
+              f"ok {requests_['ok']:.0f}  error {requests_['error']:.0f}  timeout {requests_['timeout']:.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report consumer throughput and latency")
+    parser.add_argument("--metrics-url", default="http://localhost:8001/metrics")
+    parser.add_argument("--duration", type=float, default=60, help="measurement window in seconds")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = measure(args.metrics_url, args.duration)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+run_benchmark.py
+End-to-end benchmark of consumer/consumer.py against a bare Kafka broker.
+
+Starts stub model servers, runs the consumer as a subprocess pointed at
+them (on a fresh topic and consumer group), replays rows into the topic at
+a fixed rate and reports throughput, end-to-end latency percentiles and lag
+measured after a warm-up. Only a Kafka broker is needed, e.g.
+``docker compose up kafka``.
+
+    python benchmark/run_benchmark.py --rate 10000 --duration 60 --consumer-env CONSUMER_MODE=batch
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+import requests
+
+import replay_producer
+import report
+from stub_model_server import start_stub_servers
+
+CONSUMER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "consumer")
+MODEL_SERVERS = ["model-server-rf", "model-server-nn", "model-server-xgboost", "model-server-sgd"]
+
+
+def wait_for_metrics(url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1).raise_for_status()
+            return
+        except requests.RequestException:
+            time.sleep(0.5)
+    raise RuntimeError(f"consumer metrics did not come up on {url}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the streaming consumer end to end")
+    parser.add_argument("--rate", type=float, default=1000, help="messages per second")
+    parser.add_argument("--duration", type=float, default=60, help="measured seconds, after warm-up")
+    parser.add_argument("--warmup", type=float, default=10, help="seconds replayed before measuring")
+    parser.add_argument("--input", help="JSONL or parquet rows to replay (default: synthetic rows)")
+    parser.add_argument("--synthetic", type=int, default=10000)
+    parser.add_argument("--stub-port", type=int, default=8101, help="first of four stub ports")
+    parser.add_argument("--stub-latency-ms", type=float, default=2)
+    parser.add_argument("--stub-jitter-ms", type=float, default=3)
+    parser.add_argument("--metrics-port", type=int, default=8011)
+    parser.add_argument("--consumer-env", nargs="*", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the consumer, e.g. CONSUMER_MODE=batch")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    topic = f"benchmark-{uuid.uuid4().hex[:8]}"
+    ports = [args.stub_port + i for i in range(len(MODEL_SERVERS))]
+    servers = start_stub_servers(ports, args.stub_latency_ms, args.stub_jitter_ms, host="127.0.0.1")
+
+    env = dict(os.environ)
+    env.update({
+        "KAFKA_BOOTSTRAP_SERVERS": replay_producer.KAFKA_BOOTSTRAP_SERVERS,
+        "KAFKA_TOPIC": topic,
+        "CONSUMER_GROUP": topic,
+        "KAFKA_START_FROM": "earliest",
+        "KAFKA_STATS_INTERVAL_MS": "1000",
+        "METRICS_PORT": str(args.metrics_port),
+        "PUSH_INTERVAL": "0",
+        "PREDICTION_CACHE_SIZE": "0",  # measure the model path, not cache hits
+        "MODEL_ENDPOINTS": ",".join(
+            f"{name}=http://127.0.0.1:{port}/invocations" for name, port in zip(MODEL_SERVERS, ports)
+        ),
+    })
+    env.update(item.split("=", 1) for item in args.consumer_env if "=" in item)
+
+    if args.input:
+        records = replay_producer.load_records(args.input)
+    else:
+        records = replay_producer.synthetic_records(args.synthetic)
+    values = [replay_producer.decoding.encode_value(r) for r in records]
+
+    metrics_url = f"http://127.0.0.1:{args.metrics_port}/metrics"
+    consumer = subprocess.Popen(
+        [sys.executable, "consumer.py"], cwd=CONSUMER_DIR, env=env,
+        stdout=subprocess.DEVNULL,  # per-prediction prints would slow the consumer down
+    )
+    try:
+        wait_for_metrics(metrics_url)
+        print(f"Consumer up (pid {consumer.pid}), replaying into {topic}")
+
+        producer = threading.Thread(
+            target=replay_producer.replay,
+            args=(values, args.rate, args.warmup + args.duration, topic),
+            name="replay", daemon=True,
+        )
+        producer.start()
+        time.sleep(args.warmup)
+        result = report.measure(metrics_url, args.duration)
+        producer.join()
+    finally:
+        consumer.terminate()
+        try:
+            consumer.wait(30)
+        except subprocess.TimeoutExpired:
+            consumer.kill()
+        for server in servers:
+            server.shutdown()
+
+    result["target_rate"] = args.rate
+    report.print_report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+stub_model_server.py
+Local stand-ins for the mlflow model servers, for benchmarking the consumer.
+
+Each port speaks the MLflow ``/invocations`` protocol (dataframe_split,
+dataframe_records, instances or inputs) and answers with one prediction per
+row after an optional simulated latency. ``/ping`` and ``/health`` return 200.
+
+    python benchmark/stub_model_server.py --ports 8101 8102 8103 8104 --latency-ms 5
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def count_rows(payload: dict) -> list:
+    """The feature rows of an ``/invocations`` request body."""
+    if "dataframe_split" in payload:
+        return payload["dataframe_split"].get("data", [])
+    if "dataframe_records" in payload:
+        return [list(r.values()) for r in payload["dataframe_records"]]
+    for key in ("instances", "inputs"):
+        if key in payload:
+            return payload[key]
+    raise ValueError("unsupported payload, expected dataframe_split/dataframe_records/instances/inputs")
+
+
+def make_handler(latency_ms: float, jitter_ms: float, error_rate: float):
+    class InvocationsHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real servers
+
+        def _reply(self, status: int, body: bytes):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path in ("/ping", "/health"):
+                self._reply(200, b"{}")
+            else:
+                self._reply(404, b'{"error": "not found"}')
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path != "/invocations":
+                self._reply(404, b'{"error": "not found"}')
+                return
+            try:
+                rows = count_rows(json.loads(body))
+            except (ValueError, AttributeError) as e:
+                self._reply(400, json.dumps({"error": str(e)}).encode())
+                return
+
+            delay = latency_ms + random.uniform(0, jitter_ms)
+            if delay > 0:
+                time.sleep(delay / 1000)
+            if error_rate and random.random() < error_rate:
+                self._reply(500, b'{"error": "injected failure"}')
+                return
+            # Deterministic, cheap and in the same range as standard_value
+            predictions = [abs(sum(v for v in row if isinstance(v, (int, float)))) for row in rows]
+            self._reply(200, json.dumps({"predictions": predictions}).encode())
+
+        def log_message(self, format, *args):
+            pass  # one line per request would dominate the benchmark
+
+    return InvocationsHandler
+
+
+def start_stub_servers(ports: list, latency_ms: float = 0, jitter_ms: float = 0,
+                       error_rate: float = 0, host: str = "0.0.0.0") -> list:
+    """Serve a stub on every port from background threads; returns the servers."""
+    handler = make_handler(latency_ms, jitter_ms, error_rate)
+    servers = []
+    for port in ports:
+        server = ThreadingHTTPServer((host, port), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name=f"stub-{port}", daemon=True).start()
+        servers.append(server)
+        print(f"Stub model server listening on http://{host}:{port}/invocations")
+    return servers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MLflow /invocations stub servers")
+    parser.add_argument("--ports", type=int, nargs="+", default=[8101, 8102, 8103, 8104])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--latency-ms", type=float, default=0, help="fixed delay per request")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="extra uniform random delay")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of requests answered with 500")
+    args = parser.parse_args()
+
+    servers = start_stub_servers(args.ports, args.latency_ms, args.jitter_ms, args.error_rate, args.host)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,18 @@
 import os
-import json
 import time
+import signal
+import threading
+import multiprocessing
 import requests
-from confluent_kafka import Consumer, KafkaException, KafkaError
-from prometheus_client import CollectorRegistry, Gauge, push_to_gateway
-import math
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from confluent_kafka import Consumer, KafkaException, KafkaError, OFFSET_BEGINNING, OFFSET_END, TopicPartition
+import numpy as np
 
-PUSHGATEWAY_URL = os.getenv("PUSHGATEWAY_URL", "http://pushgateway:9091")
-
-
-def is_valid_features(features: dict):
-    for value in features.values():
-        if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
-            return False
-    return True
-
-
-def push_all_predictions_to_gateway(predictions: dict):
-    registry = CollectorRegistry()
-    g = Gauge('model_prediction', 'Prediction value from model', ['model_name'], registry=registry)
-    for model_name, prediction in predictions.items():
-        if prediction is None or prediction == -9999:
-            continue
-        g.labels(model_name=model_name).set(prediction)
-    try:
-        push_to_gateway(PUSHGATEWAY_URL, 
-                        job='ml_predictions', 
-                        registry=registry,
-                        grouping_key={"predictions": "ml_predictions"},
-                        )
-        print(f"[PUSHED] Batch predictions: {predictions}")
-    except Exception as e:
-        print(f"[ERROR] Failed to push batch predictions: {e}")
+import decoding
+import metrics
+from prediction_cache import PREDICTION_CACHE_SIZE, PredictionCache
 
 
 print("Starting Consumer ")
@@ -40,6 +21,26 @@ KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:9094")
 KAFKA_TOPIC            = os.getenv("KAFKA_TOPIC", "sdv_stream")
 GROUP_ID               = os.getenv("CONSUMER_GROUP", "prediction-consumer")
 
+# "message" keeps the original one-poll-one-prediction loop,
+# "batch" groups messages and sends one multi-row payload per model
+CONSUMER_MODE          = os.getenv("CONSUMER_MODE", "message")
+BATCH_MAX_MESSAGES     = int(os.getenv("BATCH_MAX_MESSAGES", "100"))
+BATCH_LINGER_MS        = int(os.getenv("BATCH_LINGER_MS", "200"))
+# >1 starts a supervisor that runs this many consumer processes in the same group
+CONSUMER_WORKERS       = int(os.getenv("CONSUMER_WORKERS", "1"))
+WORKER_RESTART_DELAY   = float(os.getenv("WORKER_RESTART_DELAY", "5"))
+WORKER_SHUTDOWN_TIMEOUT = float(os.getenv("WORKER_SHUTDOWN_TIMEOUT", "30"))
+# Offsets are committed only after predictions are recorded (at-least-once).
+# KAFKA_START_FROM: "committed" resumes from the group's committed offsets
+# (replaying anything not yet processed), "earliest"/"latest" only apply to
+# partitions the group has no committed offset for yet, so rebalances and
+# restarted workers never skip or replay past what was committed.
+KAFKA_START_FROM       = os.getenv("KAFKA_START_FROM", "committed")
+KAFKA_AUTO_OFFSET_RESET = os.getenv("KAFKA_AUTO_OFFSET_RESET", "latest")
+COMMIT_EVERY_MESSAGES  = int(os.getenv("COMMIT_EVERY_MESSAGES", "100"))  # per-message mode only
+# How often librdkafka reports statistics (consumer lag) to metrics
+KAFKA_STATS_INTERVAL_MS = int(os.getenv("KAFKA_STATS_INTERVAL_MS", "5000"))
+
 # Map a model name ➜ REST endpoint
 MODEL_ENDPOINTS = {
     "model-server-rf":  "http://model-server-rf:8000/invocations",
@@ -48,83 +49,517 @@ MODEL_ENDPOINTS = {
     "model-server-sgd":  "http://model-server-sgd:8000/invocations"
     # add more here
 }
+# Point model servers elsewhere (e.g. the benchmark stubs) with
+# MODEL_ENDPOINTS="model-server-rf=http://localhost:8101/invocations,..."
+MODEL_ENDPOINTS.update(
+    (name.strip(), url.strip())
+    for name, url in (
+        item.split("=", 1) for item in os.getenv("MODEL_ENDPOINTS", "").split(",") if "=" in item
+    )
+)
+
+# Default timeout (seconds) for a model call; override per model with
+# MODEL_TIMEOUTS="model-server-rf=2,model-server-nn=0.5"
+MODEL_TIMEOUT          = float(os.getenv("MODEL_TIMEOUT", "5"))
+MODEL_TIMEOUTS         = {
+    name.strip(): float(value)
+    for name, value in (
+        item.split("=", 1) for item in os.getenv("MODEL_TIMEOUTS", "").split(",") if "=" in item
+    )
+}
+# Threads per model server; every model has its own pool, so calls to a
+# slow server that outlive their deadline only tie up that server's threads
+FANOUT_WORKERS         = int(os.getenv("FANOUT_WORKERS", "2"))
+
+# Keep-alive connection pool per model server, shared by all fan-out threads
+HTTP_POOL_SIZE         = int(os.getenv("HTTP_POOL_SIZE", str(FANOUT_WORKERS)))
+HTTP_RETRIES           = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_BACKOFF           = float(os.getenv("HTTP_BACKOFF", "0.1"))
+
+# "http" calls the mlflow model servers, "embedded" loads the registered
+# Production models into this process (see embedded_models.py)
+INFERENCE_MODE         = os.getenv("INFERENCE_MODE", "http")
+MLFLOW_TRACKING_URI    = os.getenv("MLFLOW_TRACKING_URI", "http://mlflow:5000")
+MODEL_STAGE            = os.getenv("MODEL_STAGE", "Production")
+MODEL_RELOAD_INTERVAL  = float(os.getenv("MODEL_RELOAD_INTERVAL", "60"))  # seconds
+
+# Model server ➜ registered model it serves
+REGISTERED_MODELS = {
+    "model-server-rf": "RandomForest_baseline",
+    "model-server-nn": "NeuralNet_baseline",
+    "model-server-xgboost": "XGBoost_baseline",
+    "model-server-sgd": "SGDRegressor_baseline",
+}
+
+# Short name used for the "model_name" label ➜ model server
+PREDICTION_LABELS = {
+    "rf": "model-server-rf",
+    "nn": "model-server-nn",
+    "sgd": "model-server-sgd",
+    "xgboost": "model-server-xgboost",
+}
 
 # ─── Create Confluent Kafka consumer ───────────────────────────────────────────
+def on_commit(err, partitions):
+    if err is not None and err.code() == KafkaError._NO_OFFSET:
+        return  # nothing consumed since the last commit
+    if err is not None:
+        print(f"[ERROR] Offset commit failed: {err}")
+        metrics.CONSUMER_COMMITS.labels(status="error").inc()
+    else:
+        metrics.CONSUMER_COMMITS.labels(status="ok").inc()
+
+
 conf = {
     "bootstrap.servers": KAFKA_BOOTSTRAP_SERVERS,
     "group.id": GROUP_ID,
-    "auto.offset.reset": "latest",
-    "enable.auto.commit": True,
+    "auto.offset.reset": KAFKA_AUTO_OFFSET_RESET,
+    "enable.auto.commit": False,
+    "statistics.interval.ms": KAFKA_STATS_INTERVAL_MS,
+    "stats_cb": metrics.record_kafka_stats,
+    "on_commit": on_commit,
+}
+
+
+fanout_pools = {
+    model_name: ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix=f"fanout-{model_name}")
+    for model_name in PREDICTION_LABELS.values()
 }
 
-consumer = Consumer(conf)
-consumer.subscribe([KAFKA_TOPIC])
-print(f"Connected to Kafka {KAFKA_BOOTSTRAP_SERVERS}, topic '{KAFKA_TOPIC}'")
+
+def model_timeout(model_name: str) -> float:
+    return MODEL_TIMEOUTS.get(model_name, MODEL_TIMEOUT)
+
+
+# ─── Pooled HTTP sessions ──────────────────────────────────────────────────────
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def build_session(pool_size: int = HTTP_POOL_SIZE) -> requests.Session:
+    """
+    A keep-alive session with a bounded connection pool and retry/backoff.
+
+    POST is retried too: a prediction request has no side effects.
+    """
+    retry = Retry(
+        total=HTTP_RETRIES,
+        backoff_factor=HTTP_BACKOFF,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["POST"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry, pool_block=True)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    return session
+
+
+def get_session(model_name: str) -> requests.Session:
+    """Return the shared session for *model_name*, creating it on first use."""
+    session = _sessions.get(model_name)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.setdefault(model_name, build_session())
+    return session
 
 
 # ─── Helper to call model REST API ─────────────────────────────────────────────
-def call_model(model_name: str, features: dict):
+def call_model_batch(model_name: str, body: bytes, n_rows: int):
+    """
+    POST the pre-serialized request *body* (``n_rows`` rows) to *model_name*.
+
+    Returns one prediction per row, in the same order, or ``None`` when the
+    endpoint is unknown or the request fails.
+    """
     endpoint = MODEL_ENDPOINTS.get(model_name)
-    
-    if not is_valid_features(features):
-        print(f"[SKIP] Invalid values in features for model '{model_name}', skipping prediction.")
-        return -9999
-    
     if not endpoint:
         print(f"[WARN] Unknown model '{model_name}', skipping...")
-        return
-    payload = {"inputs": [features]}
+        return None
+
     try:
-        print(f"→ Calling model '{model_name}' with payload: {payload}")
         start_time = time.time()
-        response = requests.post(endpoint, json=payload, timeout=5)
+        with metrics.MODEL_IN_FLIGHT.labels(model_server=model_name).track_inprogress():
+            response = get_session(model_name).post(
+                endpoint,
+                data=body,
+                headers={"Content-Type": "application/json"},
+                timeout=model_timeout(model_name),
+            )
         response.raise_for_status()
         latency = time.time() - start_time
-        print(f"[{model_name}] {latency:.3f}s → Prediction: {response.json()}")
-        prediction = response.json()["predictions"][0] 
-        return prediction
+        predictions = decoding.loads(response.content)["predictions"]
+        print(f"[{model_name}] {latency:.3f}s → {len(predictions)} predictions for {n_rows} rows")
+        if len(predictions) != n_rows:
+            raise ValueError(f"expected {n_rows} predictions, got {len(predictions)}")
+        metrics.record_model_call(model_name, "ok", latency, n_rows)
+        return predictions
     except Exception as e:
         print(f"[ERROR] Failed to call model '{model_name}': {e}")
+        metrics.record_model_call(model_name, "error")
+        return None
+
+
+# Set per process by run_consumer
+embedded_models = None    # INFERENCE_MODE=embedded
+prediction_cache = None   # PREDICTION_CACHE_SIZE > 0
+
+
+def call_embedded_model(model_name: str, features: np.ndarray):
+    """In-process counterpart of call_model_batch for INFERENCE_MODE=embedded."""
+    try:
+        start_time = time.time()
+        with metrics.MODEL_IN_FLIGHT.labels(model_server=model_name).track_inprogress():
+            predictions = embedded_models.predict(model_name, features)
+        if predictions is None:
+            raise RuntimeError("model is not loaded")
+        latency = time.time() - start_time
+        metrics.record_model_call(model_name, "ok", latency, len(features))
+        return predictions
+    except Exception as e:
+        print(f"[ERROR] Embedded model '{model_name}' failed: {e}")
+        metrics.record_model_call(model_name, "error")
         return None
-## ─── Consume loop ──────────────────────────────────────────────────────────────
-try:
-    while True:
+
+
+def fan_out(call, *args):
+    """
+    Run ``call(model_name, *args)`` for every model in PREDICTION_LABELS in parallel.
+
+    Each model gets its own deadline (``model_timeout``) and its own thread
+    pool; a model that misses the deadline is reported as ``None`` so it
+    never holds back the others' results. Its call keeps running (requests
+    cannot be interrupted) but only occupies that model's pool, and a call
+    that has not started yet is cancelled.
+    """
+    started = time.monotonic()
+    futures = {
+        label: fanout_pools[model_name].submit(call, model_name, *args)
+        for label, model_name in PREDICTION_LABELS.items()
+    }
+    results = {}
+    for label, future in futures.items():
+        model_name = PREDICTION_LABELS[label]
+        remaining = started + model_timeout(model_name) - time.monotonic()
+        try:
+            results[label] = future.result(timeout=max(remaining, 0))
+        except FutureTimeoutError:
+            future.cancel()
+            print(f"[TIMEOUT] Model '{model_name}' exceeded {model_timeout(model_name)}s, dropping its prediction")
+            metrics.record_model_call(model_name, "timeout")
+            results[label] = None
+    return results
+
+
+def predict_batch(batch: decoding.DecodedBatch):
+    """
+    Run one multi-row request per model for the valid rows of *batch* and
+    map the predictions back to each message.
+
+    Returns a list of ``preds`` dicts (same shape as the per-message loop),
+    one per decoded message, in the original order.
+    """
+    results = [{"target": target} for target in batch.targets.tolist()]
+
+    # Rows with missing fields or NaN/inf never reach the model servers;
+    # they keep the -9999 marker
+    for i in np.flatnonzero(~batch.valid):
+        print(f"[SKIP] Invalid values in features, skipping prediction: {batch.features[i].tolist()}")
+        for label in PREDICTION_LABELS:
+            results[i][label] = -9999
+
+    valid_idx = np.flatnonzero(batch.valid)
+    if not len(valid_idx):
+        return results
+
+    features = batch.features[valid_idx]
+    outputs = {label: [None] * len(valid_idx) for label in PREDICTION_LABELS}
+    versions, keys = {}, None
+    if prediction_cache is not None:
+        keys = prediction_cache.quantize(features)
+        for label, model_name in PREDICTION_LABELS.items():
+            versions[label] = embedded_models.version(model_name)
+            if versions[label] is not None:
+                outputs[label] = prediction_cache.get_many(model_name, versions[label], keys)
+
+    # Rows any model still needs go to every model, so one payload serves all
+    missing = [j for j in range(len(valid_idx)) if any(outputs[label][j] is None for label in outputs)]
+    if missing:
+        if INFERENCE_MODE == "embedded":
+            fresh = fan_out(call_embedded_model, features[missing])
+        else:
+            # Serialized once, shared by every model server
+            serialize_start = time.perf_counter()
+            body = decoding.encode_payload(features[missing])
+            metrics.MODEL_PAYLOAD_SERIALIZE.observe(time.perf_counter() - serialize_start)
+            fresh = fan_out(call_model_batch, body, len(missing))
+
+        for label, predictions in fresh.items():
+            if predictions is None:
+                continue
+            for pos, j in enumerate(missing):
+                if outputs[label][j] is None:
+                    outputs[label][j] = predictions[pos]
+            if versions.get(label) is not None:
+                prediction_cache.put_many(PREDICTION_LABELS[label], versions[label],
+                                          [keys[j] for j in missing], predictions)
+
+    for label, predictions in outputs.items():
+        for pos, i in enumerate(valid_idx):
+            results[i][label] = predictions[pos]
+
+    return results
+
+
+# Set by SIGTERM/SIGINT; the consume loops finish their current batch and exit
+stop_event = threading.Event()
+
+
+def request_stop(signum, frame):
+    print(f"Received signal {signum}, stopping…")
+    stop_event.set()
+
+
+# (topic, partition) ➜ offset after the last message that was predicted and
+# recorded; only these are committed, never the consumer's fetch position
+processed_offsets = {}
+
+# Messages collected by run_micro_batch but not yet predicted; on_revoke
+# drops those of revoked partitions (their next owner replays them)
+pending_batch = []
+
+
+def mark_processed(msgs):
+    for msg in msgs:
+        key = (msg.topic(), msg.partition())
+        processed_offsets[key] = max(processed_offsets.get(key, 0), msg.offset() + 1)
+
+
+def commit_processed(consumer: Consumer, asynchronous: bool = True, partitions=None):
+    """
+    Commit the offsets of the messages processed since the last commit
+    (only those of *partitions*, a set of (topic, partition), if given).
+
+    Messages count as processed once predicted and recorded, so a crash or
+    a rebalance replays messages instead of losing them.
+    """
+    keys = [key for key in processed_offsets if partitions is None or key in partitions]
+    if not keys:
+        return
+    offsets = [TopicPartition(topic, partition, processed_offsets.pop((topic, partition)))
+               for topic, partition in keys]
+    try:
+        consumer.commit(offsets=offsets, asynchronous=asynchronous)
+    except KafkaException as e:
+        print(f"[ERROR] Offset commit failed: {e}")
+        metrics.CONSUMER_COMMITS.labels(status="error").inc()
+
+
+# ─── Consume loops ─────────────────────────────────────────────────────────────
+def run_per_message(consumer: Consumer):
+    processed = 0
+    while not stop_event.is_set():
         msg = consumer.poll(1.0)  # 1-second timeout
         if msg is None:
             continue  # no message this poll
         if msg.error():
             if msg.error().code() != KafkaError._PARTITION_EOF:
                 print(f"[ERROR] {msg.error()}")
+                metrics.CONSUMER_ERRORS.labels(stage="kafka").inc()
+            continue
+
+        decode_start = time.perf_counter()
+        batch = decoding.decode_batch([msg.value()])
+        metrics.record_batch(1, time.perf_counter() - decode_start)
+        if batch.errors:
+            print(f"[ERROR] Could not decode message at offset {msg.offset()}: {msg.value()[:200]!r}")
+            metrics.CONSUMER_ERRORS.labels(stage="decode").inc()
+            mark_processed([msg])
+            continue
+
+        # All model servers are queried concurrently
+        preds = predict_batch(batch)[0]
+
+        metrics.record_predictions(preds)
+        metrics.record_end_to_end([msg.timestamp()])
+        print(f"[PREDICTIONS] {preds}")
+
+        mark_processed([msg])
+        processed += 1
+        if processed % COMMIT_EVERY_MESSAGES == 0:
+            commit_processed(consumer)
+
+
+def run_micro_batch(consumer: Consumer):
+    """
+    Collect up to BATCH_MAX_MESSAGES messages, or whatever arrived within
+    BATCH_LINGER_MS of the first one, then predict them together.
+
+    Rebalance callbacks fire inside consume(), i.e. while the batch fills,
+    so it is collected in the shared pending_batch that on_revoke prunes.
+    """
+    linger = BATCH_LINGER_MS / 1000
+    while not stop_event.is_set():
+        deadline = None
+        while len(pending_batch) < BATCH_MAX_MESSAGES and not stop_event.is_set():
+            timeout = 1.0 if deadline is None else deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            msgs = consumer.consume(num_messages=BATCH_MAX_MESSAGES - len(pending_batch), timeout=timeout)
+            for msg in msgs:
+                if msg.error():
+                    if msg.error().code() != KafkaError._PARTITION_EOF:
+                        print(f"[ERROR] {msg.error()}")
+                        metrics.CONSUMER_ERRORS.labels(stage="kafka").inc()
+                    continue
+                pending_batch.append(msg)
+            if pending_batch and deadline is None:
+                deadline = time.monotonic() + linger
+
+        if not pending_batch:
             continue
+        batch = list(pending_batch)
+        pending_batch.clear()
+
+        decode_start = time.perf_counter()
+        decoded = decoding.decode_batch([msg.value() for msg in batch])
+        metrics.record_batch(len(batch), time.perf_counter() - decode_start)
+        if decoded.errors:
+            print(f"[ERROR] Could not decode {decoded.errors} of {len(batch)} messages")
+            metrics.CONSUMER_ERRORS.labels(stage="decode").inc(decoded.errors)
+
+        print(f"[KAFKA BATCH] {len(decoded)} messages")
+        for preds in predict_batch(decoded):
+            metrics.record_predictions(preds)
+        metrics.record_end_to_end([msg.timestamp() for msg in batch])
+
+        # The whole batch is recorded: its offsets can be committed
+        mark_processed(batch)
+        commit_processed(consumer)
+
+
+def on_assign(consumer: Consumer, partitions):
+    print(f"[REBALANCE] pid {os.getpid()} assigned partitions {[p.partition for p in partitions]}")
+    metrics.CONSUMER_ASSIGNED_PARTITIONS.inc(len(partitions))
+    if KAFKA_START_FROM in ("earliest", "latest"):
+        try:
+            committed = {(p.topic, p.partition): p.offset for p in consumer.committed(partitions, timeout=10)}
+        except KafkaException as e:
+            print(f"[WARN] Could not read committed offsets, resuming from them: {e}")
+            return
+        for partition in partitions:
+            # Negative means the group never committed this partition
+            if committed.get((partition.topic, partition.partition), -1) < 0:
+                partition.offset = OFFSET_BEGINNING if KAFKA_START_FROM == "earliest" else OFFSET_END
+        consumer.assign(partitions)
+
+
+def on_revoke(consumer: Consumer, partitions):
+    print(f"[REBALANCE] pid {os.getpid()} revoked partitions {[p.partition for p in partitions]}")
+    metrics.CONSUMER_ASSIGNED_PARTITIONS.dec(len(partitions))
+    # This can fire inside consume() while a micro-batch is filling: drop its
+    # unprocessed messages of the revoked partitions and commit only what was
+    # processed, synchronously, so the next owner starts right after it
+    revoked = {(p.topic, p.partition) for p in partitions}
+    pending_batch[:] = [msg for msg in pending_batch if (msg.topic(), msg.partition()) not in revoked]
+    commit_processed(consumer, asynchronous=False, partitions=revoked)
+
+
+def run_consumer(worker_index: int = 0):
+    """Run one group member until SIGTERM/SIGINT, then leave the group cleanly."""
+    global embedded_models, prediction_cache
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    if INFERENCE_MODE == "embedded":
+        # Imported here so the http mode does not need mlflow installed
+        from embedded_models import EmbeddedModels
+        embedded_models = EmbeddedModels(
+            MLFLOW_TRACKING_URI, REGISTERED_MODELS, MODEL_STAGE, MODEL_RELOAD_INTERVAL
+        ).start()
+
+    # Only embedded models know which version produced a prediction
+    if PREDICTION_CACHE_SIZE > 0 and embedded_models is not None:
+        prediction_cache = PredictionCache()
+    elif "PREDICTION_CACHE_SIZE" in os.environ and PREDICTION_CACHE_SIZE > 0:
+        print("[WARN] PREDICTION_CACHE_SIZE is ignored in http mode: the served model version is unknown")
+
+    consumer = Consumer(conf)
+    consumer.subscribe([KAFKA_TOPIC], on_assign=on_assign, on_revoke=on_revoke)
+    print(f"[worker {worker_index}] Connected to Kafka {KAFKA_BOOTSTRAP_SERVERS}, topic '{KAFKA_TOPIC}' ({CONSUMER_MODE} mode)")
+
+    try:
+        if CONSUMER_MODE == "batch":
+            run_micro_batch(consumer)
+        else:
+            run_per_message(consumer)
+        # Clean stop: nothing is in flight, commit what was processed
+        commit_processed(consumer, asynchronous=False)
+    finally:
+        print(f"[worker {worker_index}] Stopping consumer…")
+        consumer.close()
+        for session in _sessions.values():
+            session.close()
+
+
+def supervise(num_workers: int):
+    """
+    Keep *num_workers* consumer processes running in GROUP_ID.
+
+    Kafka spreads the topic's partitions over them. A worker that dies is
+    restarted after WORKER_RESTART_DELAY seconds; on SIGTERM/SIGINT every
+    worker is asked to stop and killed if it has not exited within
+    WORKER_SHUTDOWN_TIMEOUT seconds.
+    """
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    metrics.start_exporter()
+
+    workers = {}
+
+    def start_worker(index: int):
+        process = multiprocessing.Process(target=run_consumer, args=(index,), name=f"consumer-{index}")
+        process.start()
+        workers[index] = process
+        print(f"[SUPERVISOR] Started worker {index} (pid {process.pid})")
+
+    for index in range(num_workers):
+        start_worker(index)
+
+    while not stop_event.wait(1.0):
+        for index, process in list(workers.items()):
+            if process.is_alive():
+                continue
+            metrics.mark_process_dead(process.pid)
+            print(f"[SUPERVISOR] Worker {index} (pid {process.pid}) exited with code {process.exitcode}, "
+                  f"restarting in {WORKER_RESTART_DELAY}s")
+            if stop_event.wait(WORKER_RESTART_DELAY):
+                break
+            start_worker(index)
+
+    print("[SUPERVISOR] Stopping workers…")
+    for process in workers.values():
+        if process.is_alive():
+            process.terminate()  # SIGTERM → graceful stop in run_consumer
+    deadline = time.monotonic() + WORKER_SHUTDOWN_TIMEOUT
+    for process in workers.values():
+        process.join(timeout=max(deadline - time.monotonic(), 0))
+        if process.is_alive():
+            print(f"[SUPERVISOR] Worker pid {process.pid} did not stop in time, killing it")
+            process.kill()
+            process.join()
+        metrics.mark_process_dead(process.pid)
+
+
+def main():
+    if CONSUMER_WORKERS > 1:
+        supervise(CONSUMER_WORKERS)
+    else:
+        metrics.start_exporter()
+        run_consumer()
 
-        # Print raw Kafka message value (decoded)
-        kafka_message=msg.value().decode('utf-8')
-        payload = json.loads(kafka_message)
-        print(f"[KAFKA MESSAGE] {kafka_message}")
-        
-        
-        standard_value=payload.get("standard_value", -9999)
-        
-
-        # You can add your message processing logic here
-        rf_prediction=call_model("model-server-rf", payload)
-        nn_prediction=call_model("model-server-nn", payload)
-        sgd_prediction=call_model("model-server-sgd", payload)
-        xgboost_prediction=call_model("model-server-xgboost", payload)
-        
-        
-        preds = {
-        "rf": rf_prediction,
-        "nn": nn_prediction,
-        "sgd": sgd_prediction,
-        "xgboost": xgboost_prediction,
-        "target":standard_value
-        }
-        
-        push_all_predictions_to_gateway(preds)
-        
-except KeyboardInterrupt:
-    print("Stopping consumer…")
-finally:
-    consumer.close()
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+embedded_models.py
+In-process inference for the prediction consumer (INFERENCE_MODE=embedded).
+
+The Production version of every registered model is loaded from the MLflow
+registry once and predicts on whole batches inside the consumer, instead
+of one HTTP hop per model to the mlflow model servers. A background thread
+polls the registry and hot-swaps a model when a new version reaches the
+stage.
+"""
+
+import threading
+import time
+
+import mlflow
+import numpy as np
+import pandas as pd
+from mlflow.tracking import MlflowClient
+
+from decoding import FEATURE_COLUMNS
+
+
+class EmbeddedModels:
+    """Registry-backed set of pyfunc models, reloaded when their stage moves."""
+
+    def __init__(self, tracking_uri: str, registered_models: dict, stage: str, reload_interval: float):
+        self.registered_models = registered_models  # model server name ➜ registered model name
+        self.stage = stage
+        self.reload_interval = reload_interval
+        self._models = {}  # model server name ➜ (version, pyfunc model)
+        self._lock = threading.Lock()
+        mlflow.set_tracking_uri(tracking_uri)
+        self._client = MlflowClient()
+
+    def _stage_version(self, registry_name: str):
+        versions = self._client.get_latest_versions(registry_name, stages=[self.stage])
+        return versions[0].version if versions else None
+
+    def refresh(self):
+        """Load any model whose ``stage`` version differs from the loaded one."""
+        for model_name, registry_name in self.registered_models.items():
+            try:
+                version = self._stage_version(registry_name)
+                if version is None or version == self.version(model_name):
+                    continue
+                start_time = time.time()
+                model = mlflow.pyfunc.load_model(f"models:/{registry_name}/{version}")
+                with self._lock:
+                    self._models[model_name] = (version, model)
+                print(f"[RELOAD] {registry_name} v{version} loaded in {time.time() - start_time:.1f}s")
+            except Exception as e:
+                print(f"[ERROR] Could not refresh '{registry_name}': {e}")
+
+    def _refresh_forever(self):
+        while True:
+            time.sleep(self.reload_interval)
+            self.refresh()
+
+    def start(self):
+        """Load every model now, then keep polling the registry in the background."""
+        self.refresh()
+        if self.reload_interval > 0:
+            threading.Thread(target=self._refresh_forever, name="model-reload", daemon=True).start()
+        return self
+
+    def version(self, model_name: str):
+        entry = self._models.get(model_name)
+        return entry[0] if entry else None
+
+    def predict(self, model_name: str, features: np.ndarray):
+        """Predict every row of *features*; ``None`` if the model is not loaded."""
+        entry = self._models.get(model_name)
+        if entry is None:
+            return None
+        _, model = entry
+        frame = pd.DataFrame(features, columns=FEATURE_COLUMNS)
+        return np.asarray(model.predict(frame)).ravel().tolist()
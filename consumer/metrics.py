@@ -0,0 +1,229 @@
+"""
+metrics.py
+One long-lived Prometheus registry for the prediction consumer.
+
+The registry is served over HTTP (like mage/metric_server.py) so Prometheus
+scrapes it directly. Optionally a background thread pushes the same
+registry to the Pushgateway every PUSH_INTERVAL seconds instead of once
+per Kafka message.
+
+When PROMETHEUS_MULTIPROC_DIR is set (supervisor mode with several worker
+processes) every worker writes its samples there and the exporter serves
+the aggregate of all workers.
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    multiprocess,
+    push_to_gateway,
+    start_http_server,
+)
+
+PUSHGATEWAY_URL = os.getenv("PUSHGATEWAY_URL", "http://pushgateway:9091")
+METRICS_PORT    = int(os.getenv("METRICS_PORT", "8001"))
+PUSH_INTERVAL   = float(os.getenv("PUSH_INTERVAL", "0"))  # seconds, 0 disables the pusher
+MULTIPROC_DIR   = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+if MULTIPROC_DIR:
+    # Samples left behind by a previous run would be summed into this one
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+    for stale in glob.glob(os.path.join(MULTIPROC_DIR, "*.db")):
+        os.remove(stale)
+
+REGISTRY = CollectorRegistry()
+
+# standard_value spans several orders of magnitude, so log-spaced buckets
+PREDICTION_BUCKETS = (1, 10, 100, 1e3, 1e4, 1e5, 1e6, 1e7, float("inf"))
+LATENCY_BUCKETS    = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, float("inf"))
+CODEC_BUCKETS      = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, float("inf"))
+BATCH_BUCKETS      = (1, 5, 10, 25, 50, 100, 250, 500, 1000, float("inf"))
+E2E_BUCKETS        = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float("inf"))
+
+# Last value per model, kept so the existing Grafana dashboards still work
+MODEL_PREDICTION = Gauge(
+    "model_prediction", "Prediction value from model", ["model_name"],
+    multiprocess_mode="mostrecent", registry=REGISTRY,
+)
+MODEL_PREDICTION_VALUE = Histogram(
+    "model_prediction_value", "Distribution of prediction values from model",
+    ["model_name"], buckets=PREDICTION_BUCKETS, registry=REGISTRY,
+)
+MODEL_REQUEST_LATENCY = Histogram(
+    "model_request_latency_seconds", "Latency of model server requests",
+    ["model_server"], buckets=LATENCY_BUCKETS, registry=REGISTRY,
+)
+MODEL_REQUESTS = Counter(
+    "model_requests_total", "Model server requests by outcome (ok, error, timeout)",
+    ["model_server", "status"], registry=REGISTRY,
+)
+MODEL_ROWS_PREDICTED = Counter(
+    "model_rows_predicted_total", "Rows predicted by model server",
+    ["model_server"], registry=REGISTRY,
+)
+MODEL_IN_FLIGHT = Gauge(
+    "model_requests_in_flight", "Model server requests currently waiting for a response",
+    ["model_server"], multiprocess_mode="livesum", registry=REGISTRY,
+)
+MODEL_PAYLOAD_SERIALIZE = Histogram(
+    "model_payload_serialize_seconds", "Time to serialize one model request payload",
+    buckets=CODEC_BUCKETS, registry=REGISTRY,
+)
+PREDICTION_OUTCOMES = Counter(
+    "consumer_predictions_total", "Per-message prediction outcomes (ok, skipped, none)",
+    ["model_name", "outcome"], registry=REGISTRY,
+)
+
+CACHE_LOOKUPS = Counter(
+    "prediction_cache_lookups_total", "Prediction cache lookups by result (hit, miss)",
+    ["model_server", "result"], registry=REGISTRY,
+)
+CACHE_SIZE = Gauge(
+    "prediction_cache_entries", "Entries in the prediction cache",
+    multiprocess_mode="livesum", registry=REGISTRY,
+)
+
+# ─── Kafka side ────────────────────────────────────────────────────────────────
+CONSUMER_MESSAGES = Counter(
+    "consumer_messages_total", "Kafka messages consumed", registry=REGISTRY,
+)
+CONSUMER_ERRORS = Counter(
+    "consumer_errors_total", "Kafka and decode errors by stage",
+    ["stage"], registry=REGISTRY,
+)
+CONSUMER_BATCH_SIZE = Histogram(
+    "consumer_batch_size", "Messages per processed batch",
+    buckets=BATCH_BUCKETS, registry=REGISTRY,
+)
+CONSUMER_DECODE = Histogram(
+    "consumer_decode_seconds", "Time to decode one batch of Kafka messages",
+    buckets=CODEC_BUCKETS, registry=REGISTRY,
+)
+CONSUMER_END_TO_END = Histogram(
+    "consumer_end_to_end_seconds", "Kafka message timestamp to recorded prediction",
+    buckets=E2E_BUCKETS, registry=REGISTRY,
+)
+CONSUMER_LAG = Gauge(
+    "kafka_consumer_lag", "Consumer lag (messages) per partition, from librdkafka statistics",
+    ["topic", "partition"], multiprocess_mode="mostrecent", registry=REGISTRY,
+)
+CONSUMER_COMMITS = Counter(
+    "consumer_commits_total", "Offset commits by result (ok, error)",
+    ["status"], registry=REGISTRY,
+)
+CONSUMER_ASSIGNED_PARTITIONS = Gauge(
+    "consumer_assigned_partitions", "Partitions currently assigned to this consumer group member",
+    multiprocess_mode="livesum", registry=REGISTRY,
+)
+
+
+def record_predictions(predictions: dict):
+    """Record one message's predictions (including ``target``) into the registry."""
+    for model_name, prediction in predictions.items():
+        if model_name != "target":
+            if prediction is None:
+                outcome = "none"
+            elif prediction == -9999:
+                outcome = "skipped"
+            else:
+                outcome = "ok"
+            PREDICTION_OUTCOMES.labels(model_name=model_name, outcome=outcome).inc()
+        if prediction is None or prediction == -9999:
+            continue
+        MODEL_PREDICTION.labels(model_name=model_name).set(prediction)
+        MODEL_PREDICTION_VALUE.labels(model_name=model_name).observe(prediction)
+
+
+def record_model_call(model_server: str, status: str, latency: float = None, rows: int = 0):
+    """Count one request to *model_server* and, when it completed, its latency."""
+    MODEL_REQUESTS.labels(model_server=model_server, status=status).inc()
+    if latency is not None:
+        MODEL_REQUEST_LATENCY.labels(model_server=model_server).observe(latency)
+    if rows:
+        MODEL_ROWS_PREDICTED.labels(model_server=model_server).inc(rows)
+
+
+def record_batch(size: int, decode_seconds: float):
+    """Count *size* consumed messages and how long decoding them took."""
+    CONSUMER_MESSAGES.inc(size)
+    CONSUMER_BATCH_SIZE.observe(size)
+    CONSUMER_DECODE.observe(decode_seconds)
+
+
+def record_end_to_end(timestamps: list):
+    """
+    Observe end-to-end latency for messages whose predictions were just
+    recorded; *timestamps* are Kafka ``msg.timestamp()`` tuples.
+    """
+    now_ms = time.time() * 1000
+    for timestamp_type, timestamp_ms in timestamps:
+        if timestamp_type == 0:  # TIMESTAMP_NOT_AVAILABLE
+            continue
+        CONSUMER_END_TO_END.observe(max(0.0, now_ms - timestamp_ms) / 1000)
+
+
+def record_kafka_stats(stats_json: str):
+    """
+    ``stats_cb`` for the Kafka consumer.
+
+    librdkafka emits its statistics JSON every ``statistics.interval.ms``;
+    only the per-partition ``consumer_lag`` is kept.
+    """
+    try:
+        stats = json.loads(stats_json)
+    except ValueError:
+        return
+    for topic_name, topic in stats.get("topics", {}).items():
+        for partition in topic.get("partitions", {}).values():
+            partition_id = partition.get("partition", -1)
+            lag = partition.get("consumer_lag", -1)
+            if partition_id < 0 or lag < 0:
+                continue  # internal UA partition or not assigned to us
+            CONSUMER_LAG.labels(topic=topic_name, partition=str(partition_id)).set(lag)
+
+
+def mark_process_dead(pid: int):
+    """Drop the live gauges of a worker process that has exited."""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
+
+
+def exposition_registry() -> CollectorRegistry:
+    """The registry to serve: REGISTRY itself, or the aggregate over all workers."""
+    if not MULTIPROC_DIR:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def _push_forever(interval: float, registry: CollectorRegistry):
+    while True:
+        time.sleep(interval)
+        try:
+            push_to_gateway(PUSHGATEWAY_URL,
+                            job="ml_predictions",
+                            registry=registry,
+                            grouping_key={"predictions": "ml_predictions"},
+                            )
+        except Exception as e:
+            print(f"[ERROR] Failed to push metrics to gateway: {e}")
+
+
+def start_exporter(port: int = METRICS_PORT, push_interval: float = PUSH_INTERVAL):
+    """Serve REGISTRY on *port* and, if *push_interval* > 0, start the pusher thread."""
+    registry = exposition_registry()
+    start_http_server(port, registry=registry)
+    print(f"Prometheus metrics server started at http://localhost:{port}/metrics")
+
+    if push_interval > 0:
+        threading.Thread(target=_push_forever, args=(push_interval, registry), name="pushgateway", daemon=True).start()
+        print(f"Pushing metrics to {PUSHGATEWAY_URL} every {push_interval}s")
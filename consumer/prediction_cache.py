@@ -0,0 +1,86 @@
+"""
+prediction_cache.py
+Bounded LRU/TTL cache of model predictions for the prediction consumer.
+
+Entries are keyed on (model name, model version, quantized feature tuple):
+hba/hbd are small integers and molecular weights cluster, so the same
+descriptor tuples come back often. When a model's registry version changes
+all of its entries are dropped.
+
+Only used in INFERENCE_MODE=embedded, where the consumer knows which version
+it loaded. A model server loads its model once at container start, so the
+registry's latest version says nothing about what it actually serves.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+
+PREDICTION_CACHE_SIZE    = int(os.getenv("PREDICTION_CACHE_SIZE", "100000"))  # 0 disables the cache
+PREDICTION_CACHE_TTL     = float(os.getenv("PREDICTION_CACHE_TTL", "3600"))   # seconds
+PREDICTION_CACHE_QUANTUM = float(os.getenv("PREDICTION_CACHE_QUANTUM", "0.001"))
+
+
+class PredictionCache:
+    def __init__(self, max_entries: int = PREDICTION_CACHE_SIZE, ttl: float = PREDICTION_CACHE_TTL,
+                 quantum: float = PREDICTION_CACHE_QUANTUM):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.quantum = quantum
+        self._entries = OrderedDict()  # key ➜ (prediction, expires_at)
+        self._versions = {}            # model name ➜ version the entries belong to
+        self._lock = threading.Lock()
+
+    def quantize(self, features: np.ndarray) -> list:
+        """One hashable key part per row of *features*."""
+        quantized = np.round(features / self.quantum).astype(np.int64)
+        return [tuple(row) for row in quantized.tolist()]
+
+    def _check_version(self, model_name: str, version: str):
+        if self._versions.get(model_name) != version:
+            self._versions[model_name] = version
+            stale = [key for key in self._entries if key[0] == model_name]
+            for key in stale:
+                del self._entries[key]
+            if stale:
+                print(f"[CACHE] '{model_name}' moved to version {version}, dropped {len(stale)} entries")
+
+    def get_many(self, model_name: str, version: str, rows: list) -> list:
+        """Cached prediction for each quantized row, ``None`` where missing or expired."""
+        now = time.monotonic()
+        found = []
+        with self._lock:
+            self._check_version(model_name, version)
+            for row in rows:
+                key = (model_name, version, row)
+                entry = self._entries.get(key)
+                if entry is None or entry[1] < now:
+                    found.append(None)
+                    continue
+                self._entries.move_to_end(key)
+                found.append(entry[0])
+            metrics.CACHE_SIZE.set(len(self._entries))
+        hits = sum(value is not None for value in found)
+        metrics.CACHE_LOOKUPS.labels(model_server=model_name, result="hit").inc(hits)
+        metrics.CACHE_LOOKUPS.labels(model_server=model_name, result="miss").inc(len(found) - hits)
+        return found
+
+    def put_many(self, model_name: str, version: str, rows: list, predictions: list):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._check_version(model_name, version)
+            for row, prediction in zip(rows, predictions):
+                if prediction is None:
+                    continue
+                key = (model_name, version, row)
+                self._entries[key] = (prediction, expires_at)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            metrics.CACHE_SIZE.set(len(self._entries))
+
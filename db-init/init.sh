@@ -123,7 +123,38 @@ ALTER TABLE public.chembl_ml_dataset_shuffled RENAME TO chembl_ml_dataset;
 
 CREATE INDEX idx_rownum ON PUBLIC.CHEMBL_ML_DATASET (rownum);
 
-analyze PUBLIC.CHEMBL_ML_DATASET; 
+-- Dense batch key over the training rows, see ML_DATASET_KEYSET_PREP.SQL
+ALTER TABLE public.chembl_ml_dataset ADD COLUMN ml_row_id BIGINT;
+
+UPDATE public.chembl_ml_dataset c
+SET ml_row_id = k.ml_row_id
+FROM (
+    SELECT ctid, ROW_NUMBER() OVER (ORDER BY rownum) AS ml_row_id
+    FROM public.chembl_ml_dataset
+    WHERE standard_value IS NOT NULL
+) k
+WHERE c.ctid = k.ctid;
+
+CREATE UNIQUE INDEX idx_ml_row_id ON public.chembl_ml_dataset (ml_row_id)
+    INCLUDE (mw_freebase, alogp, hba, hbd, standard_value)
+    WHERE standard_value IS NOT NULL;
+
+vacuum analyze PUBLIC.CHEMBL_ML_DATASET; 
+
+-- Batch planning summary, see ML_DATASET_KEYSET_PREP.SQL
+DROP TABLE IF EXISTS public.chembl_ml_dataset_summary;
+CREATE TABLE public.chembl_ml_dataset_summary AS
+SELECT count(*) AS row_count,
+       min(ml_row_id) AS min_row_id,
+       max(ml_row_id) AS max_row_id,
+       sum(standard_value) AS sum_standard_value,
+       sum(mw_freebase) AS sum_mw_freebase,
+       sum(alogp) AS sum_alogp,
+       sum(hba) AS sum_hba,
+       sum(hbd) AS sum_hbd,
+       now() AS refreshed_at
+FROM public.chembl_ml_dataset
+WHERE standard_value IS NOT NULL;
 
 EOF
 
@@ -0,0 +1,190 @@
+"""
+batch_scheduler.py
+Pipelined scheduler for Mage batch runs.
+
+Every (model_type, params) combo is a chain of batches that must run in
+order, because batch k+1 continues the model saved by batch k, but the
+chains are independent of each other. The scheduler keeps up to
+``max_in_flight`` Mage runs going, starts the next batch of a chain as soon
+as the previous one completes and fills free slots round-robin from the
+other chains, so Mage works on batch k of one combo while batch k+1 of
+another is loading.
+
+All in-flight runs are polled from one loop with adaptive backoff: every
+POLL_MIN_INTERVAL seconds right after a trigger or a completion, backing
+off to POLL_MAX_INTERVAL while nothing changes. Triggers and status checks
+go through the pooled async MageClient, so filling many slots or checking
+many runs costs one round trip of wall time instead of one per run.
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+
+from mage_client import (
+    FINISHED_STATUSES, MAGE_HTTP_BACKOFF, POLL_BACKOFF, POLL_MAX_INTERVAL, POLL_MIN_INTERVAL, MageClient,
+)
+
+# Concurrent Mage runs; each one holds a batch in the mage container's memory
+MAX_IN_FLIGHT = int(os.getenv("MAGE_MAX_CONCURRENT_RUNS", "4"))
+BATCH_RETRIES = int(os.getenv("MAGE_BATCH_RETRIES", "2"))
+# Consecutive polls a run's status may fail (after MageClient's own retries)
+# before its chain is given up; the run may still be going, so it is not retried
+STATUS_ERRORS = int(os.getenv("MAGE_STATUS_ERRORS", "5"))
+
+
+@dataclass
+class Chain:
+    """The ordered batches of one (model_type, params) combo."""
+    model_type: str
+    params: dict
+    batches: list                  # Mage variables per batch, in order
+    run_uuid: str = field(default_factory=lambda: str(uuid.uuid4()))
+    next_batch: int = 0
+    attempts: int = 0              # failed attempts of next_batch
+    in_flight: bool = False
+    failed: str = ""               # last status once retries are exhausted
+    pruned: bool = False           # stopped early by early_stopping
+    retry_at: float = 0.0          # monotonic time before which next_batch is not retried
+
+    @property
+    def done(self) -> bool:
+        return self.next_batch >= len(self.batches) or bool(self.failed) or self.pruned
+
+    def variables(self) -> dict:
+        return {
+            **self.batches[self.next_batch],
+            "run_uuid": self.run_uuid,
+            "model_type": self.model_type,
+            "params": self.params,
+        }
+
+
+def plan_chain(model_type: str, params: dict, ranges, snapshot_version: str = "") -> Chain:
+    """One combo's chain over the (row_start, row_end) ranges from batch_planner."""
+    planned = []
+    for batch_num, (row_start, row_end) in enumerate(ranges):
+        planned.append({
+            "row_start": row_start,
+            "row_end": row_end,
+            "is_last_batch": batch_num == len(ranges) - 1,
+            "snapshot_version": snapshot_version,
+        })
+    return Chain(model_type, params, planned)
+
+
+async def run_chains_async(chains: list, max_in_flight: int = MAX_IN_FLIGHT, logger=None,
+                           client: MageClient = None, early_stopping=None) -> list:
+    """
+    Run every chain to completion with at most *max_in_flight* Mage runs at a
+    time. A failed batch, or a trigger that failed with an HTTP error, is
+    retried with backoff up to BATCH_RETRIES times before its chain is
+    abandoned; a run whose status cannot be read for STATUS_ERRORS polls in
+    a row abandons its chain. The other chains keep going either way.
+    Raises at the end if any chain failed, otherwise returns the chains.
+
+    With *early_stopping* (early_stopping.EarlyStopping) chains wait at its
+    milestone batches and the losers of each rung are pruned.
+    """
+    log = logger.info if logger else print
+    in_flight = {}  # pipeline run id ➜ chain
+    poll_errors = {}  # pipeline run id ➜ consecutive failed status reads
+    interval = POLL_MIN_INTERVAL
+    cursor = 0      # round-robin start, so no chain hogs the free slots
+    mage = client or MageClient()
+
+    def retry_or_fail(chain, reason: str):
+        if chain.attempts < BATCH_RETRIES:
+            chain.attempts += 1
+            chain.retry_at = time.monotonic() + MAGE_HTTP_BACKOFF * 2 ** chain.attempts
+            log(f"{chain.model_type} {chain.params} batch {chain.next_batch} {reason}, "
+                f"retry {chain.attempts}/{BATCH_RETRIES}")
+        else:
+            chain.failed = reason
+            log(f"{chain.model_type} {chain.params} batch {chain.next_batch} {reason}, giving up on combo")
+
+    try:
+        while True:
+            changed = False
+
+            if early_stopping is not None:
+                for chain in await early_stopping.prune(chains):
+                    log(f"Pruned {chain.model_type} {chain.params} after batch {chain.next_batch - 1} "
+                        f"(rmse {early_stopping.score(chain, chain.next_batch)})")
+                    changed = True
+
+            # Fill free slots from chains whose previous batch has finished
+            now = time.monotonic()
+            waiting = [
+                c for c in chains[cursor:] + chains[:cursor]
+                if not c.done and not c.in_flight and not (early_stopping and early_stopping.holds(c))
+            ]
+            ready = [c for c in waiting if c.retry_at <= now]
+            starting = ready[:max(0, max_in_flight - len(in_flight))]
+            if starting:
+                batch_variables = [chain.variables() for chain in starting]
+                results = await asyncio.gather(*(mage.trigger(v) for v in batch_variables), return_exceptions=True)
+                for chain, variables, pipeline_run_id in zip(starting, batch_variables, results):
+                    if isinstance(pipeline_run_id, Exception):
+                        retry_or_fail(chain, f"trigger error ({pipeline_run_id!r})")
+                        continue
+                    in_flight[pipeline_run_id] = chain
+                    chain.in_flight = True
+                    log(f"Triggered {chain.model_type} {chain.params} batch {chain.next_batch} "
+                        f"rows {variables['row_start']}–{variables['row_end']} (run {pipeline_run_id})")
+                changed = True
+            if chains:
+                cursor = (cursor + 1) % len(chains)
+
+            if not in_flight and not any(c.retry_at > now for c in waiting):
+                break  # nothing running and nothing left to start
+
+            await asyncio.sleep(interval)
+            if not in_flight:
+                continue
+            statuses = await mage.statuses(in_flight, return_exceptions=True)
+            for pipeline_run_id, status in statuses.items():
+                if isinstance(status, Exception):
+                    poll_errors[pipeline_run_id] = poll_errors.get(pipeline_run_id, 0) + 1
+                    if poll_errors[pipeline_run_id] < STATUS_ERRORS:
+                        continue
+                    chain = in_flight.pop(pipeline_run_id)
+                    chain.in_flight = False
+                    chain.failed = f"status unavailable ({status!r})"
+                    changed = True
+                    log(f"{chain.model_type} {chain.params} batch {chain.next_batch} (run {pipeline_run_id}) "
+                        f"{chain.failed}, giving up on combo")
+                    continue
+                poll_errors.pop(pipeline_run_id, None)
+                if status not in FINISHED_STATUSES:
+                    continue
+                chain = in_flight.pop(pipeline_run_id)
+                chain.in_flight = False
+                changed = True
+                if status == "completed":
+                    log(f"{chain.model_type} {chain.params} batch {chain.next_batch} completed")
+                    chain.next_batch += 1
+                    chain.attempts = 0
+                    if early_stopping is not None:
+                        await early_stopping.completed(chain)
+                else:
+                    retry_or_fail(chain, status)
+
+            interval = POLL_MIN_INTERVAL if changed else min(interval * POLL_BACKOFF, POLL_MAX_INTERVAL)
+    finally:
+        if client is None:
+            await mage.close()
+
+    failed = [c for c in chains if c.failed]
+    if failed:
+        raise RuntimeError(
+            "Failed combos: " + ", ".join(f"{c.model_type} {c.params} at batch {c.next_batch} ({c.failed})" for c in failed)
+        )
+    return chains
+
+
+def run_chains(chains: list, max_in_flight: int = MAX_IN_FLIGHT, logger=None, early_stopping=None) -> list:
+    """Blocking entry point for the (synchronous) Prefect flows."""
+    return asyncio.run(run_chains_async(chains, max_in_flight, logger, early_stopping=early_stopping))
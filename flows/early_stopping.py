@@ -0,0 +1,178 @@
+"""
+early_stopping.py
+Successive halving / Hyperband across the incremental batches of a grid.
+
+Every completed batch of a combo leaves one MLflow run (tag run_uuid) with
+the rmse on that batch's test rows. All combos share the same batch ranges,
+so at a given batch the scores are comparable. At each milestone batch the
+scheduler holds every combo until the whole rung has arrived, then keeps
+the best ``1/eta`` and prunes the rest. The survivors train on the
+remaining batches and the pruned ones never start another Mage run.
+
+Combos only compete with combos of the same model_type: every model type
+has its own brackets, so each keeps a winner that reaches its last batch
+and refreshes its ``{model_type}_baseline`` registry.
+
+Milestones of a bracket start at ``min_batches`` and grow by ``eta``: with
+5 batches, eta=3 and min_batches=1 they are 1 and 3. A grid of three model
+types with 3 combos each then costs 3 × (3 + 1×2 + 1×2) = 21 batch runs
+instead of 45.
+
+Hyperband runs several such brackets per model type side by side, from
+aggressive (first decision after one batch) to none at all (every combo
+trains fully). Each combo goes to one bracket of its type, which hedges
+against combos that start slowly and improve later.
+"""
+
+import asyncio
+import math
+import os
+
+from mlflow.tracking import MlflowClient
+
+MLFLOW_TRACKING_URI = os.getenv("MLFLOW_TRACKING_URI", "http://mlflow:5000")
+HALVING_ETA = int(os.getenv("EARLY_STOPPING_ETA", "3"))
+
+
+class MlflowBatchMetrics:
+    """Reads the per-batch rmse the training block logs, and tags pruned combos."""
+
+    def __init__(self, tracking_uri: str = MLFLOW_TRACKING_URI):
+        self.client = MlflowClient(tracking_uri)
+        self._experiment_ids = {}
+
+    def _experiment_id(self, model_type: str):
+        if model_type not in self._experiment_ids:
+            experiment = self.client.get_experiment_by_name(f"ml-{model_type.lower()}")
+            self._experiment_ids[model_type] = experiment.experiment_id if experiment else None
+        return self._experiment_ids[model_type]
+
+    def _runs(self, chain):
+        experiment_id = self._experiment_id(chain.model_type)
+        if experiment_id is None:
+            return []
+        return self.client.search_runs(
+            experiment_ids=[experiment_id],
+            filter_string=f"tags.run_uuid = '{chain.run_uuid}'",
+            order_by=["attributes.start_time DESC"],
+        )
+
+    def latest_rmse(self, chain):
+        """rmse of the combo's latest batch (the block keeps one run per run_uuid)."""
+        runs = self._runs(chain)
+        return runs[0].data.metrics.get("rmse") if runs else None
+
+    def mark_pruned(self, chain):
+        # Keeps the registry step of the surviving combos from picking a pruned run
+        for run in self._runs(chain):
+            self.client.set_tag(run.info.run_id, "pruned", "true")
+            self.client.set_tag(run.info.run_id, "pruned_after_batch", str(chain.next_batch))
+
+
+class SuccessiveHalving:
+    """One bracket: synchronous successive halving at fixed batch milestones."""
+
+    def __init__(self, batches: int, eta: int = HALVING_ETA, min_batches: int = 1):
+        self.eta = eta
+        self.milestones = []
+        milestone = max(1, min_batches)
+        while milestone < batches:
+            self.milestones.append(milestone)
+            milestone *= eta
+        self.decided = set()
+        self.scores = {}  # (run_uuid, milestone) ➜ rmse
+
+    def holds(self, chain) -> bool:
+        """The chain waits at a milestone until the rung is decided."""
+        return chain.next_batch in self.milestones and chain.next_batch not in self.decided
+
+    def record(self, chain, rmse):
+        if chain.next_batch in self.milestones:
+            self.scores[(chain.run_uuid, chain.next_batch)] = rmse
+
+    def decide(self, chains: list) -> list:
+        """Chains to prune now that a whole rung has arrived (and the rung's log line)."""
+        alive = [c for c in chains if not c.failed and not c.pruned]
+        for milestone in self.milestones:
+            if milestone in self.decided:
+                continue
+            if any(c.next_batch < milestone and not c.done for c in alive):
+                return []  # rung still arriving
+            self.decided.add(milestone)
+
+            contenders = [c for c in alive if c.next_batch == milestone]
+            scored = [c for c in contenders if self.scores.get((c.run_uuid, milestone)) is not None]
+            # A combo without a score (MLflow unreachable) is kept, never pruned blindly
+            keep = max(1, math.ceil(len(contenders) / self.eta))
+            ranked = sorted(scored, key=lambda c: self.scores[(c.run_uuid, milestone)])
+            pruned = ranked[max(0, keep - (len(contenders) - len(scored))):]
+            if pruned:
+                return pruned
+        return []
+
+
+class EarlyStopping:
+    """
+    Successive halving (one bracket) or Hyperband (several) for run_chains.
+
+    *chains* must share the same number of batches. Brackets are built per
+    model_type, so combos are only ranked against combos of their own type.
+    """
+
+    def __init__(self, chains: list, method: str = "halving", eta: int = HALVING_ETA, metrics=None):
+        if method not in ("halving", "hyperband"):
+            raise ValueError(f"Unknown early stopping method: {method}")
+        batches = max((len(c.batches) for c in chains), default=0)
+        by_type = {}
+        for chain in chains:
+            by_type.setdefault(chain.model_type, []).append(chain)
+
+        self.bracket_of = {}
+        for typed in by_type.values():
+            if method == "hyperband":
+                s_max = int(math.log(batches, eta)) if batches > 1 else 0
+                # Bracket s decides first after batches / eta**s batches and gets more combos the more aggressive it is
+                brackets = [SuccessiveHalving(batches, eta, max(1, round(batches / eta ** s)))
+                            for s in range(s_max, -1, -1)]
+                weights = [math.ceil((s_max + 1) / (s + 1) * eta ** s) for s in range(s_max, -1, -1)]
+                slots = [i for i, w in enumerate(weights) for _ in range(w)]
+                self.bracket_of.update({c.run_uuid: brackets[slots[i % len(slots)]] for i, c in enumerate(typed)})
+            else:
+                bracket = SuccessiveHalving(batches, eta)
+                self.bracket_of.update({c.run_uuid: bracket for c in typed})
+        self.metrics = metrics or MlflowBatchMetrics()
+
+    def holds(self, chain) -> bool:
+        return self.bracket_of[chain.run_uuid].holds(chain)
+
+    async def completed(self, chain):
+        """Called after chain.next_batch was advanced past a completed batch."""
+        bracket = self.bracket_of[chain.run_uuid]
+        if chain.next_batch in bracket.milestones:
+            try:
+                rmse = await asyncio.to_thread(self.metrics.latest_rmse, chain)
+            except Exception as exc:
+                print(f"[WARN] rmse of {chain.model_type} {chain.params} unavailable: {exc}")
+                rmse = None
+            bracket.record(chain, rmse)
+
+    async def prune(self, chains: list) -> list:
+        """Decide every complete rung; returns the chains pruned now."""
+        pruned = []
+        for bracket in set(self.bracket_of.values()):
+            members = [c for c in chains if self.bracket_of[c.run_uuid] is bracket]
+            while True:
+                losers = bracket.decide(members)
+                if not losers:
+                    break
+                for chain in losers:
+                    chain.pruned = True
+                    try:
+                        await asyncio.to_thread(self.metrics.mark_pruned, chain)
+                    except Exception as exc:
+                        print(f"[WARN] could not tag pruned runs of {chain.run_uuid}: {exc}")
+                pruned.extend(losers)
+        return pruned
+
+    def score(self, chain, milestone: int):
+        return self.bracket_of[chain.run_uuid].scores.get((chain.run_uuid, milestone))
@@ -0,0 +1,127 @@
+"""
+mage_client.py
+Async client for the Mage pipeline-run API, shared by the Prefect flows.
+
+One pooled httpx.AsyncClient carries every trigger and status request, so
+many pipeline runs can be started concurrently and all in-flight runs are
+checked from a single loop rather than one sleeping poller per task.
+
+    async with MageClient() as mage:
+        run_ids = await mage.trigger_many([{"row_start": 1, "row_end": 1000}, ...])
+        statuses = await mage.wait_all(run_ids)
+"""
+
+import asyncio
+import os
+
+import httpx
+
+MAGE_URL = os.getenv("MAGE_URL", "http://mage:6789")
+MAGE_SCHEDULE_ID = os.getenv("MAGE_SCHEDULE_ID", "1")
+MAGE_TRIGGER_TOKEN = os.getenv("MAGE_TRIGGER_TOKEN", "5b9ad51754e5488ebdeb4513b7489538")
+MAGE_TIMEOUT = float(os.getenv("MAGE_TIMEOUT", "30"))
+MAGE_MAX_CONNECTIONS = int(os.getenv("MAGE_MAX_CONNECTIONS", "20"))
+
+POLL_MIN_INTERVAL = float(os.getenv("MAGE_POLL_MIN_INTERVAL", "1"))
+POLL_MAX_INTERVAL = float(os.getenv("MAGE_POLL_MAX_INTERVAL", "15"))
+POLL_BACKOFF = float(os.getenv("MAGE_POLL_BACKOFF", "1.5"))
+
+FINISHED_STATUSES = {"completed", "failed", "cancelled"}
+
+# Retries of a request that failed transiently, after MAGE_HTTP_BACKOFF × 2**n seconds.
+# Status checks retry transport errors and 5xx; triggers only errors before the
+# request was sent, so a retry never starts a second run.
+MAGE_HTTP_RETRIES = int(os.getenv("MAGE_HTTP_RETRIES", "3"))
+MAGE_HTTP_BACKOFF = float(os.getenv("MAGE_HTTP_BACKOFF", "1"))
+
+
+def _transient(exc: Exception) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return isinstance(exc, httpx.TransportError)
+
+
+def _not_sent(exc: Exception) -> bool:
+    return isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+
+
+class MageClient:
+    """Triggers runs of one Mage API trigger and reads their status."""
+
+    def __init__(self, base_url: str = MAGE_URL, schedule_id: str = MAGE_SCHEDULE_ID,
+                 token: str = MAGE_TRIGGER_TOKEN, timeout: float = MAGE_TIMEOUT,
+                 max_connections: int = MAGE_MAX_CONNECTIONS):
+        self.trigger_path = f"/api/pipeline_schedules/{schedule_id}/pipeline_runs/{token}"
+        self._client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        # Keep bursts (hundreds of combos) within the pool instead of queueing inside httpx
+        self._slots = asyncio.Semaphore(max_connections)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        await self._client.aclose()
+
+    async def _send(self, method: str, url: str, retry_on, **kwargs) -> httpx.Response:
+        """One request, retried with backoff while *retry_on(exc)* holds."""
+        for attempt in range(MAGE_HTTP_RETRIES + 1):
+            try:
+                async with self._slots:
+                    response = await self._client.request(method, url, **kwargs)
+                response.raise_for_status()
+                return response
+            except httpx.HTTPError as exc:
+                if attempt == MAGE_HTTP_RETRIES or not retry_on(exc):
+                    raise
+                print(f"[WARN] Mage {method} {url} failed ({exc!r}), retry {attempt + 1}/{MAGE_HTTP_RETRIES}")
+                await asyncio.sleep(MAGE_HTTP_BACKOFF * 2 ** attempt)
+
+    async def trigger(self, variables: dict = None) -> int:
+        """Start one pipeline run with *variables*; returns its run id."""
+        body = {"pipeline_run": {"variables": variables}} if variables is not None else None
+        response = await self._send("POST", self.trigger_path, _not_sent, json=body)
+        pipeline_run_id = response.json().get("pipeline_run", {}).get("id")
+        if not pipeline_run_id:
+            raise ValueError("No pipeline run ID returned from Mage")
+        return pipeline_run_id
+
+    async def trigger_many(self, variables_list: list) -> list:
+        """Start one run per variables dict, concurrently; ids in the same order."""
+        return list(await asyncio.gather(*(self.trigger(v) for v in variables_list)))
+
+    async def status(self, pipeline_run_id: int) -> str:
+        response = await self._send("GET", f"/api/pipeline_runs/{pipeline_run_id}", _transient)
+        return response.json().get("pipeline_run", {}).get("status")
+
+    async def statuses(self, pipeline_run_ids, return_exceptions: bool = False) -> dict:
+        """
+        Status of every run, queried concurrently over the pool. With
+        *return_exceptions* a run whose status could not be read maps to the
+        exception instead of failing the whole call.
+        """
+        ids = list(pipeline_run_ids)
+        results = await asyncio.gather(*(self.status(i) for i in ids), return_exceptions=return_exceptions)
+        return dict(zip(ids, results))
+
+    async def wait_all(self, pipeline_run_ids, logger=None) -> dict:
+        """Poll until every run has finished, with adaptive backoff; returns final statuses."""
+        log = logger.info if logger else print
+        pending = set(pipeline_run_ids)
+        finished = {}
+        interval = POLL_MIN_INTERVAL
+        while pending:
+            await asyncio.sleep(interval)
+            done = {i: s for i, s in (await self.statuses(pending)).items() if s in FINISHED_STATUSES}
+            for pipeline_run_id, status in done.items():
+                log(f"Mage run {pipeline_run_id} {status}")
+            finished.update(done)
+            pending -= done.keys()
+            interval = POLL_MIN_INTERVAL if done else min(interval * POLL_BACKOFF, POLL_MAX_INTERVAL)
+        return finished
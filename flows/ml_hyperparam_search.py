@@ -0,0 +1,66 @@
+from prefect import flow, get_run_logger
+import asyncio
+import os
+import uuid
+
+from batch_planner import dataset_stats
+from mage_client import MageClient
+
+# API trigger of the ml_hyperparam_search Mage pipeline
+# The schedule id is assigned by Mage when the trigger is created, so it has no default
+SEARCH_SCHEDULE_ID = os.getenv("MAGE_SEARCH_SCHEDULE_ID")
+SEARCH_TRIGGER_TOKEN = os.getenv("MAGE_SEARCH_TRIGGER_TOKEN", "be63a2d64b1b4381a2cd7f047c68aff3")
+
+# Same grid as ml_regression_pipeline_parallel
+SEARCH_SPACE = {
+    "RandomForest": {"max_depth": [3, 5, 7]},
+    "XGBoost": {"eta": [0.05, 0.1, 0.3]},
+    "SGDRegressor": {"alpha": [0.0001, 0.001, 0.01]},
+}
+
+
+async def run_search(variables: dict, logger) -> str:
+    async with MageClient(schedule_id=SEARCH_SCHEDULE_ID, token=SEARCH_TRIGGER_TOKEN) as mage:
+        pipeline_run_id = await mage.trigger(variables)
+        logger.info(f"Triggered hyper-parameter search (run {pipeline_run_id})")
+        statuses = await mage.wait_all([pipeline_run_id], logger=logger)
+    return statuses[pipeline_run_id]
+
+
+@flow
+def ml_hyperparam_search(search_method: str = "halving", search_space: dict = None, n_trials: int = 20,
+                         eta: int = 3, max_rows: int = 0, use_snapshot: bool = True,
+                         refresh_stats: bool = False):
+    """
+    One Mage run that loads the training rows once and searches the whole
+    space in a process pool, instead of one pipeline run per combo.
+    ``max_rows`` limits the search to the first rows of the (shuffled) keyset.
+    """
+    if not SEARCH_SCHEDULE_ID:
+        raise ValueError("MAGE_SEARCH_SCHEDULE_ID is not set; use the id of the API trigger "
+                         "of the ml_hyperparam_search pipeline (Mage UI ➜ Triggers)")
+    logger = get_run_logger()
+    stats = dataset_stats(refresh=refresh_stats)
+    row_end = stats.max_row_id
+    if max_rows:
+        row_end = min(row_end, stats.min_row_id + max_rows - 1)
+    logger.info(f"Searching on ml_row_id {stats.min_row_id}–{row_end} of {stats.row_count} rows")
+
+    run_uuid = str(uuid.uuid4())
+    status = asyncio.run(run_search({
+        "row_start": stats.min_row_id,
+        "row_end": row_end,
+        "snapshot_version": stats.version if use_snapshot else "",
+        "search_method": search_method,
+        "search_space": search_space or SEARCH_SPACE,
+        "n_trials": n_trials,
+        "eta": eta,
+        "run_uuid": run_uuid,
+    }, logger))
+    if status != "completed":
+        raise Exception(f"Hyper-parameter search {run_uuid} failed with status: {status}")
+    logger.info(f"Search {run_uuid} finished; leaderboard in MLflow experiment ml-hyperparam-search")
+    return run_uuid
+
+if __name__ == "__main__":
+    ml_hyperparam_search()
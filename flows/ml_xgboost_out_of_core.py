@@ -0,0 +1,56 @@
+from prefect import flow, get_run_logger
+import asyncio
+import os
+import uuid
+
+from batch_planner import dataset_stats
+from mage_client import MageClient
+
+# API trigger of the ml_xgboost_out_of_core Mage pipeline
+# The schedule id is assigned by Mage when the trigger is created, so it has no default
+OOC_SCHEDULE_ID = os.getenv("MAGE_OOC_SCHEDULE_ID")
+OOC_TRIGGER_TOKEN = os.getenv("MAGE_OOC_TRIGGER_TOKEN", "b401f5632ee44f2ea4f6a5d4e33c5c7b")
+
+
+async def run_training(variables: dict, logger) -> str:
+    async with MageClient(schedule_id=OOC_SCHEDULE_ID, token=OOC_TRIGGER_TOKEN) as mage:
+        pipeline_run_id = await mage.trigger(variables)
+        logger.info(f"Triggered out-of-core XGBoost training (run {pipeline_run_id})")
+        statuses = await mage.wait_all([pipeline_run_id], logger=logger)
+    return statuses[pipeline_run_id]
+
+
+@flow
+def ml_xgboost_out_of_core(params: dict = None, source: str = "snapshot", holdout: float = 0.1,
+                           external_memory: bool = False, early_stopping_rounds: int = 0,
+                           validation: float = 0.1, refresh_stats: bool = False):
+    """
+    One Mage run that streams the whole table into a single XGBoost model,
+    instead of one pipeline run per ml_row_id batch.
+    ``source`` is "snapshot" (Parquet row groups) or "postgres" (server-side cursor).
+    """
+    if not OOC_SCHEDULE_ID:
+        raise ValueError("MAGE_OOC_SCHEDULE_ID is not set; use the id of the API trigger "
+                         "of the ml_xgboost_out_of_core pipeline (Mage UI ➜ Triggers)")
+    logger = get_run_logger()
+    stats = dataset_stats(refresh=refresh_stats)
+    logger.info(f"Training XGBoost on {stats.row_count} rows from {source}")
+
+    run_uuid = str(uuid.uuid4())
+    status = asyncio.run(run_training({
+        "params": params or {"eta": 0.1, "max_depth": 7, "n_estimators": 200},
+        "source": source,
+        "snapshot_version": stats.version if source == "snapshot" else "",
+        "holdout": holdout,
+        "external_memory": external_memory,
+        "early_stopping_rounds": early_stopping_rounds,
+        "validation": validation,
+        "run_uuid": run_uuid,
+    }, logger))
+    if status != "completed":
+        raise Exception(f"Out-of-core XGBoost run {run_uuid} failed with status: {status}")
+    logger.info(f"Run {run_uuid} finished; model in MLflow experiment ml-xgboost")
+    return run_uuid
+
+if __name__ == "__main__":
+    ml_xgboost_out_of_core()
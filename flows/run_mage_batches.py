@@ -1,39 +1,33 @@
-from prefect import flow, task
-import subprocess
-import httpx
-import time
+from prefect import flow, get_run_logger
+import asyncio
+import os
+
+from mage_client import MageClient
+
+# This flow triggers its own API trigger of the pipeline, not the one the regression flows use
+BATCH_TRIGGER_TOKEN = os.getenv("MAGE_BATCH_TRIGGER_TOKEN", "5bed182853a745968bc6c00c68c2de69")
+
+
+async def trigger_mage_batches(batches: int, logger):
+    """
+    Run the batches one after another: they share the trigger's run_uuid,
+    so batch k+1 continues the checkpoint batch k saved and must not start
+    before it finishes.
+    """
+    async with MageClient(token=BATCH_TRIGGER_TOKEN) as mage:
+        for batch_num in range(batches):
+            pipeline_run_id = await mage.trigger()
+            logger.info(f"Triggered batch {batch_num} (run {pipeline_run_id})")
+            status = (await mage.wait_all([pipeline_run_id], logger=logger))[pipeline_run_id]
+            if status != "completed":
+                raise Exception(f"Batch {batch_num} failed with status: {status}")
+            logger.info(f"Batch {batch_num} completed successfully")
+    logger.info(f"All {batches} batches completed successfully")
 
-@task
-def trigger_mage(batch_num):
-    print(f"Triggering batch {batch_num}")
-    url = "http://mage:6789/api/pipeline_schedules/1/pipeline_runs/5bed182853a745968bc6c00c68c2de69"
-    r = httpx.post(url)
-    r.raise_for_status()
-    run_data = r.json()
-    print("Mage pipeline triggered:", run_data)
-    
-    # Extract pipeline run ID to poll status
-    pipeline_run_id = run_data.get('pipeline_run', {}).get('id')
-    if not pipeline_run_id:
-        raise Exception("No pipeline run ID returned from trigger.")
-    
-    status = 'running'
-    while status == 'running':
-        time.sleep(10)  # wait before polling again
-        status_check = httpx.get(f"http://mage:6789/api/pipeline_runs/{pipeline_run_id}")
-        status_check.raise_for_status()
-        status = status_check.json().get('pipeline_run', {}).get('status')
-        print(f"Batch {batch_num} status: {status}")
-    
-    if status != 'completed':
-        raise Exception(f"Batch {batch_num} failed with status: {status}")
-    
-    print(f"Batch {batch_num} completed successfully")
 
 @flow
-def run_mage_batches():
-    for batch_num in range(3):
-        trigger_mage(batch_num)
+def run_mage_batches(batches: int = 3):
+    asyncio.run(trigger_mage_batches(batches, get_run_logger()))
 
 if __name__ == "__main__":
-    run_mage_batches()
\ No newline at end of file
+    run_mage_batches()
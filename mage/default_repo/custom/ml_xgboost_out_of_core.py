@@ -0,0 +1,109 @@
+if 'custom' not in globals():
+    from mage_ai.data_preparation.decorators import custom
+if 'test' not in globals():
+    from mage_ai.data_preparation.decorators import test
+
+from datetime import datetime
+from os import path
+import uuid
+
+import mlflow
+import mlflow.xgboost
+from mage_ai.io.config import ConfigFileLoader
+from mage_ai.io.postgres import Postgres
+from mage_ai.settings.repo import get_repo_path
+from mlflow.tracking import MlflowClient
+
+from default_repo.utils.feature_snapshot import ensure_snapshot, resolve_version
+from default_repo.utils.model_registry import holdout_eval_set, register_best_run
+from default_repo.utils.xgboost_out_of_core import CursorIter, SnapshotIter, train_out_of_core
+
+
+def _postgres():
+    config_path = path.join(get_repo_path(), 'io_config.yaml')
+    return Postgres.with_config(ConfigFileLoader(config_path, 'dev'))
+
+
+def _connect():
+    loader = _postgres()
+    loader.open()
+    return loader.conn
+
+
+@custom
+def train_xgboost_out_of_core(*args, **kwargs):
+    """
+    Train one XGBoost model on the whole table in a single pass (see
+    utils/xgboost_out_of_core.py) and register it like the batched runs.
+
+    Variables: params, source (snapshot | postgres), snapshot_version
+    (default auto), holdout, external_memory, early_stopping_rounds,
+    validation, run_uuid.
+    """
+    params = kwargs.get("params") or {"eta": 0.3}
+    source = kwargs.get("source") or "snapshot"
+    holdout = float(kwargs.get("holdout") or 0.1)
+    external_memory = bool(kwargs.get("external_memory"))
+    early_stopping_rounds = int(kwargs.get("early_stopping_rounds") or 0) or None
+    validation = float(kwargs.get("validation") or 0.1)
+    run_uuid = kwargs.get("run_uuid") or str(uuid.uuid4())
+
+    conn = _connect()
+    try:
+        if source == "snapshot":
+            snapshot_version = kwargs.get("snapshot_version") or "auto"
+            if snapshot_version == "auto":
+                snapshot_version = resolve_version(conn)
+            manifest = ensure_snapshot(lambda: conn, snapshot_version)
+            first_row_id = min(p["min_row_id"] for p in manifest["partitions"])
+            last_row_id = max(p["max_row_id"] for p in manifest["partitions"])
+
+            def make_iter(row_start, row_end, cache_prefix):
+                return SnapshotIter(snapshot_version, row_start, row_end, cache_prefix=cache_prefix)
+        else:
+            snapshot_version = ""
+            with conn.cursor() as cur:
+                cur.execute("SELECT min(ml_row_id), max(ml_row_id) FROM public.chembl_ml_dataset "
+                            "WHERE standard_value IS NOT NULL")
+                first_row_id, last_row_id = cur.fetchone()
+
+            def make_iter(row_start, row_end, cache_prefix):
+                return CursorIter(_connect, row_start, row_end, cache_prefix=cache_prefix)
+    finally:
+        conn.close()
+
+    mlflow.set_tracking_uri("http://mlflow:5000")
+    experiment_name = "ml-xgboost"
+    exp = mlflow.get_experiment_by_name(experiment_name)
+    exp_id = exp.experiment_id if exp else mlflow.create_experiment(experiment_name)
+    mlflow.set_experiment(experiment_name)
+    mlflow.xgboost.autolog(log_model_signatures=False)
+
+    with mlflow.start_run():
+        booster, rmse, info = train_out_of_core(
+            params, make_iter, first_row_id, last_row_id,
+            holdout=holdout, external_memory=external_memory,
+            early_stopping_rounds=early_stopping_rounds, validation=validation,
+        )
+        mlflow.log_metric("rmse", rmse)
+        mlflow.set_tag("run_uuid", run_uuid)
+        mlflow.set_tag("run_datetime", datetime.now().isoformat())
+        mlflow.set_tag("model_type", "XGBoost")
+        mlflow.set_tag("params", str(params))
+        mlflow.set_tag("trainer", f"out_of_core:{source}")
+        mlflow.set_tag("eval_set", holdout_eval_set(holdout))
+        mlflow.set_tag("rows_seen", str(info["train_rows"]))
+        mlflow.log_dict({**info, "source": source, "snapshot_version": snapshot_version}, "training_rows.json")
+    print(f"Out-of-core XGBoost rmse {rmse:.4f} on {info['holdout_rows']} holdout rows")
+
+    # Ranked only against runs scored on the same holdout
+    register_best_run(MlflowClient(), exp_id, "XGBoost", eval_set=holdout_eval_set(holdout))
+    return {"run_uuid": run_uuid, "rmse": rmse, **info}
+
+
+@test
+def test_output(output, *args) -> None:
+    """
+    Template code for testing the output of the block.
+    """
+    assert output is not None, 'The output is undefined'
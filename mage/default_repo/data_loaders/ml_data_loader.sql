@@ -1,5 +0,0 @@
-SELECT * 
-FROM PUBLIC.CHEMBL_ML_DATASET
-WHERE standard_value is not null
-AND ROWNUM BETWEEN {{row_start}} AND {{row_end}};
---AND ROWNUM BETWEEN 10 AND 100;
@@ -0,0 +1,66 @@
+if 'data_loader' not in globals():
+    from mage_ai.data_preparation.decorators import data_loader
+if 'test' not in globals():
+    from mage_ai.data_preparation.decorators import test
+
+from os import path
+
+from mage_ai.io.config import ConfigFileLoader
+from mage_ai.io.postgres import Postgres
+from mage_ai.settings.repo import get_repo_path
+
+from default_repo.utils.feature_snapshot import KEYSET_SQL, ensure_snapshot, read_rows, resolve_version
+
+
+def _postgres():
+    config_path = path.join(get_repo_path(), 'io_config.yaml')
+    return Postgres.with_config(ConfigFileLoader(config_path, 'dev'))
+
+
+@data_loader
+def load_data(*args, **kwargs):
+    """
+    Rows row_start..row_end (ml_row_id) of the training columns.
+
+    With a ``snapshot_version`` the rows come from the Parquet feature
+    snapshot of that version, exported from Postgres by whichever batch
+    needs it first; ``auto`` derives the version from the table contents.
+    Without one the batch is read from Postgres directly.
+    """
+    row_start = int(kwargs.get("row_start") or 1)
+    row_end = int(kwargs.get("row_end") or row_start + 999)
+    snapshot_version = kwargs.get("snapshot_version") or ""
+
+    if not snapshot_version:
+        with _postgres() as loader:
+            return loader.load(KEYSET_SQL.format(row_start=row_start, row_end=row_end))
+
+    loader = None
+    try:
+        if snapshot_version == "auto":
+            loader = _postgres()
+            loader.open()
+            snapshot_version = resolve_version(loader.conn)
+
+        def connect():
+            nonlocal loader
+            if loader is None:
+                loader = _postgres()
+                loader.open()
+            return loader.conn
+
+        ensure_snapshot(connect, snapshot_version)
+    finally:
+        if loader is not None:
+            loader.close()
+
+    print(f"Reading rows {row_start} to {row_end} from feature snapshot {snapshot_version}")
+    return read_rows(snapshot_version, row_start, row_end)
+
+
+@test
+def test_output(output, *args) -> None:
+    """
+    Template code for testing the output of the block.
+    """
+    assert output is not None, 'The output is undefined'
@@ -4,14 +4,12 @@ if 'test' not in globals():
     from mage_ai.data_preparation.decorators import test
 
 
-import mlflow
-import mlflow.sklearn
-from sklearn.linear_model import LinearRegression
-from sklearn.model_selection import train_test_split
 import gc
 import psutil
 import os
 
+from default_repo.utils.compact_batch import compact_batch
+
 def _log_mem(tag: str = ""):
     process = psutil.Process(os.getpid())
     rss_mb = process.memory_info().rss / 1024 ** 2
@@ -35,26 +33,16 @@ def transform(data, *args, **kwargs):
     """
     # Specify your transformation logic here
 
-    data = data.dropna()
-    X = data[["mw_freebase", "alogp", "hba", "hbd"]]
-    y = data[["standard_value"]]
-
-   
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-    train_dict = {
-        "X_train": X_train,
-        "X_test": X_test,
-        "y_train": y_train,
-        "y_test": y_test
-    }
-    # Return all four for downstream blocks
+    # One shuffled, downcast frame (train rows first, is_test flags the split)
+    # instead of dropna + column selection + train_test_split copies
+    batch = compact_batch(data, test_size=0.2, seed=42)
+    _log_mem("after compact")
 
     del data
     gc.collect()
     _log_mem("after gc")
 
-    return train_dict
+    return batch
 
 
 @test
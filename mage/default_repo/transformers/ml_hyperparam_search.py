@@ -0,0 +1,75 @@
+if 'transformer' not in globals():
+    from mage_ai.data_preparation.decorators import transformer
+if 'test' not in globals():
+    from mage_ai.data_preparation.decorators import test
+
+import gc
+import os
+
+import mlflow
+import pandas as pd
+import psutil
+
+from default_repo.utils.compact_batch import training_arrays
+from default_repo.utils.hyperparam_search import DEFAULT_SPACE, SEARCH_WORKERS, log_trials, run_search
+
+
+def _log_mem(tag: str = ""):
+    process = psutil.Process(os.getpid())
+    rss_mb = process.memory_info().rss / 1024 ** 2
+    print(f"[{tag}] RSS: {rss_mb:.1f} MB")
+
+
+@transformer
+def transform(batch, *args, **kwargs):
+    """
+    Hyper-parameter search over one compact batch (see utils/hyperparam_search.py).
+
+    Variables: search_method (grid | random | halving), search_space,
+    n_trials (random), eta (halving), max_workers, run_uuid.
+    Returns the leaderboard, best first.
+    """
+    method = kwargs.get("search_method") or "grid"
+    space = kwargs.get("search_space") or DEFAULT_SPACE
+    run_uuid = kwargs.get("run_uuid") or "dummy"
+
+    X_train, X_test, y_train, y_test = training_arrays(batch)
+    _log_mem("after split")
+
+    trials = run_search(
+        X_train, X_test, y_train, y_test,
+        space=space,
+        method=method,
+        n_trials=int(kwargs.get("n_trials") or 20),
+        eta=int(kwargs.get("eta") or 3),
+        max_workers=int(kwargs.get("max_workers") or SEARCH_WORKERS),
+    )
+    del X_train, X_test, y_train, y_test
+    gc.collect()
+    if not trials:
+        raise ValueError(f"Hyper-parameter search ({method}) produced no trials; check search_space")
+
+    mlflow.set_tracking_uri("http://mlflow:5000")
+    parent_run_id = log_trials(
+        trials,
+        experiment_name="ml-hyperparam-search",
+        run_name=f"{method}-{run_uuid[:8]}",
+        tags={"run_uuid": run_uuid, "search_method": method, "rows": str(len(batch))},
+    )
+
+    best = trials[0]
+    print(f"Best: {best.model_type} {best.params} rmse={best.rmse:.4f} (MLflow run {parent_run_id})")
+
+    return pd.DataFrame([
+        {"model_type": t.model_type, "params": str(t.params), "rung": t.rung,
+         "n_train": t.n_train, "rmse": t.rmse, "fit_seconds": t.fit_seconds, "error": t.error}
+        for t in trials
+    ])
+
+
+@test
+def test_output(output, *args) -> None:
+    """
+    Template code for testing the output of the block.
+    """
+    assert output is not None, 'The output is undefined'
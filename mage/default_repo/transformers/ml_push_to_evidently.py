@@ -8,8 +8,12 @@ from evidently.ui.workspace import RemoteWorkspace
 from evidently.presets import DataDriftPreset, RegressionPreset
 from evidently import Dataset, DataDefinition, Regression ,Report  # new imports
 
+from default_repo.utils.compact_batch import (
+    FEATURE_COLUMNS, PREDICTION_COLUMN, TARGET_COLUMN, n_train_rows,
+)
+
 @transformer
-def transform(train_dict, *args, **kwargs):
+def transform(batch, *args, **kwargs):
     """
     Template code for a transformer block.
 
@@ -53,7 +57,7 @@ def transform(train_dict, *args, **kwargs):
 
 
     reg_defintion = DataDefinition(
-    regression=[Regression(target="standard_value", prediction="y_pred")]
+    regression=[Regression(target=TARGET_COLUMN, prediction=PREDICTION_COLUMN)]
     )
 
     report = Report([
@@ -62,17 +66,11 @@ def transform(train_dict, *args, **kwargs):
     ],
     include_tests=True)
 
-    reference_df = train_dict["X_train"]   # must contain y_true and y_pred
-    current_df   = train_dict["X_test"]
-    y_train_pred = train_dict["y_train_pred"]
-    y_test_pred = train_dict["y_test_pred"]
-    y_train=train_dict['y_train']
-    y_test=train_dict['y_test']
-
-    reference_df['y_pred']=y_train_pred
-    current_df['y_pred']=y_test_pred
-    reference_df['standard_value']=y_train
-    current_df['standard_value']=y_train
+    # The batch already holds features, target and y_pred, train rows first
+    columns = FEATURE_COLUMNS + [TARGET_COLUMN, PREDICTION_COLUMN]
+    n_train = n_train_rows(batch)
+    reference_df = batch.iloc[:n_train][columns]   # must contain y_true and y_pred
+    current_df   = batch.iloc[n_train:][columns]
 
     reference_ds = Dataset.from_pandas(reference_df, data_definition=reg_defintion)
     current_ds   = Dataset.from_pandas(current_df,   data_definition=reg_defintion)
@@ -22,6 +22,13 @@ from sklearn.ensemble import RandomForestRegressor       # NEW
 from xgboost import XGBRegressor                         # NEW
 from sklearn.metrics import mean_squared_error  
 from sklearn.neural_network import MLPRegressor
+import numpy as np
+
+from default_repo.utils.compact_batch import PREDICTION_COLUMN, feature_frame, training_arrays
+from default_repo.utils.checkpoint_store import gc_checkpoints, load_checkpoint, recorded_rows, save_checkpoint
+from default_repo.utils.finalize import FINALIZE_MODE, batch_entry, full_fit
+from default_repo.utils.model_factory import all_cores, build_model
+from default_repo.utils.model_registry import BATCH_EVAL_SET, register_best_run
 
 
 def _log_mem(tag: str = ""):
@@ -66,9 +73,9 @@ def train_xgboost_in_batches(
     If ``model`` is None, create a fresh model with the requested
     number of boosting rounds, then fit once.
 
-    Otherwise, increase ``n_estimators`` by ``rounds_per_batch``
-    and fit again while passing the existing booster so the new
-    trees extend the previous ones.
+    Otherwise, fit ``rounds_per_batch`` more rounds while passing the
+    existing booster so the new trees extend the previous ones (with
+    ``xgb_model`` XGBoost adds ``n_estimators`` rounds on top).
     """
     if model is None:
         model = XGBRegressor(
@@ -80,9 +87,7 @@ def train_xgboost_in_batches(
         model.fit(X_batch, y_batch)
         return model
 
-    current_estimators = model.get_params().get("n_estimators") or 0
-    new_estimators = current_estimators + rounds_per_batch
-    model.set_params(n_estimators=new_estimators)
+    model.set_params(n_estimators=rounds_per_batch)
 
     booster = getattr(model, "_Booster", None)  # None on first call
     model.fit(X_batch, y_batch, xgb_model=booster)
@@ -90,7 +95,7 @@ def train_xgboost_in_batches(
 
     
 @transformer
-def transform(train_dict, *args, **kwargs):
+def transform(batch, *args, **kwargs):
     """
     Template code for a transformer block.
 
@@ -107,22 +112,23 @@ def transform(train_dict, *args, **kwargs):
 
     run_uuid = kwargs.get("run_uuid") or "dummy"
     is_last_batch = kwargs.get("is_last_batch") or False
+    finalize_mode = kwargs.get("finalize_mode") or FINALIZE_MODE
+    snapshot_version = kwargs.get("snapshot_version") or ""
+    row_start = int(kwargs.get("row_start") or 1)
+    row_end = int(kwargs.get("row_end") or row_start + 999)
     model_type = kwargs.get("model_type") or "SGDRegressor"
     params = kwargs.get("params") or {"alpha": 0.001}
     
-    MODEL_DIR = Path("/home/src/models/experiment")
-    MODEL_DIR.mkdir(parents=True, exist_ok=True)
-
-    model_path = MODEL_DIR / f"{run_uuid}_{model_type}.pkl"        # FIXED
-
+    # Checkpoints of abandoned runs (failed or pruned combos) expire
+    gc_checkpoints(keep=(run_uuid,))
     
 
 
     # Specify your transformation logic here
-    X_train = train_dict['X_train']
-    y_train = train_dict['y_train']
-    X_test = train_dict['X_test']
-    y_test = train_dict['y_test']
+    # Views into one float32 feature matrix and one target vector
+    X_train, X_test, y_train, y_test = training_arrays(batch)
+    X_train, X_test = feature_frame(X_train), feature_frame(X_test)
+    _log_mem("after split")
 
     mlflow.set_tracking_uri("http://mlflow:5000") 
     experiment_name = f"ml-{model_type.lower()}"
@@ -151,33 +157,37 @@ def transform(train_dict, *args, **kwargs):
 
     # Start a fresh run
     mlflow.set_experiment(experiment_name)
+    # Training data is float32 but requests arrive as float64, which a float32
+    # signature would reject; the models cast their input themselves
     if model_type=="XGBoost":
-        mlflow.xgboost.autolog()
+        mlflow.xgboost.autolog(log_model_signatures=False)
     else:
-        mlflow.sklearn.autolog()
+        mlflow.sklearn.autolog(log_model_signatures=False)
+
+    # Model as left by the previous batch of this run
+    model = load_checkpoint(run_uuid, model_type, params)
+    if model is None:
+        model = build_model(model_type, params)
+    model.set_params(**all_cores(model_type))
+
+    if is_last_batch and finalize_mode == "full" and not snapshot_version:
+        print("[WARN] finalize_mode=full needs a feature snapshot, finishing incrementally")
+        finalize_mode = "incremental"
 
-    if model_path.exists():
-        model = joblib.load(model_path)
-    else:
-        if model_type == "SGDRegressor":
-            model = SGDRegressor(random_state=42, **params)
-        elif model_type == "RandomForest":
-            model = RandomForestRegressor(random_state=42, **params)
-        elif model_type == "XGBoost":
-            model = XGBRegressor(random_state=42, **params, use_label_encoder=False, eval_metric="rmse")
-        elif model_type == "NeuralNet":
-            model = MLPRegressor(random_state=42, **params)
-        else:
-            raise ValueError(f"Unknown model_type: {model_type}")
-    
     # Add custom tags
     with mlflow.start_run() as run:
 
-        if is_last_batch:
-            model.fit(X_train, y_train)
+        if is_last_batch and finalize_mode == "full":
+            # One fit over every snapshot row outside this batch plus its train split
+            model, rows_seen = full_fit(model, model_type, params, X_train, y_train,
+                                        snapshot_version, row_start, row_end)
             y_train_pred=model.predict(X_train)
             y_test_pred=model.predict(X_test)
         else:    
+            # The last batch continues the incremental model like every other batch
+            rows_seen = recorded_rows(run_uuid, model_type) + [
+                batch_entry(row_start, row_end, len(X_train), snapshot_version)
+            ]
             if model_type == "RandomForest":
                 model = train_random_forest_in_batches(model, X_train, y_train, trees_per_batch=50)
             elif model_type == "XGBoost":
@@ -187,9 +197,8 @@ def transform(train_dict, *args, **kwargs):
                 model.partial_fit(X_train, y_train)   
             y_train_pred=model.predict(X_train)
             y_test_pred=model.predict(X_test)     
-        # Save model for the next pass
-       
-        joblib.dump(model, model_path) 
+        # Save model for the next pass (forests append only this batch's trees)
+        save_checkpoint(run_uuid, model_type, params, model, rows_seen=rows_seen)
 
         rmse = math.sqrt(mean_squared_error(y_test, y_test_pred))   # ADDED
         
@@ -199,9 +208,14 @@ def transform(train_dict, *args, **kwargs):
         mlflow.set_tag("run_datetime", datetime.now().isoformat()) 
         mlflow.set_tag("model_type", model_type)
         mlflow.set_tag("params", str(params))
+        mlflow.set_tag("eval_set", BATCH_EVAL_SET)
+        mlflow.set_tag("rows_seen", str(sum(entry["rows"] for entry in rows_seen)))
+        if is_last_batch:
+            mlflow.set_tag("finalize_mode", finalize_mode)
+            mlflow.log_dict({"rows_seen": rows_seen}, "training_rows.json")
 
-        train_dict['y_train_pred']=pd.DataFrame(y_train_pred)
-        train_dict['y_test_pred']=pd.DataFrame(y_test_pred)
+        # Rows are train-first, so predictions line up with the batch as is
+        batch[PREDICTION_COLUMN] = np.concatenate([y_train_pred, y_test_pred]).astype(np.float32)
 
 
 
@@ -209,75 +223,11 @@ def transform(train_dict, *args, **kwargs):
     # After the final batch, choose the best run and register it
     ############################################################################
     if is_last_batch:
-        # 1. Fetch all FINISHED runs for this experiment
-        finished_runs = client.search_runs(
-            experiment_ids=[exp_id],
-            filter_string="attributes.status = 'FINISHED'"
-        )
+        register_best_run(client, exp_id, model_type)
+
+    del X_train, X_test, y_train, y_test
+    gc.collect()
+    _log_mem("after gc")
+
 
-        # 2. Group by run_uuid tag and track best run per group
-        best_runs_per_uuid = {}
-        for run in finished_runs:
-            run_tags = run.data.tags
-            run_uuid = run_tags.get("run_uuid")
-            if not run_uuid:
-                continue
-            rmse = run.data.metrics.get("rmse", float("inf"))
-            if run_uuid not in best_runs_per_uuid or rmse < best_runs_per_uuid[run_uuid].data.metrics.get("rmse", float("inf")):
-                best_runs_per_uuid[run_uuid] = run
-
-        # 3. Now pick the best RMSE from the grouped bests
-        if not best_runs_per_uuid:
-            print("No valid runs with rmse and run_uuid found.")
-            return
-
-        best_run = min(best_runs_per_uuid.values(), key=lambda r: r.data.metrics.get("rmse", float("inf")))
-        best_rmse = best_run.data.metrics["rmse"]
-
-        model_uri     = f"runs:/{best_run.info.run_id}/model"
-        registry_name = f"{model_type}_baseline"
-
-        # 4. Create registry if needed
-        try:
-            client.get_registered_model(registry_name)
-        except Exception:
-            client.create_registered_model(registry_name)
-
-        # 5. Compare with existing Production version
-        current_versions = client.get_latest_versions(registry_name, stages=["Production"])
-        if current_versions:
-            current_rmse = float(current_versions[0].tags.get("rmse", float("inf")))
-        else:
-            current_rmse = float("inf")
-
-        # 6. Register only if better
-        if best_rmse < current_rmse:
-            mv = client.create_model_version(
-                name=registry_name,
-                source=model_uri,
-                run_id=best_run.info.run_id
-            )
-
-            client.set_model_version_tag(
-                name=registry_name,
-                version=mv.version,
-                key="rmse",
-                value=str(best_rmse)
-            )
-
-            client.transition_model_version_stage(
-                name=registry_name,
-                version=mv.version,
-                stage="Production",
-                archive_existing_versions=True
-            )
-            print(f"Registered {registry_name} version {mv.version} with RMSE {best_rmse:.4f}")
-        else:
-            print(f"Skipped registration. Existing Production model has better RMSE: {current_rmse:.4f}")
-
-    #del train_dict
-    #gc.collect()
-    #_log_mem("after gc")
-
-
-    return train_dict
\ No newline at end of file
+    return batch
\ No newline at end of file
@@ -0,0 +1,192 @@
+"""Checkpoints of the incrementally trained models between Mage batches.
+
+Replaces the single joblib pickle per run that was loaded and rewritten in
+full on every batch. One directory per ``{run_uuid}_{model_type}``::
+
+    {CHECKPOINT_DIR}/{run_uuid}_{model_type}/manifest.json
+    {CHECKPOINT_DIR}/{run_uuid}_{model_type}/...
+
+RandomForest   ``shell.joblib`` (the fitted estimator without its trees)
+               plus one ``trees-00000.joblib`` segment per batch holding only
+               the trees that batch added; a save appends a segment and
+               rewrites the small shell and manifest
+XGBoost        the booster in XGBoost's own UBJSON format (``booster.ubj``)
+other models   ``model.joblib`` (SGD and MLP models are small)
+
+Uncompressed tree segments are loaded with ``mmap_mode="r"``, so the tree
+arrays are paged in from the file instead of being read into fresh buffers;
+fitted trees are never written to, so read-only maps are safe. Shells and
+``model.joblib`` are loaded into memory: ``partial_fit`` updates
+``coef_``/``coefs_`` in place and fails on a read-only map (MLP) or
+crashes the process (SGD). ``CHECKPOINT_COMPRESS`` trades the mapping for
+smaller files. The
+manifest is written last, via a rename, so a directory whose manifest names
+a segment always has that segment.
+"""
+from __future__ import annotations
+
+import copy
+import gzip
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+
+import joblib
+
+from default_repo.utils.model_factory import build_model
+
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", "/home/src/models/experiment")
+# joblib compression: 0 (off, memory-mapped loads) or a level 1-9
+CHECKPOINT_COMPRESS = int(os.getenv("CHECKPOINT_COMPRESS", "0"))
+# Checkpoints untouched for this long are deleted by gc_checkpoints
+CHECKPOINT_TTL_HOURS = float(os.getenv("CHECKPOINT_TTL_HOURS", "72"))
+
+
+def checkpoint_dir(run_uuid: str, model_type: str) -> str:
+    return os.path.join(CHECKPOINT_DIR, f"{run_uuid}_{model_type}")
+
+
+def load_manifest(run_uuid: str, model_type: str) -> dict | None:
+    try:
+        with open(os.path.join(checkpoint_dir(run_uuid, model_type), "manifest.json")) as f:
+            return json.load(f)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def _write_manifest(directory: str, manifest: dict):
+    manifest["updated_at"] = datetime.now().isoformat()
+    tmp = os.path.join(directory, "manifest.json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(directory, "manifest.json"))
+
+
+def _dump(value, path: str, compress: int):
+    joblib.dump(value, path, compress=compress)
+
+
+def _load(path: str, compress: int, mmap: bool = False):
+    """Load a joblib file; *mmap* maps its arrays read-only (tree segments only)."""
+    return joblib.load(path, mmap_mode="r" if mmap and not compress else None)
+
+
+def save_checkpoint(run_uuid: str, model_type: str, params: dict, model, compress: int = CHECKPOINT_COMPRESS,
+                    rows_seen: list | None = None):
+    """
+    Persist *model* after a batch; for forests only the new trees are written.
+
+    *rows_seen* (see recorded_rows()) replaces the recorded training rows; by
+    default they are kept as they were.
+    """
+    directory = checkpoint_dir(run_uuid, model_type)
+    os.makedirs(directory, exist_ok=True)
+    manifest = load_manifest(run_uuid, model_type)
+    if rows_seen is None:
+        rows_seen = (manifest or {}).get("rows_seen", [])
+
+    if model_type == "RandomForest":
+        trees = model.estimators_
+        if manifest is None or manifest.get("format") != "forest-segments" or manifest["n_trees"] > len(trees):
+            # First save, or the forest was rebuilt: start the segments over
+            for name in os.listdir(directory):
+                os.remove(os.path.join(directory, name))
+            manifest = {"format": "forest-segments", "segments": [], "n_trees": 0}
+        new_trees = trees[manifest["n_trees"]:]
+        if new_trees:
+            name = f"trees-{len(manifest['segments']):05d}.joblib"
+            _dump(list(new_trees), os.path.join(directory, name), compress)
+            manifest["segments"].append({"file": name, "trees": len(new_trees), "compress": compress})
+            manifest["n_trees"] = len(trees)
+        shell = copy.copy(model)
+        shell.estimators_ = []
+        _dump(shell, os.path.join(directory, "shell.joblib"), compress)
+        manifest["shell_compress"] = compress
+
+    elif model_type == "XGBoost":
+        raw = model.get_booster().save_raw(raw_format="ubj")
+        name = "booster.ubj.gz" if compress else "booster.ubj"
+        tmp = os.path.join(directory, name + ".tmp")
+        with (gzip.open(tmp, "wb", compresslevel=compress) if compress else open(tmp, "wb")) as f:
+            f.write(raw)
+        os.replace(tmp, os.path.join(directory, name))
+        manifest = {"format": "xgboost-ubj", "file": name, "n_estimators": model.get_params().get("n_estimators")}
+
+    else:
+        name = "model.joblib"
+        _dump(model, os.path.join(directory, name + ".tmp"), compress)
+        os.replace(os.path.join(directory, name + ".tmp"), os.path.join(directory, name))
+        manifest = {"format": "joblib", "file": name, "compress": compress}
+
+    manifest.update(model_type=model_type, params=params, rows_seen=rows_seen)
+    _write_manifest(directory, manifest)
+
+
+def recorded_rows(run_uuid: str, model_type: str) -> list:
+    """Training rows recorded for the run so far: one entry per fit, oldest first."""
+    return (load_manifest(run_uuid, model_type) or {}).get("rows_seen", [])
+
+
+def load_checkpoint(run_uuid: str, model_type: str, params: dict):
+    """The model saved by the previous batch of this run, or None."""
+    manifest = load_manifest(run_uuid, model_type)
+    if manifest is None:
+        return None
+    directory = checkpoint_dir(run_uuid, model_type)
+
+    if manifest["format"] == "forest-segments":
+        model = _load(os.path.join(directory, "shell.joblib"), manifest.get("shell_compress", 0))
+        trees = []
+        for segment in manifest["segments"]:
+            trees.extend(_load(os.path.join(directory, segment["file"]), segment["compress"], mmap=True))
+        model.estimators_ = trees
+        return model
+
+    if manifest["format"] == "xgboost-ubj":
+        path = os.path.join(directory, manifest["file"])
+        with (gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")) as f:
+            raw = bytearray(f.read())
+        model = build_model(model_type, params)
+        model.load_model(raw)
+        if manifest.get("n_estimators"):
+            model.set_params(n_estimators=manifest["n_estimators"])
+        return model
+
+    return _load(os.path.join(directory, manifest["file"]), manifest.get("compress", 0))
+
+
+def delete_checkpoint(run_uuid: str, model_type: str):
+    shutil.rmtree(checkpoint_dir(run_uuid, model_type), ignore_errors=True)
+
+
+def gc_checkpoints(max_age_hours: float = CHECKPOINT_TTL_HOURS, keep: tuple = ()) -> int:
+    """
+    Delete checkpoints (and legacy ``.pkl`` files) not written for
+    *max_age_hours*; runs named in *keep* are spared. Returns the number removed.
+    """
+    if not os.path.isdir(CHECKPOINT_DIR):
+        return 0
+    cutoff = time.time() - max_age_hours * 3600
+    removed = 0
+    for name in os.listdir(CHECKPOINT_DIR):
+        if any(name.startswith(f"{run_uuid}_") for run_uuid in keep):
+            continue
+        path = os.path.join(CHECKPOINT_DIR, name)
+        marker = os.path.join(path, "manifest.json") if os.path.isdir(path) else path
+        try:
+            stale = os.path.getmtime(marker if os.path.exists(marker) else path) < cutoff
+        except FileNotFoundError:
+            continue
+        if not stale:
+            continue
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif name.endswith(".pkl"):
+            os.remove(path)
+        else:
+            continue
+        removed += 1
+        print(f"[CHECKPOINT] removed stale {name}")
+    return removed
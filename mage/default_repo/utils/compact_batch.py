@@ -0,0 +1,87 @@
+"""Compact batch format passed between the ml_regerssion_pipeline blocks.
+
+One DataFrame per batch, shuffled once with the training rows first:
+
+    mw_freebase, alogp   float32
+    hba, hbd             int8   (int16 if a value does not fit)
+    standard_value       float64, the target spans several orders of magnitude
+    is_test              bool
+    y_pred               float32, added by train_and_log_ml_model
+
+Mage stores it between blocks as one Parquet file instead of four frames
+plus predictions. The training block turns the descriptors into a single
+C-contiguous float32 matrix whose train/test parts are slices (views).
+"""
+from __future__ import annotations
+
+import math
+
+import numpy as np
+import pandas as pd
+
+FEATURE_COLUMNS = ["mw_freebase", "alogp", "hba", "hbd"]
+TARGET_COLUMN = "standard_value"
+SPLIT_COLUMN = "is_test"
+PREDICTION_COLUMN = "y_pred"
+
+FLOAT_FEATURES = ["mw_freebase", "alogp"]
+COUNT_FEATURES = ["hba", "hbd"]
+
+
+def _count_dtype(values: np.ndarray):
+    info = np.iinfo(np.int8)
+    if len(values) == 0 or (values.min() >= info.min and values.max() <= info.max):
+        return np.int8
+    return np.int16
+
+
+def compact_batch(data: pd.DataFrame, test_size: float = 0.2, seed: int = 42) -> pd.DataFrame:
+    """
+    Drop incomplete rows, shuffle and downcast *data* in one gather per column.
+
+    The last ``ceil(test_size * n)`` rows are the test split (same sizing as
+    sklearn's train_test_split).
+    """
+    columns = FEATURE_COLUMNS + [TARGET_COLUMN]
+    valid = np.ones(len(data), dtype=bool)
+    for col in columns:
+        valid &= data[col].notna().to_numpy()
+
+    rows = np.random.default_rng(seed).permutation(np.flatnonzero(valid))
+    n_test = int(math.ceil(test_size * len(rows)))
+
+    out = {}
+    for col in FLOAT_FEATURES:
+        out[col] = data[col].to_numpy()[rows].astype(np.float32, copy=False)
+    for col in COUNT_FEATURES:
+        values = data[col].to_numpy()[rows]
+        out[col] = values.astype(_count_dtype(values), copy=False)
+    out[TARGET_COLUMN] = data[TARGET_COLUMN].to_numpy()[rows].astype(np.float64, copy=False)
+    is_test = np.zeros(len(rows), dtype=bool)
+    is_test[len(rows) - n_test:] = True
+    out[SPLIT_COLUMN] = is_test
+    return pd.DataFrame(out, copy=False)
+
+
+def n_train_rows(batch: pd.DataFrame) -> int:
+    return int(len(batch) - batch[SPLIT_COLUMN].to_numpy().sum())
+
+
+def training_arrays(batch: pd.DataFrame):
+    """
+    ``(X_train, X_test, y_train, y_test)`` of a compact batch.
+
+    X is one C-contiguous float32 matrix and y one float64 vector; the four
+    returned arrays are views into them.
+    """
+    n_train = n_train_rows(batch)
+    X = np.empty((len(batch), len(FEATURE_COLUMNS)), dtype=np.float32)
+    for j, col in enumerate(FEATURE_COLUMNS):
+        X[:, j] = batch[col].to_numpy()
+    y = batch[TARGET_COLUMN].to_numpy()
+    return X[:n_train], X[n_train:], y[:n_train], y[n_train:]
+
+
+def feature_frame(X: np.ndarray) -> pd.DataFrame:
+    """Named-column DataFrame over *X* without copying (models keep feature names)."""
+    return pd.DataFrame(X, columns=FEATURE_COLUMNS, copy=False)
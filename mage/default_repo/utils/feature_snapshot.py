@@ -0,0 +1,265 @@
+"""Versioned Parquet snapshot of the training columns of chembl_ml_dataset.
+
+The first batch that needs a snapshot version exports the four features and
+the target once, ordered by ml_row_id, and every later batch and every
+hyper-parameter combo reads its row range from the files instead of
+querying Postgres again.
+
+Layout::
+
+    {FEATURE_SNAPSHOT_DIR}/{version}/manifest.json
+    {FEATURE_SNAPSHOT_DIR}/{version}/part-00000.parquet
+    {FEATURE_SNAPSHOT_DIR}/{version}/part-00001.parquet
+    ...
+
+Each part holds PARTITION_ROWS consecutive rows in row groups of
+ROW_GROUP_ROWS; the manifest lists the ml_row_id range of every part and is
+written last, so a version directory with a manifest is complete.
+"""
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+SNAPSHOT_DIR = os.getenv("FEATURE_SNAPSHOT_DIR", "/home/src/models/feature_snapshots")
+PARTITION_ROWS = int(os.getenv("FEATURE_SNAPSHOT_PARTITION_ROWS", "1000000"))
+ROW_GROUP_ROWS = int(os.getenv("FEATURE_SNAPSHOT_ROW_GROUP_ROWS", "100000"))
+# Uncompressed pages are read straight from the memory map
+COMPRESSION = os.getenv("FEATURE_SNAPSHOT_COMPRESSION", "none")
+KEEP_VERSIONS = int(os.getenv("FEATURE_SNAPSHOT_KEEP", "3"))
+
+TABLE_NAME = "public.chembl_ml_dataset"
+FEATURE_COLUMNS = ["mw_freebase", "alogp", "hba", "hbd"]
+TARGET_COLUMN = "standard_value"
+
+SCHEMA = pa.schema([
+    ("ml_row_id", pa.int64()),
+    ("mw_freebase", pa.float64()),
+    ("alogp", pa.float64()),
+    ("hba", pa.int16()),
+    ("hbd", pa.int16()),
+    ("standard_value", pa.float64()),
+])
+
+EXPORT_SQL = f"""
+    SELECT ml_row_id, mw_freebase::float8, alogp::float8, hba::int2, hbd::int2, standard_value::float8
+    FROM {TABLE_NAME}
+    WHERE standard_value IS NOT NULL
+    ORDER BY ml_row_id
+"""
+
+# Keyset read of one batch (index-only range scan on idx_ml_row_id), for runs without a snapshot
+KEYSET_SQL = """
+    SELECT mw_freebase, alogp, hba, hbd, standard_value
+    FROM PUBLIC.CHEMBL_ML_DATASET
+    WHERE standard_value is not null
+    AND ML_ROW_ID BETWEEN {row_start} AND {row_end}
+    ORDER BY ML_ROW_ID
+"""
+
+# Changes whenever rows are added, removed or re-keyed
+VERSION_SQL = f"""
+    SELECT count(*), max(ml_row_id), sum(standard_value), sum(mw_freebase), sum(alogp), sum(hba), sum(hbd)
+    FROM {TABLE_NAME}
+    WHERE standard_value IS NOT NULL
+"""
+
+
+def resolve_version(conn) -> str:
+    """Content version of the training rows (what ``snapshot_version="auto"`` means)."""
+    with conn.cursor() as cur:
+        cur.execute(VERSION_SQL)
+        stats = cur.fetchone()
+    return "v" + hashlib.md5(":".join(str(s) for s in stats).encode()).hexdigest()[:12]
+
+
+def version_dir(version: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, version)
+
+
+def load_manifest(version: str) -> dict | None:
+    try:
+        with open(os.path.join(version_dir(version), "manifest.json")) as f:
+            return json.load(f)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def export_snapshot(conn, version: str) -> dict:
+    """Stream the training columns into a new snapshot directory (caller holds the lock)."""
+    final_dir = version_dir(version)
+    tmp_dir = f"{final_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    partitions = []
+    writer, part_rows, part_min = None, 0, None
+
+    def close_part(last_row_id):
+        writer.close()
+        partitions[-1].update(rows=part_rows, min_row_id=part_min, max_row_id=last_row_id)
+
+    last_row_id = None
+    with conn.cursor(name=f"snapshot_{version}") as cur:
+        cur.itersize = ROW_GROUP_ROWS
+        cur.execute(EXPORT_SQL)
+        while True:
+            rows = cur.fetchmany(ROW_GROUP_ROWS)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            table = pa.table(
+                [pa.array(col, type=field.type) for col, field in zip(columns, SCHEMA)],
+                schema=SCHEMA,
+            )
+            if writer is not None and part_rows >= PARTITION_ROWS:
+                close_part(last_row_id)
+                writer = None
+            if writer is None:
+                name = f"part-{len(partitions):05d}.parquet"
+                writer = pq.ParquetWriter(os.path.join(tmp_dir, name), SCHEMA, compression=COMPRESSION)
+                partitions.append({"file": name})
+                part_rows, part_min = 0, columns[0][0]
+            writer.write_table(table, row_group_size=ROW_GROUP_ROWS)
+            part_rows += len(rows)
+            last_row_id = columns[0][-1]
+            print(f"[SNAPSHOT] {version}: exported up to ml_row_id {last_row_id}")
+    if writer is not None:
+        close_part(last_row_id)
+
+    manifest = {
+        "version": version,
+        "source": TABLE_NAME,
+        "columns": SCHEMA.names,
+        "total_rows": sum(p["rows"] for p in partitions),
+        "partitions": partitions,
+        "created_at": datetime.now().isoformat(),
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.rename(tmp_dir, final_dir)
+    print(f"[SNAPSHOT] {version}: {manifest['total_rows']} rows in {len(partitions)} parts")
+    return manifest
+
+
+def prune_snapshots(keep: int = KEEP_VERSIONS, current: str | None = None):
+    """Delete all but the *keep* most recent complete snapshots (never *current*)."""
+    complete = []
+    for version in os.listdir(SNAPSHOT_DIR):
+        manifest = load_manifest(version)
+        if manifest is not None:
+            complete.append((manifest["created_at"], version))
+    for _, version in sorted(complete, reverse=True)[keep:]:
+        if version != current:
+            shutil.rmtree(version_dir(version), ignore_errors=True)
+            try:
+                os.remove(os.path.join(SNAPSHOT_DIR, f".{version}.lock"))
+            except FileNotFoundError:
+                pass
+            print(f"[SNAPSHOT] pruned {version}")
+
+
+def ensure_snapshot(connect, version: str) -> dict:
+    """
+    Manifest of *version*, exporting it first if it does not exist yet.
+
+    *connect* returns an open psycopg2 connection and is only called when an
+    export is needed. Concurrent batches wait on a file lock while the first
+    one exports, then all read the same files.
+    """
+    manifest = load_manifest(version)
+    if manifest is not None:
+        return manifest
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    with open(os.path.join(SNAPSHOT_DIR, f".{version}.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        manifest = load_manifest(version)  # exported while we waited
+        if manifest is None:
+            manifest = export_snapshot(connect(), version)
+            prune_snapshots(current=version)
+    return manifest
+
+
+def _overlaps(low, high, row_start: int, row_end: int) -> bool:
+    return low is None or high is None or (high >= row_start and low <= row_end)
+
+
+def read_rows(version: str, row_start: int, row_end: int) -> pd.DataFrame:
+    """
+    Rows with ``row_start <= ml_row_id <= row_end`` as a DataFrame of the
+    feature and target columns. Only the parts and row groups overlapping the
+    range are read, through a memory map.
+    """
+    manifest = load_manifest(version)
+    if manifest is None:
+        raise FileNotFoundError(f"Feature snapshot {version} does not exist")
+
+    tables = []
+    for part in manifest["partitions"]:
+        if not _overlaps(part["min_row_id"], part["max_row_id"], row_start, row_end):
+            continue
+        parquet_file = pq.ParquetFile(os.path.join(version_dir(version), part["file"]), memory_map=True)
+        groups = []
+        for i in range(parquet_file.num_row_groups):
+            stats = parquet_file.metadata.row_group(i).column(0).statistics
+            if stats is None or _overlaps(stats.min, stats.max, row_start, row_end):
+                groups.append(i)
+        table = parquet_file.read_row_groups(groups)
+        in_range = pc.and_(pc.greater_equal(table["ml_row_id"], row_start),
+                           pc.less_equal(table["ml_row_id"], row_end))
+        tables.append(table.filter(in_range))
+
+    table = pa.concat_tables(tables) if tables else SCHEMA.empty_table()
+    return table.select(FEATURE_COLUMNS + [TARGET_COLUMN]).to_pandas()
+
+
+def iter_row_groups(version: str, exclude: tuple | None = None,
+                    row_start: int | None = None, row_end: int | None = None):
+    """
+    Yield ``(X, y)`` per row group of the snapshot, in ml_row_id order:
+    X a C-contiguous float32 (rows, 4) feature matrix and y the float64 target.
+    Only rows with ``row_start <= ml_row_id <= row_end`` (default: all) and
+    outside the *exclude* (row_start, row_end) range are kept; row groups
+    outside the range are not read. One row group is in memory at a time.
+    """
+    manifest = load_manifest(version)
+    if manifest is None:
+        raise FileNotFoundError(f"Feature snapshot {version} does not exist")
+    low = row_start if row_start is not None else float("-inf")
+    high = row_end if row_end is not None else float("inf")
+
+    for part in manifest["partitions"]:
+        if not _overlaps(part["min_row_id"], part["max_row_id"], low, high):
+            continue
+        parquet_file = pq.ParquetFile(os.path.join(version_dir(version), part["file"]), memory_map=True)
+        for i in range(parquet_file.num_row_groups):
+            stats = parquet_file.metadata.row_group(i).column(0).statistics
+            if stats is not None and not _overlaps(stats.min, stats.max, low, high):
+                continue
+            table = parquet_file.read_row_group(i)
+            row_ids = table["ml_row_id"]
+            keep = None
+            if row_start is not None or row_end is not None:
+                keep = pc.and_(pc.greater_equal(row_ids, low), pc.less_equal(row_ids, high))
+            if exclude is not None:
+                outside = pc.or_(pc.less(row_ids, exclude[0]), pc.greater(row_ids, exclude[1]))
+                keep = outside if keep is None else pc.and_(keep, outside)
+            if keep is not None:
+                table = table.filter(keep)
+            if table.num_rows == 0:
+                continue
+            X = np.empty((table.num_rows, len(FEATURE_COLUMNS)), dtype=np.float32)
+            for j, col in enumerate(FEATURE_COLUMNS):
+                X[:, j] = table[col].to_numpy()
+            yield X, table[TARGET_COLUMN].to_numpy()
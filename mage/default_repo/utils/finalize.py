@@ -0,0 +1,147 @@
+"""Final fit of a run, done by its last batch.
+
+``finalize_mode`` (variable, or FINALIZE_MODE):
+
+incremental  the last batch trains like every other batch: the forest grows
+             by its trees, the booster by its rounds, SGD/MLP take one more
+             partial_fit. The model has seen the training split of every
+             batch of the run.
+full         one fit over the whole feature snapshot except the last batch's
+             ml_row_id range, plus that batch's training split; its test
+             split stays held out for the rmse. Forest and booster are refit
+             from scratch on all cores with as many trees / rounds as the
+             incremental model had. XGBoost builds a QuantileDMatrix from
+             the row groups (about one byte per feature and row); the forest
+             needs a float32 matrix, about 24 bytes per row, so it takes at
+             most FINALIZE_MAX_ROWS rows (0 = no cap) in ml_row_id order,
+             which is a random sample. SGD and MLP stream the row groups
+             through partial_fit, so only one row group is in memory.
+
+Either way the rows the final model was trained on are described by a
+list of entries that the training block keeps in the checkpoint manifest
+and logs to MLflow as ``training_rows.json``.
+"""
+from __future__ import annotations
+
+import os
+
+import numpy as np
+
+from default_repo.utils.compact_batch import feature_frame
+from default_repo.utils.feature_snapshot import FEATURE_COLUMNS, iter_row_groups, load_manifest
+from default_repo.utils.model_factory import all_cores, build_model
+
+FINALIZE_MODE = os.getenv("FINALIZE_MODE", "incremental")
+# Rows of the in-memory RandomForest matrix in full mode, batch rows included
+FINALIZE_MAX_ROWS = int(os.getenv("FINALIZE_MAX_ROWS", "10000000"))
+
+
+def batch_entry(row_start: int, row_end: int, n_train: int, snapshot_version: str = "") -> dict:
+    """Rows one incremental batch trained on."""
+    return {
+        "ml_row_id": [row_start, row_end],
+        "rows": n_train,
+        "split": "train split of the range (compact_batch, test_size=0.2, seed=42)",
+        "snapshot_version": snapshot_version,
+    }
+
+
+def _snapshot_rows(snapshot_version: str, exclude: tuple) -> int:
+    """Rows outside *exclude* (ml_row_id is dense, so ranges give the count)."""
+    total = 0
+    for part in load_manifest(snapshot_version)["partitions"]:
+        low, high = part["min_row_id"], part["max_row_id"]
+        overlap = max(0, min(high, exclude[1]) - max(low, exclude[0]) + 1)
+        total += part["rows"] - overlap
+    return total
+
+
+def _full_matrix(snapshot_version: str, exclude: tuple, X_train, y_train, max_rows: int = 0):
+    """
+    Snapshot rows outside *exclude* followed by the batch's training rows, one
+    allocation; with *max_rows* only the first snapshot rows that fit.
+    """
+    n_snapshot = _snapshot_rows(snapshot_version, exclude)
+    if max_rows > 0:
+        n_snapshot = max(0, min(n_snapshot, max_rows - len(X_train)))
+    n_rows = n_snapshot + len(X_train)
+    X = np.empty((n_rows, len(FEATURE_COLUMNS)), dtype=np.float32)
+    y = np.empty(n_rows, dtype=np.float64)
+    filled = 0
+    if n_snapshot:
+        for X_chunk, y_chunk in iter_row_groups(snapshot_version, exclude):
+            take = min(len(X_chunk), n_snapshot - filled)
+            X[filled:filled + take] = X_chunk[:take]
+            y[filled:filled + take] = y_chunk[:take]
+            filled += take
+            if filled == n_snapshot:
+                break
+    X[filled:filled + len(X_train)] = X_train
+    y[filled:filled + len(y_train)] = y_train
+    filled += len(X_train)
+    return X[:filled], y[:filled]
+
+
+def _trained_size(model, model_type: str, params: dict):
+    """Trees of the forest / rounds of the booster the incremental run got to."""
+    if model_type == "RandomForest":
+        return len(getattr(model, "estimators_", [])) or model.get_params()["n_estimators"]
+    try:
+        return model.get_booster().num_boosted_rounds()
+    except Exception:  # never fitted
+        return params.get("n_estimators") or model.get_params().get("n_estimators") or 100
+
+
+def full_fit(model, model_type: str, params: dict, X_train, y_train, snapshot_version: str,
+             row_start: int, row_end: int):
+    """Refit on the whole snapshot; returns ``(model, rows_seen)``."""
+    exclude = (row_start, row_end)
+    capped = False
+    if model_type == "XGBoost":
+        # Imported here so the other model types do not need xgboost's DataIter
+        import xgboost as xgb
+
+        from default_repo.utils.xgboost_out_of_core import SnapshotIter, booster_params
+
+        size = _trained_size(model, model_type, params)
+        train_params, _ = booster_params(params)
+        dtrain = xgb.QuantileDMatrix(SnapshotIter(snapshot_version, exclude=exclude, tail=(X_train, y_train)),
+                                     max_bin=train_params["max_bin"])
+        n_rows = dtrain.num_row()
+        print(f"[FINALIZE] full XGBoost fit: {n_rows} rows, {size} rounds, {train_params}")
+        booster = xgb.train(train_params, dtrain, num_boost_round=size)
+        del dtrain
+        final = build_model(model_type, params, n_estimators=size, **all_cores(model_type))
+        final.load_model(bytearray(booster.save_raw(raw_format="ubj")))
+    elif model_type == "RandomForest":
+        size = _trained_size(model, model_type, params)
+        X, y = _full_matrix(snapshot_version, exclude, X_train, y_train, FINALIZE_MAX_ROWS)
+        capped = len(X) < _snapshot_rows(snapshot_version, exclude) + len(X_train)
+        print(f"[FINALIZE] full RandomForest fit: {len(X)} rows{' (capped)' if capped else ''}, "
+              f"{size} trees, {all_cores(model_type)}")
+        final = build_model(model_type, params, n_estimators=size, warm_start=False, **all_cores(model_type))
+        final.fit(feature_frame(X), y)
+        n_rows = len(X)
+        del X, y
+    else:
+        final = build_model(model_type, params)
+        n_rows = 0
+        for X_chunk, y_chunk in iter_row_groups(snapshot_version, exclude):
+            final.partial_fit(feature_frame(X_chunk), y_chunk)
+            n_rows += len(X_chunk)
+        final.partial_fit(feature_frame(X_train), y_train)
+        n_rows += len(X_train)
+        print(f"[FINALIZE] streamed {model_type} fit: {n_rows} rows")
+
+    rows_seen = [
+        {
+            "ml_row_id": "all",
+            "except": [row_start, row_end],
+            "rows": n_rows - len(X_train),
+            "split": (f"first snapshot rows outside the last batch, FINALIZE_MAX_ROWS={FINALIZE_MAX_ROWS}"
+                      if capped else "every snapshot row outside the last batch"),
+            "snapshot_version": snapshot_version,
+        },
+        batch_entry(row_start, row_end, len(X_train), snapshot_version),
+    ]
+    return final, rows_seen
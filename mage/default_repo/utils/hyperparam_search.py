@@ -0,0 +1,246 @@
+"""In-process hyper-parameter search over one loaded batch.
+
+Instead of one Mage pipeline run per (model_type, params) combo, the data is
+loaded and split once and every candidate is fitted by a pool of worker
+processes. The train/test arrays are written once as .npy files and every
+worker memory-maps them, so the split is shared rather than copied per
+process. Each fit is pinned to one core, which makes wall-clock time a
+function of the number of cores.
+
+Search methods:
+
+    grid      every combination of the listed values
+    random    ``n_trials`` draws; a value is a list (choice) or
+              {"low": .., "high": .., "log": bool, "int": bool}
+    halving   successive halving over training rows: all candidates on a
+              small prefix of the (shuffled) training rows, the best
+              1/eta of them on eta times more rows, and so on up to all rows
+
+A search space maps model types to their parameter spaces, e.g.
+``{"RandomForest": {"max_depth": [3, 5, 7]}, "XGBoost": {"eta": [0.05, 0.3]}}``.
+"""
+from __future__ import annotations
+
+import itertools
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+from sklearn.metrics import mean_squared_error
+
+from default_repo.utils.compact_batch import feature_frame
+from default_repo.utils.model_factory import SINGLE_THREAD, build_model
+
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "0")) or os.cpu_count() or 1
+# Mage runs blocks inside a threaded server; fork there can deadlock
+SEARCH_START_METHOD = os.getenv("SEARCH_START_METHOD", "spawn")
+HALVING_ETA = int(os.getenv("SEARCH_HALVING_ETA", "3"))
+HALVING_MIN_ROWS = int(os.getenv("SEARCH_HALVING_MIN_ROWS", "5000"))
+
+# Same grid as flows/ml_regression_pipeline_parallel.py
+DEFAULT_SPACE = {
+    "RandomForest": {"max_depth": [3, 5, 7]},
+    "XGBoost": {"eta": [0.05, 0.1, 0.3]},
+    "SGDRegressor": {"alpha": [0.0001, 0.001, 0.01]},
+}
+
+
+@dataclass
+class Trial:
+    model_type: str
+    params: dict
+    rung: int = 0
+    n_train: int = 0
+    rmse: float = float("inf")
+    fit_seconds: float = 0.0
+    error: str = ""
+    extra: dict = field(default_factory=dict)
+
+
+# ------------------------- candidate generation -------------------------
+
+def grid_candidates(space: dict) -> list:
+    candidates = []
+    for model_type, param_space in space.items():
+        names = list(param_space)
+        for values in itertools.product(*(param_space[n] for n in names)):
+            candidates.append((model_type, dict(zip(names, values))))
+    return candidates
+
+
+def _draw(spec, rng):
+    if isinstance(spec, dict):
+        low, high = spec["low"], spec["high"]
+        if spec.get("log"):
+            value = math.exp(rng.uniform(math.log(low), math.log(high)))
+        else:
+            value = rng.uniform(low, high)
+        return int(round(value)) if spec.get("int") else float(value)
+    choice = spec[rng.integers(len(spec))]
+    return choice.item() if isinstance(choice, np.generic) else choice
+
+
+def random_candidates(space: dict, n_trials: int, seed: int = 42) -> list:
+    """*n_trials* draws, spread evenly over the model types."""
+    rng = np.random.default_rng(seed)
+    model_types = list(space)
+    candidates = []
+    for i in range(n_trials):
+        model_type = model_types[i % len(model_types)]
+        candidates.append((model_type, {n: _draw(s, rng) for n, s in space[model_type].items()}))
+    return candidates
+
+
+# ------------------------- worker side ----------------------------------
+
+_DATA = None
+
+
+def _init_worker(data_dir: str):
+    global _DATA
+    # One fit per core; BLAS/OpenMP pools would oversubscribe the machine
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(1)
+    _DATA = tuple(np.load(os.path.join(data_dir, f"{name}.npy"), mmap_mode="r")
+                  for name in ("X_train", "X_test", "y_train", "y_test"))
+
+
+def _evaluate(model_type: str, params: dict, n_train: int):
+    X_train, X_test, y_train, y_test = _DATA
+    model = build_model(model_type, params, **SINGLE_THREAD.get(model_type, {}))
+    started = time.perf_counter()
+    try:
+        model.fit(feature_frame(X_train[:n_train]), y_train[:n_train])
+    except Exception as exc:  # a bad combo must not take down the search
+        return float("inf"), time.perf_counter() - started, f"{type(exc).__name__}: {exc}"
+    fit_seconds = time.perf_counter() - started
+    rmse = math.sqrt(mean_squared_error(y_test, model.predict(feature_frame(X_test))))
+    return rmse, fit_seconds, ""
+
+
+# ------------------------- search driver --------------------------------
+
+class SearchPool:
+    """Process pool over one shared, memory-mapped train/test split."""
+
+    def __init__(self, X_train, X_test, y_train, y_test, max_workers: int = SEARCH_WORKERS):
+        self.n_train = len(X_train)
+        self.data_dir = tempfile.mkdtemp(prefix="hpsearch-")
+        for name, array in zip(("X_train", "X_test", "y_train", "y_test"), (X_train, X_test, y_train, y_test)):
+            np.save(os.path.join(self.data_dir, f"{name}.npy"), np.ascontiguousarray(array))
+        self.executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context(SEARCH_START_METHOD),
+            initializer=_init_worker,
+            initargs=(self.data_dir,),
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.executor.shutdown()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def evaluate(self, candidates: list, n_train: int | None = None, rung: int = 0) -> list:
+        """Fit every (model_type, params) on the first *n_train* training rows."""
+        n_train = min(n_train or self.n_train, self.n_train)
+        futures = [self.executor.submit(_evaluate, m, p, n_train) for m, p in candidates]
+        trials = []
+        for (model_type, params), future in zip(candidates, futures):
+            rmse, fit_seconds, error = future.result()
+            trials.append(Trial(model_type, params, rung, n_train, rmse, fit_seconds, error))
+            print(f"[SEARCH] rung {rung} {model_type} {params} rows={n_train} rmse={rmse:.4f} ({fit_seconds:.1f}s)")
+        return trials
+
+
+def successive_halving(pool: SearchPool, candidates: list, eta: int = HALVING_ETA,
+                       min_rows: int = HALVING_MIN_ROWS) -> list:
+    """All trials of every rung; the survivors of the last rung saw every training row."""
+    if eta < 2:
+        raise ValueError(f"successive halving needs eta >= 2, got {eta}")
+    # floor(log_eta(n)) in integers: math.log(243, 3) is 4.999…
+    rungs = 0
+    while eta ** (rungs + 1) <= len(candidates):
+        rungs += 1
+    # Never start below min_rows, and never ask for more rungs than the rows allow
+    while rungs and pool.n_train / eta ** rungs < min_rows:
+        rungs -= 1
+
+    trials, survivors = [], candidates
+    for rung in range(rungs + 1):
+        n_train = pool.n_train if rung == rungs else int(pool.n_train / eta ** (rungs - rung))
+        results = pool.evaluate(survivors, n_train, rung)
+        trials.extend(results)
+        keep = max(1, math.ceil(len(results) / eta))
+        survivors = [(t.model_type, t.params) for t in sorted(results, key=lambda t: t.rmse)[:keep]]
+    return trials
+
+
+def run_search(X_train, X_test, y_train, y_test, space: dict | None = None, method: str = "grid",
+               n_trials: int = 20, eta: int = HALVING_ETA, max_workers: int = SEARCH_WORKERS,
+               seed: int = 42) -> list:
+    """Evaluate *space* with *method*; trials sorted best first (final rung first for halving)."""
+    space = space or DEFAULT_SPACE
+    if method == "random":
+        candidates = random_candidates(space, n_trials, seed)
+    else:
+        candidates = grid_candidates(space)
+
+    with SearchPool(X_train, X_test, y_train, y_test, max_workers) as pool:
+        if method == "halving":
+            trials = successive_halving(pool, candidates, eta)
+        elif method in ("grid", "random"):
+            trials = pool.evaluate(candidates)
+        else:
+            raise ValueError(f"Unknown search method: {method}")
+    return sorted(trials, key=lambda t: (-t.rung, t.rmse))
+
+
+# ------------------------- MLflow logging --------------------------------
+
+def log_trials(trials: list, experiment_name: str, run_name: str, tags: dict | None = None) -> str:
+    """
+    One parent run with every trial as a child run. Each child is written
+    with a single log_batch call instead of a start_run/log/end_run sequence
+    per metric. Returns the parent run id.
+    """
+    import mlflow
+    from mlflow.entities import Metric, Param, RunTag
+    from mlflow.tracking import MlflowClient
+    from mlflow.utils.mlflow_tags import MLFLOW_PARENT_RUN_ID, MLFLOW_RUN_NAME
+
+    client = MlflowClient()
+    experiment = mlflow.get_experiment_by_name(experiment_name)
+    exp_id = experiment.experiment_id if experiment else mlflow.create_experiment(experiment_name)
+
+    parent = client.create_run(exp_id, run_name=run_name, tags=tags or {})
+    parent_id = parent.info.run_id
+    now = int(time.time() * 1000)
+    for i, trial in enumerate(trials):
+        child = client.create_run(exp_id, tags={
+            MLFLOW_PARENT_RUN_ID: parent_id,
+            MLFLOW_RUN_NAME: f"{trial.model_type}-{i}",
+        })
+        client.log_batch(
+            child.info.run_id,
+            metrics=[Metric("rmse", trial.rmse, now, trial.rung),
+                     Metric("fit_seconds", trial.fit_seconds, now, trial.rung)],
+            params=[Param(k, str(v)) for k, v in trial.params.items()] + [Param("n_train", str(trial.n_train))],
+            tags=[RunTag("model_type", trial.model_type), RunTag("params", str(trial.params)),
+                  RunTag("rung", str(trial.rung))] + ([RunTag("error", trial.error)] if trial.error else []),
+        )
+        client.set_terminated(child.info.run_id, "FAILED" if trial.error else "FINISHED")
+
+    best = trials[0] if trials else None
+    if best is not None:
+        client.log_batch(parent_id, metrics=[Metric("best_rmse", best.rmse, now, 0)],
+                         tags=[RunTag("best_model_type", best.model_type), RunTag("best_params", str(best.params))])
+    client.set_terminated(parent_id)
+    return parent_id
@@ -0,0 +1,44 @@
+"""Model construction shared by the training block and the hyper-parameter search."""
+from __future__ import annotations
+
+import os
+
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import SGDRegressor
+from sklearn.neural_network import MLPRegressor
+from xgboost import XGBRegressor
+
+MODEL_TYPES = ["SGDRegressor", "RandomForest", "XGBoost", "NeuralNet"]
+
+# Threads of a training fit; -1 means every core
+TRAIN_N_JOBS = int(os.getenv("TRAIN_N_JOBS", "-1"))
+
+# Settings that keep one fit on one core, for callers that parallelise across fits
+SINGLE_THREAD = {
+    "RandomForest": {"n_jobs": 1},
+    "XGBoost": {"n_jobs": 1},
+}
+
+
+def all_cores(model_type: str) -> dict:
+    """Settings that let one fit use TRAIN_N_JOBS threads (histogram trees for XGBoost)."""
+    jobs = TRAIN_N_JOBS if TRAIN_N_JOBS > 0 else os.cpu_count() or 1
+    return {
+        "RandomForest": {"n_jobs": jobs},
+        "XGBoost": {"n_jobs": jobs, "tree_method": "hist"},
+    }.get(model_type, {})
+
+
+def build_model(model_type: str, params: dict | None = None, **overrides):
+    """Unfitted model of *model_type* with grid *params* (and *overrides* on top)."""
+    params = {**(params or {}), **overrides}
+    if model_type == "SGDRegressor":
+        return SGDRegressor(random_state=42, **params)
+    elif model_type == "RandomForest":
+        return RandomForestRegressor(random_state=42, **params)
+    elif model_type == "XGBoost":
+        return XGBRegressor(random_state=42, **params, use_label_encoder=False, eval_metric="rmse")
+    elif model_type == "NeuralNet":
+        return MLPRegressor(random_state=42, **params)
+    else:
+        raise ValueError(f"Unknown model_type: {model_type}")
@@ -0,0 +1,112 @@
+"""Promotion of the best finished run of an experiment to the model registry.
+
+A run's rmse is only comparable with runs scored on the same rows, so every
+run carries an ``eval_set`` tag: the batched runs score each batch's own
+test split (``BATCH_EVAL_SET``, also assumed for runs without the tag), the
+out-of-core runs a fixed holdout (``holdout_eval_set``). Runs are ranked
+within their eval set, and a Production version scored on another eval set
+is never replaced on rmse alone.
+"""
+from __future__ import annotations
+
+BATCH_EVAL_SET = "batch_test_split"
+
+
+def holdout_eval_set(holdout: float) -> str:
+    """Eval set of a run scored on the top *holdout* fraction of ml_row_id."""
+    return f"holdout_top_{holdout:g}"
+
+
+def register_best_run(client, exp_id: str, model_type: str, eval_set: str = BATCH_EVAL_SET):
+    """
+    Register the lowest-rmse run of *eval_set* (best run per run_uuid,
+    pruned combos excluded) as ``{model_type}_baseline`` and move it to
+    Production if it beats the current Production version of the same eval
+    set; against another eval set it is registered but left out of
+    Production. Returns the new model version.
+    """
+    # 1. Fetch all FINISHED runs for this experiment
+    finished_runs = client.search_runs(
+        experiment_ids=[exp_id],
+        filter_string="attributes.status = 'FINISHED'"
+    )
+
+    # 2. Group by run_uuid tag and track best run per group
+    best_runs_per_uuid = {}
+    for run in finished_runs:
+        run_tags = run.data.tags
+        run_uuid = run_tags.get("run_uuid")
+        if not run_uuid or run_tags.get("pruned") == "true":
+            continue  # combos stopped early by the flow's successive halving
+        if run_tags.get("eval_set", BATCH_EVAL_SET) != eval_set:
+            continue  # rmse on other rows, not comparable
+        rmse = run.data.metrics.get("rmse", float("inf"))
+        if run_uuid not in best_runs_per_uuid or rmse < best_runs_per_uuid[run_uuid].data.metrics.get("rmse", float("inf")):
+            best_runs_per_uuid[run_uuid] = run
+
+    # 3. Now pick the best RMSE from the grouped bests
+    if not best_runs_per_uuid:
+        print("No valid runs with rmse and run_uuid found.")
+        return None
+
+    best_run = min(best_runs_per_uuid.values(), key=lambda r: r.data.metrics.get("rmse", float("inf")))
+    best_rmse = best_run.data.metrics["rmse"]
+
+    model_uri     = f"runs:/{best_run.info.run_id}/model"
+    registry_name = f"{model_type}_baseline"
+
+    # 4. Create registry if needed
+    try:
+        client.get_registered_model(registry_name)
+    except Exception:
+        client.create_registered_model(registry_name)
+
+    # 5. Compare with existing Production version
+    current_versions = client.get_latest_versions(registry_name, stages=["Production"])
+    if current_versions:
+        current_rmse = float(current_versions[0].tags.get("rmse", float("inf")))
+        current_eval_set = current_versions[0].tags.get("eval_set", BATCH_EVAL_SET)
+    else:
+        current_rmse = float("inf")
+        current_eval_set = eval_set
+
+    if current_eval_set != eval_set:
+        # Not comparable: keep Production, leave the candidate for a manual decision
+        mv = client.create_model_version(name=registry_name, source=model_uri, run_id=best_run.info.run_id)
+        client.set_model_version_tag(name=registry_name, version=mv.version, key="rmse", value=str(best_rmse))
+        client.set_model_version_tag(name=registry_name, version=mv.version, key="eval_set", value=eval_set)
+        print(f"Registered {registry_name} version {mv.version} (RMSE {best_rmse:.4f} on {eval_set}) without "
+              f"promoting it: Production was scored on {current_eval_set}")
+        return mv
+
+    # 6. Register only if better
+    if best_rmse < current_rmse:
+        mv = client.create_model_version(
+            name=registry_name,
+            source=model_uri,
+            run_id=best_run.info.run_id
+        )
+
+        client.set_model_version_tag(
+            name=registry_name,
+            version=mv.version,
+            key="rmse",
+            value=str(best_rmse)
+        )
+        client.set_model_version_tag(
+            name=registry_name,
+            version=mv.version,
+            key="eval_set",
+            value=eval_set
+        )
+
+        client.transition_model_version_stage(
+            name=registry_name,
+            version=mv.version,
+            stage="Production",
+            archive_existing_versions=True
+        )
+        print(f"Registered {registry_name} version {mv.version} with RMSE {best_rmse:.4f}")
+        return mv
+    else:
+        print(f"Skipped registration. Existing Production model has better RMSE: {current_rmse:.4f}")
@@ -0,0 +1,212 @@
+"""Out-of-core XGBoost training over the whole of chembl_ml_dataset.
+
+Instead of one Mage run per ml_row_id slice, each extending the booster
+through ``xgb_model=``, one process streams the table through an
+``xgboost.DataIter`` in chunks and trains with ``tree_method="hist"``:
+
+    source="snapshot"   row groups of the Parquet feature snapshot
+    source="postgres"   fetchmany chunks of a server-side cursor
+
+XGBoost pulls the chunks itself, once to build the quantile sketch and once
+to fill the matrix, and keeps only the quantised bins
+(``QuantileDMatrix``, about one byte per feature and row). With
+``external_memory=True`` the bins are paged to ``cache_dir`` as well
+(``ExtMemQuantileDMatrix`` on XGBoost 3, a cached ``DMatrix`` before that).
+Peak memory is one chunk plus the bins instead of a pandas frame per slice.
+
+The rows with the highest ``holdout`` fraction of ml_row_ids (rownum was
+shuffled, so this is a random sample) are held out for the rmse; with early
+stopping the ``validation`` fraction below them picks the number of rounds.
+``max_bin`` in the params wins over XGB_OOC_MAX_BIN.
+"""
+from __future__ import annotations
+
+import math
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import xgboost as xgb
+
+from default_repo.utils.feature_snapshot import EXPORT_SQL, FEATURE_COLUMNS, iter_row_groups
+from default_repo.utils.model_factory import all_cores
+
+FETCH_ROWS = int(os.getenv("XGB_OOC_FETCH_ROWS", "100000"))
+CACHE_DIR = os.getenv("XGB_OOC_CACHE_DIR", "/home/src/models/xgb_cache")
+MAX_BIN = int(os.getenv("XGB_OOC_MAX_BIN", "256"))
+
+# Grid names of the XGBRegressor wrapper that xgb.train spells differently
+_RENAMED = {"learning_rate": "eta", "random_state": "seed", "n_jobs": "nthread"}
+
+
+class SnapshotIter(xgb.DataIter):
+    """
+    Row groups of a feature snapshot inside [row_start, row_end] and outside
+    *exclude*, followed by the in-memory ``(X, y)`` *tail* if given.
+    """
+
+    def __init__(self, snapshot_version: str, row_start: int | None = None, row_end: int | None = None,
+                 cache_prefix: str | None = None, exclude: tuple | None = None, tail: tuple | None = None):
+        self.snapshot_version = snapshot_version
+        self.row_start, self.row_end = row_start, row_end
+        self.exclude = exclude
+        self.tail = tail
+        self._chunks = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def _all_chunks(self):
+        yield from iter_row_groups(self.snapshot_version, exclude=self.exclude,
+                                   row_start=self.row_start, row_end=self.row_end)
+        if self.tail is not None and len(self.tail[0]):
+            yield np.ascontiguousarray(self.tail[0], dtype=np.float32), np.asarray(self.tail[1], dtype=np.float64)
+
+    def next(self, input_data) -> bool:
+        if self._chunks is None:
+            self._chunks = self._all_chunks()
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            return False
+        input_data(data=chunk[0], label=chunk[1])
+        return True
+
+    def reset(self):
+        self._chunks = None
+
+
+class CursorIter(xgb.DataIter):
+    """fetchmany chunks of a server-side cursor over ml_row_id in [row_start, row_end]."""
+
+    def __init__(self, connect, row_start: int, row_end: int, fetch_rows: int = FETCH_ROWS,
+                 cache_prefix: str | None = None):
+        self.connect = connect
+        self.row_start, self.row_end = row_start, row_end
+        self.fetch_rows = fetch_rows
+        self._conn = None
+        self._cursor = None
+        self._passes = 0
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data) -> bool:
+        if self._cursor is None:
+            if self._conn is None:
+                self._conn = self.connect()
+            self._passes += 1
+            self._cursor = self._conn.cursor(name=f"xgb_ooc_{self._passes}")
+            self._cursor.itersize = self.fetch_rows
+            sql = EXPORT_SQL.replace(
+                "WHERE standard_value IS NOT NULL",
+                "WHERE standard_value IS NOT NULL AND ml_row_id BETWEEN %s AND %s",
+            )
+            self._cursor.execute(sql, (self.row_start, self.row_end))
+        rows = self._cursor.fetchmany(self.fetch_rows)
+        if not rows:
+            return False
+        values = np.asarray(rows, dtype=np.float64)
+        # Columns: ml_row_id, the four features, standard_value
+        input_data(data=values[:, 1:1 + len(FEATURE_COLUMNS)].astype(np.float32), label=values[:, -1])
+        return True
+
+    def reset(self):
+        if self._cursor is not None:
+            self._cursor.close()
+            self._cursor = None
+
+    def close(self):
+        self.reset()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def booster_params(params: dict) -> tuple[dict, int]:
+    """xgb.train parameters and boosting rounds from grid-style *params*."""
+    params = dict(params or {})
+    num_boost_round = int(params.pop("n_estimators", 0) or 100)
+    train_params = {_RENAMED.get(k, k): v for k, v in params.items()}
+    cores = all_cores("XGBoost")
+    train_params.setdefault("nthread", cores["n_jobs"])
+    train_params.update(tree_method="hist", objective="reg:squarederror", eval_metric="rmse")
+    train_params.setdefault("seed", 42)
+    train_params.setdefault("max_bin", MAX_BIN)
+    return train_params, num_boost_round
+
+
+def _matrix(iterator, external_memory: bool, max_bin: int, ref=None):
+    if not external_memory:
+        return xgb.QuantileDMatrix(iterator, ref=ref, max_bin=max_bin)
+    if hasattr(xgb, "ExtMemQuantileDMatrix"):
+        return xgb.ExtMemQuantileDMatrix(iterator, ref=ref, max_bin=max_bin)
+    return xgb.DMatrix(iterator)
+
+
+def train_out_of_core(params: dict, make_iter, first_row_id: int, last_row_id: int, holdout: float = 0.1,
+                      external_memory: bool = False, early_stopping_rounds: int | None = None,
+                      validation: float = 0.1):
+    """
+    Train one booster over ml_row_id first..last, holding out the top
+    *holdout* fraction for the rmse. With *early_stopping_rounds* the
+    *validation* fraction just below the holdout decides when to stop, so
+    the reported rmse is not chosen on the holdout itself.
+    ``make_iter(row_start, row_end, cache_prefix)`` returns a DataIter for a
+    range. Returns ``(booster, rmse, info)``.
+    """
+    n_rows = last_row_id - first_row_id + 1
+    split = last_row_id - int(math.ceil(n_rows * holdout))
+    train_end = split
+    if early_stopping_rounds is not None:
+        train_end = split - int(math.ceil(n_rows * validation))
+    train_params, num_boost_round = booster_params(params)
+
+    cache_dir = None
+    if external_memory:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        cache_dir = tempfile.mkdtemp(dir=CACHE_DIR)
+
+    def cache(name):
+        return os.path.join(cache_dir, name) if cache_dir else None
+
+    train_iter = make_iter(first_row_id, train_end, cache("train"))
+    eval_iter = make_iter(split + 1, last_row_id, cache("eval"))
+    valid_iter = make_iter(train_end + 1, split, cache("valid")) if train_end < split else None
+    dtrain = deval = dvalid = None
+    try:
+        max_bin = train_params["max_bin"]
+        dtrain = _matrix(train_iter, external_memory, max_bin)
+        deval = _matrix(eval_iter, external_memory, max_bin, ref=dtrain)
+        evals = [(deval, "holdout")]
+        if valid_iter is not None:
+            dvalid = _matrix(valid_iter, external_memory, max_bin, ref=dtrain)
+            evals.append((dvalid, "validation"))  # early stopping watches the last entry
+        print(f"[XGB-OOC] train rows {dtrain.num_row()}, holdout rows {deval.num_row()}, "
+              f"validation rows {dvalid.num_row() if dvalid is not None else 0}, params {train_params}")
+
+        evals_result = {}
+        booster = xgb.train(
+            train_params, dtrain,
+            num_boost_round=num_boost_round,
+            evals=evals,
+            evals_result=evals_result,
+            early_stopping_rounds=early_stopping_rounds,
+            verbose_eval=max(1, num_boost_round // 10),
+        )
+        rmse = evals_result["holdout"]["rmse"][-1 if early_stopping_rounds is None else booster.best_iteration]
+        info = {
+            "train_rows": int(dtrain.num_row()),
+            "holdout_rows": int(deval.num_row()),
+            "train_ml_row_id": [first_row_id, train_end],
+            "holdout_ml_row_id": [split + 1, last_row_id],
+            "num_boost_round": booster.num_boosted_rounds(),
+            "external_memory": external_memory,
+        }
+        if dvalid is not None:
+            info.update(validation_rows=int(dvalid.num_row()), validation_ml_row_id=[train_end + 1, split])
+        return booster, rmse, info
+    finally:
+        for iterator in (train_iter, eval_iter, valid_iter):
+            if hasattr(iterator, "close"):
+                iterator.close()
+        # The matrices own the cache pages; free them before removing the directory
+        del dtrain, deval, dvalid
+        if cache_dir:
+            shutil.rmtree(cache_dir, ignore_errors=True)
@@ -6,7 +6,11 @@ Generate synthetic data with SDV and stream the rows
 import os
 import time
 import json
+import queue
+import hashlib
+import threading
 import argparse
+from collections import deque
 import pandas as pd
 import psycopg2
 import requests
@@ -34,17 +38,175 @@ def get_connection():
     )
     return conn
 
-def fetch_sample(table_name: str, sample_size: int = 100000) -> pd.DataFrame:
-    """Pull a random sample so the full table need not load into memory."""
-    sql = f"""
-        select "mw_freebase", "alogp", "hba", "hbd" ,"standard_value"
-        from public.chembl_ml_dataset c 
-        where "standard_value" is not null 
-        LIMIT {sample_size}
+# -----------------------------------------------------------------------------
+# Training sample
+# -----------------------------------------------------------------------------
+# "keyset" = N consecutive ml_row_ids from a seeded start (ml_row_id follows the
+# shuffled rownum, so this is a uniform sample read from idx_ml_row_id alone),
+# "first" = first N rows, "random" = uniform reservoir sample over the whole table,
+# "tablesample" = TABLESAMPLE SYSTEM block sample trimmed to N,
+# "stratified" = reservoir per log10(standard_value) bin, proportional to bin size.
+# Every method streams in ml_row_id order, so the same table gives the same sample
+# (and the same synthesizer fingerprint) on every start. A table restored before
+# ml_row_id existed (see ML_DATASET_KEYSET_PREP.SQL) is read in physical order and
+# "keyset" falls back to "tablesample".
+SAMPLE_METHOD = os.getenv("SAMPLE_METHOD", "keyset")
+SAMPLE_SIZE = int(os.getenv("SAMPLE_SIZE", "10000"))
+SAMPLE_SEED = int(os.getenv("SAMPLE_SEED", "42"))  # fixed so the same table gives the same sample
+FETCH_CHUNK_ROWS = int(os.getenv("FETCH_CHUNK_ROWS", "50000"))
+STRATIFY_BINS = int(os.getenv("STRATIFY_BINS", "10"))
+
+# Cast on the server so every chunk arrives with the same types
+SAMPLE_COLUMNS = {
+    "mw_freebase": np.float64,
+    "alogp": np.float64,
+    "hba": np.float32,
+    "hbd": np.float32,
+    "standard_value": np.float64,
+}
+SELECT_COLUMNS = ", ".join(f'"{c}"::float8' for c in SAMPLE_COLUMNS)
+LOG_VALUE = 'log(greatest("standard_value", 1e-9))'
+
+
+class Reservoir:
+    """Uniform sample of at most *size* rows from a stream of chunks (algorithm R)."""
+
+    def __init__(self, size: int, width: int, rng: np.random.Generator):
+        self.rows = np.empty((size, width))
+        self.size = size
+        self.filled = 0
+        self.seen = 0
+        self.rng = rng
+
+    def add(self, chunk: np.ndarray):
+        take = min(self.size - self.filled, len(chunk))
+        self.rows[self.filled:self.filled + take] = chunk[:take]
+        self.filled += take
+        self.seen += take
+        rest = chunk[take:]
+        if len(rest) and self.size:
+            # Row number i replaces a random slot with probability size / (i + 1)
+            positions = self.seen + np.arange(len(rest))
+            slots = (self.rng.random(len(rest)) * (positions + 1)).astype(np.int64)
+            keep = slots < self.size
+            self.rows[slots[keep]] = rest[keep]
+        self.seen += len(rest)
+
+    def sample(self) -> np.ndarray:
+        return self.rows[:self.filled]
+
+
+def stream_chunks(conn, sql: str, params=None):
+    """Yield float64 arrays of at most FETCH_CHUNK_ROWS rows from a server-side cursor."""
+    with conn.cursor(name="sdv_sample") as cur:
+        cur.itersize = FETCH_CHUNK_ROWS
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(FETCH_CHUNK_ROWS)
+            if not rows:
+                break
+            yield np.array(rows, dtype=np.float64)  # NULL ➜ NaN
+
+
+def _proportional_allocation(counts: dict, sample_size: int) -> dict:
+    """Split *sample_size* over strata by size (largest remainder rounding)."""
+    total = sum(counts.values())
+    if total <= sample_size:
+        return dict(counts)
+    exact = {k: sample_size * n / total for k, n in counts.items()}
+    allocation = {k: int(v) for k, v in exact.items()}
+    short = sample_size - sum(allocation.values())
+    for k in sorted(exact, key=lambda k: exact[k] - allocation[k], reverse=True)[:short]:
+        allocation[k] += 1
+    return allocation
+
+
+def has_row_id(conn, table_name: str) -> bool:
+    """True when *table_name* has the ml_row_id key column."""
+    with conn.cursor() as cur:
+        cur.execute("select 1 from pg_attribute where attrelid = %s::regclass "
+                    "and attname = 'ml_row_id' and not attisdropped", (table_name,))
+        return cur.fetchone() is not None
+
+
+def _sample_stratified(conn, table_name: str, where: str, order: str, sample_size: int, rng) -> np.ndarray:
+    with conn.cursor() as cur:
+        cur.execute(f"select min({LOG_VALUE}), max({LOG_VALUE}) from {table_name} where {where}")
+        low, high = cur.fetchone()
+        if low is None:
+            return np.empty((0, len(SAMPLE_COLUMNS)))
+        high = high + 1e-9  # width_bucket's upper bound is exclusive
+        stratum = f"width_bucket({LOG_VALUE}, %s, %s, %s)"
+        cur.execute(f"select {stratum}, count(*) from {table_name} where {where} group by 1",
+                    (low, high, STRATIFY_BINS))
+        counts = dict(cur.fetchall())
+
+    allocation = _proportional_allocation(counts, sample_size)
+    reservoirs = {k: Reservoir(n, len(SAMPLE_COLUMNS), rng) for k, n in allocation.items()}
+    sql = f"select {SELECT_COLUMNS}, {stratum} from {table_name} where {where} {order}"
+    for chunk in stream_chunks(conn, sql, (low, high, STRATIFY_BINS)):
+        strata = chunk[:, -1].astype(np.int64)
+        for k in np.unique(strata):
+            reservoirs[k].add(chunk[strata == k, :-1])
+    return np.concatenate([r.sample() for r in reservoirs.values()])
+
+
+def fetch_sample(table_name: str, sample_size: int = 100000, method: str = SAMPLE_METHOD) -> pd.DataFrame:
+    """
+    Sample *sample_size* rows with a non-null target from *table_name*.
+
+    Rows are streamed through a server-side cursor in FETCH_CHUNK_ROWS chunks,
+    so memory stays at one chunk plus the sample whatever the table size.
+    Only "keyset" avoids reading the whole table; "random" and "stratified"
+    scan it on every start.
     """
-    with get_connection() as conn:
-        df = pd.read_sql(sql, conn)
-    return df
+    where = '"standard_value" is not null'
+    rng = np.random.default_rng(SAMPLE_SEED)
+    conn = get_connection()
+    try:
+        order = "order by ml_row_id"
+        if not has_row_id(conn, table_name):
+            order = ""
+            if method == "keyset":
+                print(f"[WARN] {table_name} has no ml_row_id column, using tablesample instead of keyset; "
+                      f"run ML_DATASET_KEYSET_PREP.SQL to add it")
+                method = "tablesample"
+
+        if method == "stratified":
+            rows = _sample_stratified(conn, table_name, where, order, sample_size, rng)
+        else:
+            if method == "keyset":
+                with conn.cursor() as cur:
+                    cur.execute(f"select max(ml_row_id) from {table_name} where {where}")
+                    last_row_id = cur.fetchone()[0] or 0
+                row_start = 1 + int(rng.integers(0, max(1, last_row_id - sample_size + 1)))
+                sql = (f"select {SELECT_COLUMNS} from {table_name} where {where} "
+                       f"and ml_row_id between {row_start} and {row_start + int(sample_size) - 1} {order}")
+            elif method == "first":
+                sql = f"select {SELECT_COLUMNS} from {table_name} where {where} {order} limit {int(sample_size)}"
+            elif method == "tablesample":
+                with conn.cursor() as cur:
+                    cur.execute("select reltuples from pg_class where oid = %s::regclass", (table_name,))
+                    estimate = max(cur.fetchone()[0], 1)
+                # Oversample a little (NULL targets, block granularity); the reservoir trims to size
+                percent = min(100.0, 150.0 * sample_size / estimate)
+                sql = (f"select {SELECT_COLUMNS} from {table_name} "
+                       f"tablesample system ({percent}) repeatable ({SAMPLE_SEED}) where {where} {order}")
+            elif method == "random":
+                sql = f"select {SELECT_COLUMNS} from {table_name} where {where} {order}"
+            else:
+                raise ValueError(f"Unknown SAMPLE_METHOD '{method}'")
+
+            reservoir = Reservoir(sample_size, len(SAMPLE_COLUMNS), rng)
+            for chunk in stream_chunks(conn, sql):
+                reservoir.add(chunk)
+            rows = reservoir.sample()
+            print(f"Sampled {len(rows)} of {reservoir.seen} rows ({method})")
+    finally:
+        conn.close()
+
+    df = pd.DataFrame(rows, columns=list(SAMPLE_COLUMNS))
+    return df.astype(SAMPLE_COLUMNS)
 
 def generate_synthetic_data(df: pd.DataFrame, batch_size: int) -> pd.DataFrame:
     """
@@ -63,6 +225,61 @@ def generate_synthetic_data(df: pd.DataFrame, batch_size: int) -> pd.DataFrame:
     
     return synthesizer
     
+# -----------------------------------------------------------------------------
+# Synthesizer artifact
+# -----------------------------------------------------------------------------
+SYNTHESIZER_DIR = os.getenv("SYNTHESIZER_DIR", "/app/synthesizers")
+# "1" forces a refit even when a matching artifact exists (same as --refit)
+SYNTHESIZER_REFIT = os.getenv("SYNTHESIZER_REFIT", "0") == "1"
+
+
+def sample_fingerprint(df: pd.DataFrame, batch_size: int) -> str:
+    """
+    Hash of everything the fitted synthesizer depends on: the sample rows,
+    the detected metadata, the fit parameters and the SDV version.
+    """
+    import sdv
+
+    metadata = SingleTableMetadata()
+    metadata.detect_from_dataframe(data=df)
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    digest.update(json.dumps(metadata.to_dict(), sort_keys=True).encode())
+    digest.update(json.dumps({"batch_size": batch_size, "sdv": sdv.__version__}).encode())
+    return digest.hexdigest()[:16]
+
+
+def load_or_fit_synthesizer(df: pd.DataFrame, batch_size: int, refit: bool = False):
+    """
+    Load the synthesizer fitted on this exact sample from SYNTHESIZER_DIR,
+    or fit one and save it there for the next start.
+    """
+    fingerprint = sample_fingerprint(df, batch_size)
+    path = os.path.join(SYNTHESIZER_DIR, f"ctgan_{fingerprint}.pkl")
+
+    if not refit and os.path.exists(path):
+        try:
+            start_time = time.time()
+            synthesizer = CTGANSynthesizer.load(path)
+            print(f"Loaded synthesizer {path} in {time.time() - start_time:.1f}s")
+            return synthesizer
+        except Exception as e:
+            print(f"[ERROR] Could not load {path}, refitting: {e}")
+
+    print("Training SDV CTGAN model...")
+    synthesizer = generate_synthetic_data(df, batch_size)
+
+    try:
+        os.makedirs(SYNTHESIZER_DIR, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        synthesizer.save(tmp_path)
+        os.replace(tmp_path, path)  # never leave a half-written artifact behind
+        print(f"Saved synthesizer to {path}")
+    except Exception as e:
+        print(f"[ERROR] Could not save synthesizer to {path}: {e}")
+    return synthesizer
+
+
 def stream_rows(synthesizer):
     """
     Stream one row at a time with a specified delay (in seconds).
@@ -76,40 +293,177 @@ def stream_rows(synthesizer):
 # -----------------------------------------------------------------------------
 KAFKA_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:9094")
 KAFKA_TOPIC = os.getenv("KAFKA_TOPIC", "sdv_stream")
-producer = Producer({"bootstrap.servers": KAFKA_SERVERS})
+# "json" or "msgpack"; must match the consumer's KAFKA_VALUE_FORMAT
+KAFKA_VALUE_FORMAT = os.getenv("KAFKA_VALUE_FORMAT", "json")
+
+# "row" = one CTGAN sample and one message every SAMPLE_INTERVAL seconds
+# "bulk" = sample SAMPLE_CHUNK_ROWS per CTGAN call and publish at TARGET_RATE
+STREAM_MODE = os.getenv("STREAM_MODE", "row")
+TARGET_RATE = float(os.getenv("TARGET_RATE", "1000"))            # rows/sec in bulk mode
+SAMPLE_CHUNK_ROWS = int(os.getenv("SAMPLE_CHUNK_ROWS", "5000"))   # rows per CTGAN sample() call
+RING_CHUNKS = int(os.getenv("RING_CHUNKS", "4"))                  # sampled chunks buffered ahead
+STATS_INTERVAL = float(os.getenv("STATS_INTERVAL", "10"))         # seconds between throughput logs
+
+producer = Producer({
+    "bootstrap.servers": KAFKA_SERVERS,
+    "linger.ms": int(os.getenv("KAFKA_LINGER_MS", "20")),
+    "batch.num.messages": int(os.getenv("KAFKA_BATCH_MESSAGES", "10000")),
+    "compression.type": os.getenv("KAFKA_COMPRESSION", "lz4"),
+    "queue.buffering.max.messages": int(os.getenv("KAFKA_QUEUE_MAX_MESSAGES", "500000")),
+    "acks": os.getenv("KAFKA_ACKS", "1"),
+})
+
+delivery_stats = {"delivered": 0, "failed": 0}
+
+
+def on_delivery(err, msg):
+    """Delivery callback, served from producer.poll()/flush()."""
+    if err is not None:
+        delivery_stats["failed"] += 1
+        if delivery_stats["failed"] % 1000 == 1:
+            print(f"[ERROR] Delivery failed ({delivery_stats['failed']} so far): {err}")
+    else:
+        delivery_stats["delivered"] += 1
+
+
+def _to_builtin(value):
+    # numpy scalars coming out of DataFrame.to_dict()
+    return value.item() if hasattr(value, "item") else value
+
+
+def serialize_record(record: dict) -> bytes:
+    """Encode a record in KAFKA_VALUE_FORMAT."""
+    if KAFKA_VALUE_FORMAT == "msgpack":
+        import msgpack
+        return msgpack.packb(record, default=_to_builtin)
+    return json.dumps(record, default=_to_builtin).encode()
+
+
+def publish_value(value: bytes):
+    """Queue one serialized value, waiting for room if the local queue is full."""
+    while True:
+        try:
+            producer.produce(KAFKA_TOPIC, value, on_delivery=on_delivery)
+            return
+        except BufferError:
+            producer.poll(0.1)  # allow queue to empty
 
 
 def publish_row(record: dict):
     """Serialize and send a single record to Kafka."""
-    try:
-        producer.produce(KAFKA_TOPIC, json.dumps(record).encode())
-    except BufferError:
-        producer.poll(0.1)  # allow queue to empty
-        producer.produce(KAFKA_TOPIC, json.dumps(record).encode())
+    publish_value(serialize_record(record))
+    producer.poll(0)
 
 
+class SampleRing:
+    """
+    Ring of pre-serialized synthetic rows.
+
+    A background thread samples SAMPLE_CHUNK_ROWS rows per CTGAN call,
+    serializes them and keeps up to RING_CHUNKS chunks ready, so the
+    publisher never waits on a forward pass.
+    """
+
+    def __init__(self, synthesizer, chunk_rows: int = SAMPLE_CHUNK_ROWS, max_chunks: int = RING_CHUNKS):
+        self.synthesizer = synthesizer
+        self.chunk_rows = chunk_rows
+        self._chunks = queue.Queue(maxsize=max(1, max_chunks))
+        self._current = deque()
+
+    def _fill_forever(self):
+        while True:
+            try:
+                rows = self.synthesizer.sample(num_rows=self.chunk_rows).to_dict("records")
+                self._chunks.put(deque(serialize_record(r) for r in rows))
+            except Exception as e:
+                print(f"[ERROR] Sampling failed: {e}")
+                time.sleep(1)
+
+    def start(self):
+        threading.Thread(target=self._fill_forever, name="sampler", daemon=True).start()
+        return self
+
+    def take(self, n: int, timeout: float = 1.0) -> list:
+        """Up to *n* serialized rows; fewer only if the sampler is behind."""
+        values = []
+        while len(values) < n:
+            if not self._current:
+                try:
+                    self._current = self._chunks.get(timeout=timeout if not values else 0)
+                except queue.Empty:
+                    break
+            while self._current and len(values) < n:
+                values.append(self._current.popleft())
+        return values
+
+
+def stream_bulk(synthesizer, rate: float = TARGET_RATE):
+    """Publish synthetic rows at *rate* rows/sec (token bucket, one second of burst)."""
+    ring = SampleRing(synthesizer).start()
+    tokens, last = 0.0, time.monotonic()
+    sent, last_report, sent_at_report = 0, last, 0
+
+    while True:
+        now = time.monotonic()
+        tokens = min(rate, tokens + (now - last) * rate)
+        last = now
+
+        due = int(tokens)
+        if due == 0:
+            producer.poll(min(0.05, 1.0 / rate))  # serve callbacks while waiting for tokens
+            continue
+
+        values = ring.take(due)
+        for value in values:
+            publish_value(value)
+        tokens -= len(values)
+        sent += len(values)
+        producer.poll(0)
+
+        if now - last_report >= STATS_INTERVAL:
+            print(f"[STATS] {(sent - sent_at_report) / (now - last_report):.0f} rows/s, "
+                  f"sent {sent}, delivered {delivery_stats['delivered']}, "
+                  f"failed {delivery_stats['failed']}, queued {len(producer)}")
+            last_report, sent_at_report = now, sent
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Stream SDV synthetic rows to Kafka")
+    parser.add_argument("--refit", action="store_true", default=SYNTHESIZER_REFIT,
+                        help="fit a new synthesizer even if a matching artifact is saved")
+    return parser.parse_args()
 
 
 def main():
+    args = parse_args()
     batch_size = 100
     delay = float(os.getenv("SAMPLE_INTERVAL", "1"))
     table_name = "public.chembl_ml_dataset"
-    sample_size = 10000  # number of rows to fetch from DB for training
+    sample_size = SAMPLE_SIZE  # number of rows to fetch from DB for training
 
     print("Fetching sample data...")
     df = fetch_sample(table_name, sample_size)
 
-    print("Training SDV CTGAN model...")
-    synthesizer = generate_synthetic_data(df, batch_size)
-    print("Model training complete. Starting synthetic data stream...")
+    synthesizer = load_or_fit_synthesizer(df, batch_size, refit=args.refit)
+    print("Synthesizer ready. Starting synthetic data stream...")
 
-    while True:
-        synthetic_data = stream_rows(synthesizer)
-        record = synthetic_data.iloc[0].to_dict()
-        publish_row(record)
-        print("Stream data")
-        print(synthetic_data.head())
-        time.sleep(delay)
+    try:
+        if STREAM_MODE == "bulk":
+            print(f"Bulk mode: {SAMPLE_CHUNK_ROWS} rows per sample, target {TARGET_RATE:.0f} rows/s")
+            stream_bulk(synthesizer, TARGET_RATE)
+        else:
+            while True:
+                synthetic_data = stream_rows(synthesizer)
+                record = synthetic_data.iloc[0].to_dict()
+                publish_row(record)
+                print("Stream data")
+                print(synthetic_data.head())
+                time.sleep(delay)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        remaining = producer.flush(10)
+        print(f"Producer flushed, {remaining} message(s) not delivered")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,11 @@
+"""Put the repo's source roots on sys.path the way each service runs them."""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# mage: ``default_repo.utils...``; flows, consumer and sdv import their modules flat
+for source_root in ("mage", "flows", "consumer", "sdv"):
+    path = os.path.join(ROOT, source_root)
+    if path not in sys.path:
+        sys.path.insert(0, path)
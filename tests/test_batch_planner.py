@@ -0,0 +1,38 @@
+import hashlib
+
+import pytest
+
+from batch_planner import DatasetStats, _to_stats, batch_ranges, plan_batches
+
+
+@pytest.mark.parametrize("low, high, batches", [(1, 100, 3), (1, 10, 10), (5, 1004, 7), (1, 1, 1)])
+def test_ranges_are_balanced_and_gap_free(low, high, batches):
+    ranges = plan_batches("v", low, high, batches)
+    assert len(ranges) == batches
+    assert ranges[0][0] == low and ranges[-1][1] == high
+    assert all(end + 1 == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+    sizes = [end - start + 1 for start, end in ranges]
+    assert max(sizes) - min(sizes) <= 1
+    assert sizes == sorted(sizes, reverse=True)  # the extra rows go to the first batches
+
+
+def test_more_batches_than_rows():
+    assert plan_batches("v", 1, 3, 10) == ((1, 1), (2, 2), (3, 3))
+
+
+def test_empty_table():
+    assert plan_batches("v", None, None, 3) == ()
+
+
+def test_batch_ranges_uses_the_stats():
+    stats = DatasetStats(row_count=10, min_row_id=1, max_row_id=10, version="vabc")
+    assert batch_ranges(stats, 2) == ((1, 5), (6, 10))
+
+
+def test_version_matches_the_feature_snapshot_digest():
+    # resolve_version in mage/default_repo/utils/feature_snapshot.py hashes the same values
+    row = (10, 1, 10, 123.5, 4000.0, 2.5, 30, 12)
+    count, _, max_row_id, *sums = row
+    expected = "v" + hashlib.md5(":".join(str(s) for s in (count, max_row_id, *sums)).encode()).hexdigest()[:12]
+    stats = _to_stats(row)
+    assert (stats.row_count, stats.min_row_id, stats.max_row_id, stats.version) == (10, 1, 10, expected)
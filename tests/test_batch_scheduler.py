@@ -0,0 +1,123 @@
+import asyncio
+
+import httpx
+import pytest
+
+import batch_scheduler
+from batch_scheduler import plan_chain, run_chains_async
+
+RANGES = [(1, 10), (11, 20), (21, 30)]
+
+
+class FakeMage:
+    """In-memory stand-in for MageClient: every run completes on its second status read."""
+
+    def __init__(self, trigger_errors=0, status_errors=None, fail_runs=()):
+        self.trigger_errors = trigger_errors  # the first N triggers raise
+        self.status_errors = status_errors or {}  # (model_type, batch) ➜ failed reads before it answers
+        self.fail_runs = set(fail_runs)  # (model_type, batch, attempt) whose run fails
+        self.runs = {}
+        self.reads = {}
+        self.attempts = {}
+
+    async def trigger(self, variables):
+        if self.trigger_errors:
+            self.trigger_errors -= 1
+            raise httpx.RemoteProtocolError("server disconnected")
+        key = (variables["model_type"], variables["row_start"])
+        self.attempts[key] = self.attempts.get(key, 0) + 1
+        run_id = len(self.runs) + 1
+        self.runs[run_id] = (variables, self.attempts[key])
+        return run_id
+
+    async def statuses(self, run_ids, return_exceptions=False):
+        result = {}
+        for run_id in run_ids:
+            variables, attempt = self.runs[run_id]
+            key = (variables["model_type"], variables["row_start"])
+            if self.status_errors.get(key, 0):
+                self.status_errors[key] -= 1
+                result[run_id] = httpx.ConnectError("connection refused")
+                continue
+            self.reads[run_id] = self.reads.get(run_id, 0) + 1
+            if self.reads[run_id] < 2:
+                result[run_id] = "running"
+            else:
+                result[run_id] = "failed" if key + (attempt,) in self.fail_runs else "completed"
+        return result
+
+
+@pytest.fixture(autouse=True)
+def fast_polls(monkeypatch):
+    monkeypatch.setattr(batch_scheduler, "POLL_MIN_INTERVAL", 0.001)
+    monkeypatch.setattr(batch_scheduler, "POLL_MAX_INTERVAL", 0.002)
+    monkeypatch.setattr(batch_scheduler, "MAGE_HTTP_BACKOFF", 0.001)
+
+
+def chains(*model_types):
+    return [plan_chain(model_type, {}, RANGES) for model_type in model_types]
+
+
+def test_batches_of_a_chain_run_in_order():
+    mage = FakeMage()
+    done = asyncio.run(run_chains_async(chains("XGBoost", "RandomForest"), max_in_flight=2, client=mage))
+    assert all(c.next_batch == len(RANGES) for c in done)
+    for model_type in ("XGBoost", "RandomForest"):
+        starts = [v["row_start"] for v, _ in mage.runs.values() if v["model_type"] == model_type]
+        assert starts == [1, 11, 21]
+    assert [v["is_last_batch"] for v, _ in mage.runs.values()][-2:] == [True, True]
+
+
+def test_transient_trigger_and_status_errors_are_retried():
+    mage = FakeMage(trigger_errors=2, status_errors={("XGBoost", 11): 3})
+    done = asyncio.run(run_chains_async(chains("XGBoost", "SGDRegressor"), client=mage))
+    assert all(c.next_batch == len(RANGES) and not c.failed for c in done)
+
+
+def test_failed_run_is_retried_then_only_its_chain_fails():
+    retried = FakeMage(fail_runs={("XGBoost", 11, 1)})
+    done = asyncio.run(run_chains_async(chains("XGBoost"), client=retried))
+    assert done[0].next_batch == len(RANGES)
+
+    hopeless = FakeMage(fail_runs={("XGBoost", 11, n) for n in range(1, 10)})
+    grid = chains("XGBoost", "SGDRegressor")
+    with pytest.raises(RuntimeError, match="XGBoost"):
+        asyncio.run(run_chains_async(grid, client=hopeless))
+    assert grid[0].failed == "failed" and grid[0].next_batch == 1
+    assert grid[1].next_batch == len(RANGES) and not grid[1].failed
+
+
+def test_unreadable_status_fails_only_its_chain():
+    mage = FakeMage(status_errors={("RandomForest", 1): batch_scheduler.STATUS_ERRORS})
+    grid = chains("RandomForest", "XGBoost")
+    with pytest.raises(RuntimeError, match="RandomForest"):
+        asyncio.run(run_chains_async(grid, client=mage))
+    assert grid[0].failed.startswith("status unavailable")
+    assert grid[1].next_batch == len(RANGES)
+
+
+def test_client_retries_status_reads_but_not_sent_triggers(monkeypatch):
+    import mage_client
+
+    monkeypatch.setattr(mage_client, "MAGE_HTTP_BACKOFF", 0.001)
+    calls = {"GET": 0, "POST": 0}
+
+    def handler(request):
+        calls[request.method] += 1
+        if calls[request.method] < 3:
+            return httpx.Response(503)
+        if request.method == "GET":
+            return httpx.Response(200, json={"pipeline_run": {"status": "running"}})
+        return httpx.Response(200, json={"pipeline_run": {"id": 7}})
+
+    async def run():
+        mage = mage_client.MageClient(base_url="http://mage")
+        await mage.close()
+        mage._client = httpx.AsyncClient(base_url="http://mage", transport=httpx.MockTransport(handler))
+        async with mage:
+            assert await mage.status(7) == "running"
+            with pytest.raises(httpx.HTTPStatusError):
+                await mage.trigger({})  # the POST reached Mage: retrying could start a second run
+
+    asyncio.run(run())
+    assert calls == {"GET": 3, "POST": 1}
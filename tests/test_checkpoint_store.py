@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from default_repo.utils import checkpoint_store
+from default_repo.utils.model_factory import build_model
+
+
+@pytest.fixture(autouse=True)
+def checkpoint_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpoint_store, "CHECKPOINT_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _data(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, 4))
+    return X, X @ [1.0, 2.0, -1.0, 0.5] + rng.normal(scale=0.1, size=n)
+
+
+@pytest.mark.parametrize("model_type, params", [
+    ("SGDRegressor", {"alpha": 0.001}),
+    ("NeuralNet", {"hidden_layer_sizes": (8,), "max_iter": 20}),
+])
+def test_partial_fit_after_uncompressed_reload(model_type, params):
+    X, y = _data()
+    model = build_model(model_type, params)
+    model.partial_fit(X, y)
+    checkpoint_store.save_checkpoint("run", model_type, params, model, compress=0)
+
+    loaded = checkpoint_store.load_checkpoint("run", model_type, params)
+    before = loaded.predict(X[:5])
+    loaded.partial_fit(*_data(seed=1))  # the next batch; must not hit read-only arrays
+    checkpoint_store.save_checkpoint("run", model_type, params, loaded, compress=0)
+    assert not np.allclose(loaded.predict(X[:5]), before)
+
+
+def test_forest_segments_append_and_reload():
+    X, y = _data()
+    params = {"max_depth": 3}
+    model = build_model("RandomForest", params, n_estimators=5, warm_start=True).fit(X, y)
+    checkpoint_store.save_checkpoint("run", "RandomForest", params, model)
+
+    loaded = checkpoint_store.load_checkpoint("run", "RandomForest", params)
+    np.testing.assert_allclose(loaded.predict(X), model.predict(X))
+    loaded.set_params(n_estimators=8)
+    loaded.fit(*_data(seed=1))
+    checkpoint_store.save_checkpoint("run", "RandomForest", params, loaded)
+
+    manifest = checkpoint_store.load_manifest("run", "RandomForest")
+    assert [segment["trees"] for segment in manifest["segments"]] == [5, 3]
+    again = checkpoint_store.load_checkpoint("run", "RandomForest", params)
+    assert len(again.estimators_) == 8
+    np.testing.assert_allclose(again.predict(X), loaded.predict(X))
+
+
+@pytest.mark.parametrize("compress", [0, 3])
+def test_xgboost_round_trip(compress):
+    X, y = _data()
+    params = {"eta": 0.3}
+    model = build_model("XGBoost", params, n_estimators=10).fit(X, y)
+    checkpoint_store.save_checkpoint("run", "XGBoost", params, model, compress=compress,
+                                     rows_seen=[{"rows": len(X)}])
+
+    loaded = checkpoint_store.load_checkpoint("run", "XGBoost", params)
+    np.testing.assert_allclose(loaded.predict(X), model.predict(X), rtol=1e-6)
+    assert loaded.get_booster().num_boosted_rounds() == 10
+    assert checkpoint_store.recorded_rows("run", "XGBoost") == [{"rows": len(X)}]
+
+
+def test_gc_removes_only_stale_runs():
+    X, y = _data()
+    for run in ("old", "kept", "fresh"):
+        model = build_model("SGDRegressor", {}).fit(X, y)
+        checkpoint_store.save_checkpoint(run, "SGDRegressor", {}, model)
+
+    assert checkpoint_store.gc_checkpoints(max_age_hours=1) == 0
+    assert checkpoint_store.gc_checkpoints(max_age_hours=-1, keep=("kept",)) == 2
+    assert checkpoint_store.load_checkpoint("kept", "SGDRegressor", {}) is not None
+    assert checkpoint_store.load_checkpoint("old", "SGDRegressor", {}) is None
@@ -0,0 +1,64 @@
+import json
+
+import numpy as np
+
+import decoding
+
+
+def values(*records):
+    return [json.dumps(r).encode() if isinstance(r, dict) else r for r in records]
+
+
+ROW = {"mw_freebase": 300.5, "alogp": 1.5, "hba": 3, "hbd": 1, "standard_value": 42.0}
+
+
+def test_valid_batch_is_columnar():
+    batch = decoding.decode_batch(values(ROW, {**ROW, "alogp": -2.0}))
+    assert len(batch) == 2 and batch.errors == 0
+    np.testing.assert_array_equal(batch.features[1], [300.5, -2.0, 3, 1])
+    assert batch.valid.all()
+    assert batch.targets.tolist() == [42.0, 42.0]
+
+
+def test_bad_message_falls_back_to_per_message_parsing():
+    batch = decoding.decode_batch(values(ROW, b"{not json", b"[1, 2]", ROW))
+    assert len(batch) == 2
+    assert batch.errors == 2  # unparsable and not an object
+    assert batch.valid.all()
+
+
+def test_nan_literal_is_parsed_and_flagged():
+    raw = b'{"mw_freebase": NaN, "alogp": 1, "hba": 1, "hbd": 1, "standard_value": 5}'
+    batch = decoding.decode_batch([raw])
+    assert batch.errors == 0
+    assert not batch.valid[0]
+
+
+def test_schema_errors_are_kept_but_invalid():
+    batch = decoding.decode_batch(values(
+        {k: v for k, v in ROW.items() if k != "hbd"},
+        {**ROW, "alogp": "high"},
+        {**ROW, "standard_value": None},
+    ))
+    assert batch.valid.tolist() == [False, False, True]
+    assert np.isnan(batch.features[1]).all()  # a non-numeric value invalidates its whole row
+    np.testing.assert_array_equal(batch.features[0, :3], [300.5, 1.5, 3])
+    assert batch.targets[2] == decoding.MISSING_TARGET
+
+
+def test_payload_is_an_mlflow_dataframe_split():
+    features = np.array([[1.0, 2.0, 3.0, 4.0]])
+    body = json.loads(decoding.encode_payload(features))
+    assert body == {"dataframe_split": {"columns": decoding.FEATURE_COLUMNS, "data": [[1.0, 2.0, 3.0, 4.0]]}}
+
+
+def test_value_round_trip():
+    assert decoding.decode_value(decoding.encode_value(ROW)) == ROW
+
+
+def test_messages_that_split_or_vanish_in_the_joined_array_are_dropped():
+    two_in_one = json.dumps(ROW).encode() + b"," + json.dumps(ROW).encode()
+    for bad in (two_in_one, b""):
+        batch = decoding.decode_batch(values(ROW, bad, {**ROW, "hbd": 2}))
+        assert len(batch) == 2 and batch.errors == 1
+        assert batch.features[:, 3].tolist() == [1, 2]  # records stay aligned with their messages
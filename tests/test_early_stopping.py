@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from batch_scheduler import plan_chain
+from early_stopping import EarlyStopping, SuccessiveHalving
+
+RANGES = [(i * 100 + 1, (i + 1) * 100) for i in range(5)]
+
+
+class FakeMetrics:
+    def __init__(self, rmse):
+        self.rmse = rmse
+        self.pruned = []
+
+    def latest_rmse(self, chain):
+        return self.rmse[chain.run_uuid]
+
+    def mark_pruned(self, chain):
+        self.pruned.append(chain.run_uuid)
+
+
+def grid(model_types=("RandomForest", "XGBoost", "SGDRegressor"), per_type=3):
+    return [plan_chain(model_type, {"i": i}, RANGES) for model_type in model_types for i in range(per_type)]
+
+
+def advance(stopper, chains):
+    """Complete one batch of every runnable chain, then decide the rungs."""
+    for chain in chains:
+        if not chain.done and not stopper.holds(chain):
+            chain.next_batch += 1
+            asyncio.run(stopper.completed(chain))
+    return asyncio.run(stopper.prune(chains))
+
+
+def test_milestones_grow_by_eta():
+    assert SuccessiveHalving(5, eta=3).milestones == [1, 3]
+    assert SuccessiveHalving(9, eta=3).milestones == [1, 3]
+    assert SuccessiveHalving(10, eta=2, min_batches=2).milestones == [2, 4, 8]
+    assert SuccessiveHalving(1, eta=3).milestones == []
+
+
+def test_decide_waits_for_the_whole_rung():
+    chains = grid(("XGBoost",))
+    bracket = SuccessiveHalving(5, eta=3)
+    chains[0].next_batch = 1
+    bracket.record(chains[0], 0.5)
+    assert bracket.holds(chains[0])
+    assert bracket.decide(chains) == []  # two chains have not reached batch 1
+
+
+def test_decide_keeps_the_best_and_spares_unscored():
+    chains = grid(("XGBoost",), per_type=6)
+    bracket = SuccessiveHalving(5, eta=3)
+    for chain, rmse in zip(chains, [0.4, 0.1, 0.6, None, 0.3, 0.5]):
+        chain.next_batch = 1
+        bracket.record(chain, rmse)
+
+    pruned = bracket.decide(chains)
+    # keep 2: the unscored chain plus the best scored one
+    assert {c.params["i"] for c in pruned} == {0, 2, 4, 5}
+    assert not bracket.holds(chains[1])
+    assert bracket.decide(chains) == []
+
+
+@pytest.mark.parametrize("method", ["halving", "hyperband"])
+def test_every_model_type_keeps_a_winner(method):
+    chains = grid()
+    # SGD combos score far better than the rest; they must not prune the other types
+    rmse = {c.run_uuid: (0.01 if c.model_type == "SGDRegressor" else 1.0) + c.params["i"] / 10 for c in chains}
+    stopper = EarlyStopping(chains, method, eta=3, metrics=FakeMetrics(rmse))
+
+    for _ in range(len(RANGES) * 2):
+        advance(stopper, chains)
+
+    finished = [c for c in chains if c.next_batch == len(RANGES)]
+    assert {c.model_type for c in finished} == {"RandomForest", "XGBoost", "SGDRegressor"}
+    assert all(c.params["i"] == 0 for c in finished if method == "halving")
+    assert all(c.done for c in chains)
+
+
+def test_halving_cost():
+    chains = grid()
+    stopper = EarlyStopping(chains, "halving", eta=3, metrics=FakeMetrics({c.run_uuid: c.params["i"] for c in chains}))
+    runs = 0
+    for _ in range(len(RANGES) * 2):
+        runs += sum(1 for c in chains if not c.done and not stopper.holds(c))
+        advance(stopper, chains)
+    assert runs == 21
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        EarlyStopping(grid(), "bogus", metrics=FakeMetrics({}))
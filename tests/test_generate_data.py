@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+generate_data = pytest.importorskip("generate_data")  # needs the sdv service's dependencies
+Reservoir = generate_data.Reservoir
+
+
+def stream(n, chunk):
+    rows = np.arange(n, dtype=np.float64).reshape(-1, 1)
+    return [rows[i:i + chunk] for i in range(0, n, chunk)]
+
+
+def test_reservoir_keeps_everything_below_its_size():
+    reservoir = Reservoir(10, 1, np.random.default_rng(0))
+    for chunk in stream(7, 3):
+        reservoir.add(chunk)
+    assert reservoir.sample()[:, 0].tolist() == list(range(7))
+    assert reservoir.seen == 7
+
+
+def test_reservoir_is_seeded_and_independent_of_chunking():
+    samples = []
+    for chunk_size in (1000, 1000, 37):
+        reservoir = Reservoir(100, 1, np.random.default_rng(42))
+        for chunk in stream(5000, chunk_size):
+            reservoir.add(chunk)
+        samples.append(sorted(reservoir.sample()[:, 0]))
+    assert samples[0] == samples[1]
+    assert len(set(samples[2])) == 100 and reservoir.seen == 5000
+
+
+def test_reservoir_is_uniform():
+    hits = np.zeros(100)
+    for seed in range(400):
+        reservoir = Reservoir(10, 1, np.random.default_rng(seed))
+        for chunk in stream(100, 16):
+            reservoir.add(chunk)
+        hits[reservoir.sample()[:, 0].astype(int)] += 1
+    # every row is kept with probability 10/100 ➜ 40 times in expectation
+    assert hits.min() > 15 and hits.max() < 70
+    assert abs(hits[:50].sum() - hits[50:].sum()) < 0.15 * hits.sum()
+
+
+def test_proportional_allocation():
+    assert generate_data._proportional_allocation({1: 50, 2: 30, 3: 20}, 10) == {1: 5, 2: 3, 3: 2}
+    allocation = generate_data._proportional_allocation({1: 1, 2: 1, 3: 1}, 2)
+    assert sum(allocation.values()) == 2 and max(allocation.values()) == 1
+    assert generate_data._proportional_allocation({1: 3, 2: 4}, 100) == {1: 3, 2: 4}
+
+
+class FakeConnection:
+    """Answers the catalog and estimate queries of fetch_sample and records the SQL."""
+
+    def __init__(self, has_row_id):
+        self.has_row_id = has_row_id
+        self.sql = []
+
+    def cursor(self, name=None):
+        return FakeCursor(self)
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conn.sql.append(sql)
+        if "pg_attribute" in sql:
+            self.result = (1,) if self.conn.has_row_id else None
+        elif "reltuples" in sql:
+            self.result = (1000.0,)
+        elif "max(ml_row_id)" in sql:
+            self.result = (1000,)
+
+    def fetchone(self):
+        return self.result
+
+
+def sample_sql(monkeypatch, has_row_id, method):
+    conn = FakeConnection(has_row_id)
+    monkeypatch.setattr(generate_data, "get_connection", lambda: conn)
+    monkeypatch.setattr(generate_data, "stream_chunks", lambda conn, sql, params=None: conn.sql.append(sql) or [])
+    generate_data.fetch_sample("chembl_ml_dataset", sample_size=10, method=method)
+    return conn.sql[-1]
+
+
+def test_keyset_sample_reads_a_row_id_range(monkeypatch):
+    sql = sample_sql(monkeypatch, True, "keyset")
+    assert "ml_row_id between" in sql and sql.endswith("order by ml_row_id")
+
+
+def test_keyset_falls_back_to_tablesample_without_row_id(monkeypatch):
+    sql = sample_sql(monkeypatch, False, "keyset")
+    assert "tablesample system" in sql and "ml_row_id" not in sql
+
+
+def test_first_sample_is_unordered_without_row_id(monkeypatch):
+    assert "ml_row_id" not in sample_sql(monkeypatch, False, "first")
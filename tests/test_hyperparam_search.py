@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from default_repo.utils import hyperparam_search as hps
+from default_repo.utils.hyperparam_search import Trial, grid_candidates, random_candidates, successive_halving
+
+
+def test_grid_is_the_product_per_model_type():
+    space = {"RandomForest": {"max_depth": [3, 5], "n_estimators": [10, 20]}, "SGDRegressor": {"alpha": [0.1]}}
+    candidates = grid_candidates(space)
+    assert len(candidates) == 5
+    assert ("SGDRegressor", {"alpha": 0.1}) in candidates
+    assert ("RandomForest", {"max_depth": 5, "n_estimators": 10}) in candidates
+
+
+def test_random_draws_are_seeded_and_in_range():
+    space = {
+        "XGBoost": {"eta": {"low": 0.01, "high": 0.3, "log": True}, "max_depth": {"low": 2, "high": 8, "int": True}},
+        "SGDRegressor": {"alpha": [0.0001, 0.001]},
+    }
+    candidates = random_candidates(space, 10, seed=7)
+    assert candidates == random_candidates(space, 10, seed=7)
+    assert [m for m, _ in candidates].count("XGBoost") == 5
+    for model_type, params in candidates:
+        if model_type == "XGBoost":
+            assert 0.01 <= params["eta"] <= 0.3
+            assert isinstance(params["max_depth"], int) and 2 <= params["max_depth"] <= 8
+        else:
+            assert params["alpha"] in (0.0001, 0.001) and type(params["alpha"]) is float
+
+
+class FakePool:
+    """Scores a candidate by its "score" param; records the rows each rung asked for."""
+
+    def __init__(self, n_train):
+        self.n_train = n_train
+        self.rungs = []
+
+    def evaluate(self, candidates, n_train=None, rung=0):
+        self.rungs.append((rung, n_train, len(candidates)))
+        return [Trial(m, p, rung, n_train, p["score"]) for m, p in candidates]
+
+
+def test_successive_halving_keeps_the_best_third_on_three_times_the_rows():
+    candidates = [("SGDRegressor", {"score": s}) for s in range(9, 0, -1)]
+    pool = FakePool(90_000)
+    trials = successive_halving(pool, candidates, eta=3, min_rows=1000)
+    assert pool.rungs == [(0, 10_000, 9), (1, 30_000, 3), (2, 90_000, 1)]
+    final = [t for t in trials if t.rung == 2]
+    assert [t.params["score"] for t in final] == [1]
+
+
+def test_successive_halving_never_starts_below_min_rows():
+    pool = FakePool(20_000)
+    successive_halving(pool, [("SGDRegressor", {"score": s}) for s in range(27)], eta=3, min_rows=5_000)
+    assert pool.rungs[0][1] >= 5_000 and pool.rungs[-1][1] == 20_000
+
+
+def test_successive_halving_counts_rungs_exactly_at_powers_of_eta():
+    pool = FakePool(3 ** 6)
+    successive_halving(pool, [("SGDRegressor", {"score": s}) for s in range(243)], eta=3, min_rows=1)
+    assert [n for _, _, n in pool.rungs] == [243, 81, 27, 9, 3, 1]
+
+
+def test_run_search_in_a_process_pool():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, 4))
+    y = X @ [1.0, 2.0, 0.0, -1.0] + rng.normal(scale=0.1, size=400)
+    trials = hps.run_search(X[:300], X[300:], y[:300], y[300:], space={"SGDRegressor": {"alpha": [0.0001, 10.0]}},
+                            method="grid", max_workers=2)
+    assert [t.params["alpha"] for t in trials] == [0.0001, 10.0]
+    assert trials[0].rmse < 0.5 and not trials[0].error
+
+    with pytest.raises(ValueError):
+        hps.run_search(X[:300], X[300:], y[:300], y[300:], method="bogus", max_workers=1)
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+import metrics
+
+
+def sample(name, **labels):
+    return metrics.REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_predictions_accumulate_in_one_registry():
+    before = metrics.REGISTRY.get_sample_value("model_prediction_value_count", {"model_name": "nn"}) or 0.0
+    for value in (12.5, 30.0):
+        metrics.record_predictions({"target": 10.0, "nn": value})
+    assert sample("model_prediction", model_name="nn") == 30.0
+    assert sample("model_prediction_value_count", model_name="nn") == before + 2
+    assert sample("model_prediction", model_name="target") == 10.0
+
+
+def test_prediction_outcomes():
+    before = {o: sample("consumer_predictions_total", model_name="rf", outcome=o) for o in ("ok", "none", "skipped")}
+    for value in (12.5, None, -9999):
+        metrics.record_predictions({"target": 10.0, "rf": value})
+    for outcome in ("ok", "none", "skipped"):
+        assert sample("consumer_predictions_total", model_name="rf", outcome=outcome) == before[outcome] + 1
+
+
+def test_kafka_stats_keep_assigned_partition_lag():
+    stats = {"topics": {"sdv_stream": {"partitions": {
+        "0": {"partition": 0, "consumer_lag": 7},
+        "1": {"partition": 1, "consumer_lag": -1},
+        "-1": {"partition": -1, "consumer_lag": 3},
+    }}}}
+    metrics.record_kafka_stats(json.dumps(stats))
+    metrics.record_kafka_stats("not json")
+    assert sample("kafka_consumer_lag", topic="sdv_stream", partition="0") == 7
+    assert metrics.REGISTRY.get_sample_value("kafka_consumer_lag", {"topic": "sdv_stream", "partition": "1"}) is None
+
+
+def test_single_process_serves_its_own_registry():
+    if metrics.MULTIPROC_DIR:
+        pytest.skip("PROMETHEUS_MULTIPROC_DIR is set")
+    assert metrics.exposition_registry() is metrics.REGISTRY
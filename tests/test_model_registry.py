@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+from default_repo.utils.model_registry import BATCH_EVAL_SET, holdout_eval_set, register_best_run
+
+
+def run(run_id, rmse, **tags):
+    return SimpleNamespace(info=SimpleNamespace(run_id=run_id),
+                           data=SimpleNamespace(metrics={"rmse": rmse}, tags={"run_uuid": run_id, **tags}))
+
+
+class FakeClient:
+    def __init__(self, runs, production=None):
+        self.runs = runs
+        self.production = production  # tags of the Production version
+        self.versions = []
+        self.promoted = []
+
+    def search_runs(self, experiment_ids, filter_string):
+        return self.runs
+
+    def get_registered_model(self, name):
+        return name
+
+    def get_latest_versions(self, name, stages):
+        return [SimpleNamespace(tags=self.production)] if self.production else []
+
+    def create_model_version(self, name, source, run_id):
+        self.versions.append({"run_id": run_id, "tags": {}})
+        return SimpleNamespace(version=len(self.versions))
+
+    def set_model_version_tag(self, name, version, key, value):
+        self.versions[version - 1]["tags"][key] = value
+
+    def transition_model_version_stage(self, name, version, stage, archive_existing_versions):
+        self.promoted.append(version)
+
+
+OOC = holdout_eval_set(0.1)
+RUNS = [
+    run("batch-a", 0.40),
+    run("batch-b", 0.55, eval_set=BATCH_EVAL_SET),
+    run("pruned", 0.10, pruned="true"),
+    run("ooc", 0.20, eval_set=OOC),
+]
+
+
+def test_batched_runs_are_ranked_without_the_holdout_runs():
+    client = FakeClient(RUNS)
+    register_best_run(client, "1", "XGBoost")
+    assert client.versions == [{"run_id": "batch-a", "tags": {"rmse": "0.4", "eval_set": BATCH_EVAL_SET}}]
+    assert client.promoted == [1]
+
+
+def test_holdout_run_does_not_replace_a_batch_scored_production():
+    client = FakeClient(RUNS, production={"rmse": "0.4"})
+    register_best_run(client, "1", "XGBoost", eval_set=OOC)
+    assert client.versions[0]["run_id"] == "ooc"
+    assert client.promoted == []
+
+
+def test_same_eval_set_promotes_only_when_better():
+    client = FakeClient(RUNS, production={"rmse": "0.15", "eval_set": OOC})
+    assert register_best_run(client, "1", "XGBoost", eval_set=OOC) is None
+    client.production = {"rmse": "0.25", "eval_set": OOC}
+    register_best_run(client, "1", "XGBoost", eval_set=OOC)
+    assert client.promoted == [1]
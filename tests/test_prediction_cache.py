@@ -0,0 +1,39 @@
+import numpy as np
+
+from prediction_cache import PredictionCache
+
+
+def test_quantize_merges_nearby_rows():
+    cache = PredictionCache(quantum=0.01)
+    keys = cache.quantize(np.array([[1.001, 2.0], [1.002, 2.0], [1.02, 2.0]]))
+    assert keys[0] == keys[1] != keys[2]
+    assert all(isinstance(k, tuple) for k in keys)
+
+
+def test_get_returns_hits_and_misses_in_order():
+    cache = PredictionCache(max_entries=10, ttl=60)
+    cache.put_many("rf", "1", [(1,), (2,)], [0.5, None])  # a failed prediction is not cached
+    assert cache.get_many("rf", "1", [(2,), (1,), (3,)]) == [None, 0.5, None]
+    assert cache.get_many("nn", "1", [(1,)]) == [None]
+
+
+def test_version_change_drops_the_model_entries():
+    cache = PredictionCache(max_entries=10, ttl=60)
+    cache.put_many("rf", "1", [(1,)], [0.5])
+    cache.put_many("nn", "3", [(1,)], [0.7])
+    assert cache.get_many("rf", "2", [(1,)]) == [None]
+    assert cache.get_many("rf", "1", [(1,)]) == [None]  # the old version is gone too
+    assert cache.get_many("nn", "3", [(1,)]) == [0.7]
+
+
+def test_lru_eviction_and_ttl(monkeypatch):
+    cache = PredictionCache(max_entries=2, ttl=10)
+    cache.put_many("rf", "1", [(1,), (2,)], [1.0, 2.0])
+    cache.get_many("rf", "1", [(1,)])  # (1,) is now the most recently used
+    cache.put_many("rf", "1", [(3,)], [3.0])
+    assert cache.get_many("rf", "1", [(1,), (2,), (3,)]) == [1.0, None, 3.0]
+
+    import prediction_cache
+    now = prediction_cache.time.monotonic()
+    monkeypatch.setattr(prediction_cache.time, "monotonic", lambda: now + 11)
+    assert cache.get_many("rf", "1", [(1,), (3,)]) == [None, None]